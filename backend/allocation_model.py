@@ -0,0 +1,102 @@
+"""
+In-process serving of the trained DQN resource allocator.
+
+Loads ``dqn_model.h5`` and the ``scaler_X.pkl`` / ``scaler_Y.pkl`` written
+by train_dqn.py once, on first use, and predicts whole batches of damage
+vectors in a single forward pass. Predictions are cached per damage vector
+(the model is deterministic), so repeated requests for the same situation
+skip TensorFlow entirely.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Column order of the model input (damage_assessment without damage_id)
+DAMAGE_FEATURES = (
+    'building_no_damage',
+    'building_minor_damage',
+    'building_major_damage',
+    'building_total_destruction',
+)
+
+
+class AllocationModelService:
+    def __init__(self, model_path, scaler_x_path, scaler_y_path, cache_size=4096):
+        self.model_path = model_path
+        self.scaler_x_path = scaler_x_path
+        self.scaler_y_path = scaler_y_path
+        self.cache_size = cache_size
+        self._model = None
+        self._scaler_x = None
+        self._scaler_y = None
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def available(self):
+        return all(os.path.exists(p) for p in (self.model_path, self.scaler_x_path, self.scaler_y_path))
+
+    def warm_up(self):
+        """Load the model ahead of the first request (call from a background thread)."""
+        try:
+            self._load()
+        except Exception as e:
+            print(f"WARNING: DQN allocation model not loaded: {e}")
+
+    def _load(self):
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+            # Heavy imports only when the model is actually used
+            from joblib import load
+            from tensorflow.keras.models import load_model
+
+            self._scaler_x = load(self.scaler_x_path)
+            self._scaler_y = load(self.scaler_y_path)
+            self._model = load_model(self.model_path, custom_objects={"mse": "mse"}, compile=False)
+            print(f"OK: DQN allocation model loaded from {os.path.basename(self.model_path)}")
+
+    @staticmethod
+    def damage_vector(record):
+        """Model input row for a request / damage_assessment record."""
+        return tuple(max(int(record.get(f, 0) or 0), 0) for f in DAMAGE_FEATURES)
+
+    def predict_batch(self, damage_vectors):
+        """Predicted units per resource, shape ``(len(damage_vectors), n_resources)``.
+
+        Rows are in the resource order the model was trained on
+        (``resources`` ordered by resource_id).
+        """
+        keys = [tuple(int(v) for v in row) for row in damage_vectors]
+        results = [None] * len(keys)
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[i] = self._cache[key]
+
+        missing = sorted({key for key, r in zip(keys, results) if r is None})
+        if missing:
+            self._load()
+            x = self._scaler_x.transform(np.asarray(missing, dtype=np.float32))
+            y = self._scaler_y.inverse_transform(self._model.predict_on_batch(x))
+            predicted = dict(zip(missing, np.maximum(y, 0).astype(np.int64)))
+            with self._cache_lock:
+                for key, row in predicted.items():
+                    self._cache[key] = row
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            results = [r if r is not None else predicted[key] for key, r in zip(keys, results)]
+
+        if not results:
+            return np.zeros((0, 0), dtype=np.int64)
+        return np.stack(results)
+
+    def cache_info(self):
+        with self._cache_lock:
+            return {'entries': len(self._cache), 'capacity': self.cache_size, 'loaded': self._model is not None}
@@ -0,0 +1,155 @@
+"""
+Vectorized disaster-response simulator for comparing allocation policies.
+
+An episode is one damage_assessment-shaped situation: ``S`` damaged sites
+(building counts per damage category, as in the damage_assessment table),
+``D`` depots holding stock of ``R`` resources, and travel times between
+them. Whole batches of ``E`` episodes are generated and scored as NumPy
+arrays, so a policy that is itself vectorized (the greedy rule, the DQN
+predictor) is evaluated on thousands of episodes per second.
+
+A policy returns ``allocation[E, D, S, R]``: units of each resource sent
+from each depot to each site. ``evaluate`` checks it against stock and
+reports served demand and delivery latency.
+"""
+
+import numpy as np
+
+from allocation_solver import DEFAULT_TIER_MULTIPLIERS, solve_allocation
+
+DAMAGE_FIELDS = ('building_no_damage', 'building_minor_damage',
+                 'building_major_damage', 'building_total_destruction')
+# Units of demand per building in each damage category (none for undamaged buildings)
+TIER_UNITS = np.array([0] + [DEFAULT_TIER_MULTIPLIERS[f] for f in DAMAGE_FIELDS[1:]], dtype=np.int64)
+KM_PER_DEGREE = 111.0
+
+
+def generate_scenarios(episodes, sites=8, depots=3, resources=8, area_km=50.0, stock_ratio=0.6,
+                       speed_kmh=40.0, seed=None):
+    """Random batch of episodes.
+
+    Each site has ~Poisson(40) buildings split across damage categories by a
+    Dirichlet draw (most undamaged, few destroyed). Resource demand is the
+    tiered unit count times a per-resource weight. Depots hold
+    ``stock_ratio`` of the episode's total demand, so stock is scarce and
+    the policies have to choose.
+    """
+    rng = np.random.default_rng(seed)
+    E, S, D, R = episodes, sites, depots, resources
+
+    buildings = rng.poisson(40, size=(E, S))
+    shares = rng.dirichlet([4.0, 2.0, 1.0, 0.5], size=(E, S))
+    damage = rng.multinomial(buildings, shares)  # (E, S, 4)
+    units = damage @ TIER_UNITS  # (E, S)
+    weights = rng.uniform(0.5, 1.5, size=(E, 1, R))
+    demand = np.rint(units[:, :, None] * weights).astype(np.int64)  # (E, S, R)
+
+    # Severe sites first: 1 + 2 x share of major/destroyed buildings
+    severe = damage[:, :, 2:].sum(axis=2) / np.maximum(damage.sum(axis=2), 1)
+    priority = 1.0 + 2.0 * severe
+
+    split = rng.dirichlet(np.ones(D), size=(E, R)).transpose(0, 2, 1)  # (E, D, R)
+    stock = np.floor(demand.sum(axis=1)[:, None, :] * stock_ratio * split).astype(np.int64)
+
+    site_xy = rng.uniform(0, area_km, size=(E, S, 2))
+    depot_xy = rng.uniform(0, area_km, size=(E, D, 2))
+    km = np.linalg.norm(depot_xy[:, :, None, :] - site_xy[:, None, :, :], axis=3)  # (E, D, S)
+
+    return {
+        'damage': damage, 'demand': demand, 'priority': priority, 'stock': stock,
+        'site_xy': site_xy, 'depot_xy': depot_xy, 'km': km,
+        'travel_min': km / speed_kmh * 60.0,
+    }
+
+
+def dispatch(scenarios, wanted):
+    """Fill ``wanted[E, S, R]`` site by site (report order), each from its nearest depots first.
+
+    This is the rule /allocate-resources applies to one report against the
+    inventory, extended to several depots; vectorized over episodes and
+    resources, looping only over sites and depots.
+    """
+    stock = scenarios['stock'].copy()
+    E, D, R = stock.shape
+    S = wanted.shape[1]
+    allocation = np.zeros((E, D, S, R), dtype=np.int64)
+    order = np.argsort(scenarios['travel_min'], axis=1)  # (E, D, S): nearest depot first
+    episodes = np.arange(E)
+    for s in range(S):
+        need = np.maximum(wanted[:, s, :], 0).astype(np.int64)
+        for k in range(D):
+            d = order[:, k, s]
+            take = np.minimum(need, stock[episodes, d])
+            stock[episodes, d] -= take
+            allocation[episodes, d, s] += take
+            need -= take
+    return allocation
+
+
+def greedy_policy(scenarios):
+    """Current endpoint behaviour: every report takes its full tiered demand while stock lasts."""
+    return dispatch(scenarios, scenarios['demand'])
+
+
+def model_policy(service):
+    """Policy asking ``AllocationModelService`` what each site should get, then dispatching it."""
+    def policy(scenarios):
+        E, S, _ = scenarios['damage'].shape
+        wanted = service.predict_batch(scenarios['damage'].reshape(E * S, -1))
+        R = scenarios['stock'].shape[2]
+        if wanted.shape[1] != R:
+            raise ValueError(f"model predicts {wanted.shape[1]} resources, scenarios have {R}")
+        return dispatch(scenarios, wanted.reshape(E, S, R))
+    return policy
+
+
+def solver_policy(solver=None, time_limit=1.0):
+    """Optimization baseline: allocation_solver per episode (not vectorized)."""
+    def policy(scenarios):
+        E, D, R = scenarios['stock'].shape
+        S = scenarios['demand'].shape[1]
+        names = [f"r{r}" for r in range(R)]
+        allocation = np.zeros((E, D, S, R), dtype=np.int64)
+        for e in range(E):
+            # Flat grid in km -> pseudo lat/lon so the solver's haversine distances match
+            sites = [{'id': s, 'priority': float(scenarios['priority'][e, s]),
+                      'latitude': scenarios['site_xy'][e, s, 1] / KM_PER_DEGREE,
+                      'longitude': scenarios['site_xy'][e, s, 0] / KM_PER_DEGREE,
+                      'demand': dict(zip(names, scenarios['demand'][e, s].tolist()))} for s in range(S)]
+            depots = [{'name': d,
+                       'latitude': scenarios['depot_xy'][e, d, 1] / KM_PER_DEGREE,
+                       'longitude': scenarios['depot_xy'][e, d, 0] / KM_PER_DEGREE,
+                       'stock': dict(zip(names, scenarios['stock'][e, d].tolist()))} for d in range(D)]
+            result = solve_allocation(sites, depots, resources=names, solver=solver, time_limit=time_limit)
+            for line in result['allocations']:
+                allocation[e, line['depot'], line['site_id'], int(line['resource_name'][1:])] += line['quantity']
+        return allocation
+    return policy
+
+
+def evaluate(scenarios, allocation):
+    """Served demand and delivery latency of ``allocation[E, D, S, R]``, averaged over episodes."""
+    if (allocation < 0).any() or (allocation.sum(axis=2) > scenarios['stock']).any():
+        raise ValueError("allocation exceeds depot stock")
+
+    demand = scenarios['demand']
+    received = allocation.sum(axis=1)  # (E, S, R)
+    served = np.minimum(received, demand)
+    total_demand = np.maximum(demand.sum(axis=(1, 2)), 1)
+    weighted_demand = np.maximum((demand.sum(axis=2) * scenarios['priority']).sum(axis=1), 1)
+
+    # Mean and worst travel time of delivered units
+    units = allocation.sum(axis=3)  # (E, D, S)
+    travel = scenarios['travel_min']
+    delivered = units.sum(axis=(1, 2))
+    mean_minutes = (units * travel).sum(axis=(1, 2)) / np.maximum(delivered, 1)
+    worst_minutes = np.where(units > 0, travel, 0).max(axis=(1, 2))
+
+    return {
+        'served_fraction': float((served.sum(axis=(1, 2)) / total_demand).mean()),
+        'priority_served_fraction': float(((served.sum(axis=2) * scenarios['priority']).sum(axis=1)
+                                           / weighted_demand).mean()),
+        'oversupplied_units': float((received - served).sum(axis=(1, 2)).mean()),
+        'mean_delivery_minutes': float(mean_minutes.mean()),
+        'worst_delivery_minutes': float(worst_minutes.mean()),
+    }
@@ -0,0 +1,247 @@
+"""
+Optimization-based allocation of resources from depots to damage sites.
+
+Each resource type is an independent transportation problem: ship
+``x[d, s]`` units from depot ``d`` to site ``s`` so that no depot ships
+more than it holds and no site receives more than it needs, maximising
+
+    sum  x[d, s] * (priority[s] * SERVE_VALUE - cost_per_km * km[d, s])
+
+SERVE_VALUE is large compared with travel cost, so demand is always
+served when stock exists; priorities decide who gets scarce stock and
+distance decides where it comes from. The constraint matrix is totally
+unimodular, so a vertex solution (dual simplex) is integral.
+
+SciPy's HiGHS solver is used when available; otherwise a pure-Python
+successive-shortest-path min-cost flow solves the same problem. Both stop
+at ``time_limit`` seconds and then report ``optimal: False`` with the best
+feasible allocation found so far. A HiGHS iterate that is not primal
+feasible is discarded and the min-cost flow result is used instead.
+"""
+
+import heapq
+import math
+import time
+
+try:
+    import numpy as np
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+except ImportError:  # pure-Python fallback below
+    linprog = None
+
+# Units of every resource requested per damaged building
+DEFAULT_TIER_MULTIPLIERS = {
+    'building_minor_damage': 1,
+    'building_major_damage': 3,
+    'building_total_destruction': 5,
+}
+SERVE_VALUE = 1000.0
+DEFAULT_COST_PER_KM = 1.0
+DEFAULT_TIME_LIMIT = 10.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = 6371
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def distance_km(depot, site):
+    try:
+        return haversine_km(float(depot['latitude']), float(depot['longitude']),
+                            float(site['latitude']), float(site['longitude']))
+    except (KeyError, TypeError, ValueError):
+        return 0.0  # unknown location: travel cost does not discriminate
+
+
+def site_demand(site, resources, tier_multipliers=None):
+    """Units of each resource a site needs: explicit ``demand`` or derived from damage counts."""
+    if site.get('demand'):
+        return {name: max(int(site['demand'].get(name, 0)), 0) for name in resources}
+    tier_multipliers = tier_multipliers or DEFAULT_TIER_MULTIPLIERS
+    units = sum(max(int(site.get(field, 0) or 0), 0) * mult for field, mult in tier_multipliers.items())
+    return {name: units for name in resources}
+
+
+def _solve_highs(profit, stock, demand, time_limit):
+    """Max-profit transportation problem via SciPy/HiGHS dual simplex.
+
+    Returns ``(None, False)`` when HiGHS has no primal-feasible solution.
+    """
+    D, S = len(stock), len(demand)
+    rows = np.concatenate([np.repeat(np.arange(D), S), D + np.tile(np.arange(S), D)])
+    cols = np.concatenate([np.arange(D * S), np.arange(D * S)])
+    A = coo_matrix((np.ones(2 * D * S), (rows, cols)), shape=(D + S, D * S)).tocsr()
+    b = np.concatenate([stock, demand]).astype(float)
+
+    c = -np.asarray(profit, dtype=float).ravel()
+    bounds = [(0, 0) if p <= 0 else (0, None) for p in -c]  # unprofitable arcs stay closed
+    res = linprog(c, A_ub=A, b_ub=b, bounds=bounds, method='highs-ds',
+                  options={'time_limit': max(time_limit, 0.01)})
+    if res.x is None or res.status not in (0, 1):
+        return None, False
+    # A dual simplex iterate cut off by the time limit may be primal-infeasible
+    x = np.rint(res.x).astype(int)
+    upper = np.array([hi if hi is not None else np.inf for _, hi in bounds])
+    if (x < 0).any() or (x > upper).any() or (A @ x > b).any():
+        return None, False
+    return x.reshape(D, S).tolist(), res.status == 0
+
+
+def _solve_min_cost_flow(profit, stock, demand, deadline):
+    """Same problem as ``_solve_highs`` as successive shortest paths.
+
+    Nodes: source, depots, sites, sink. Each augmentation pushes flow along
+    the most profitable residual path; we stop when no profitable path is
+    left (optimal) or the deadline passes (feasible, not proven optimal).
+    """
+    D, S = len(stock), len(demand)
+    source, sink = D + S, D + S + 1
+    n = D + S + 2
+    graph = [[] for _ in range(n)]  # edge: [to, capacity, cost, index of reverse edge]
+
+    def add_edge(u, v, cap, cost):
+        graph[u].append([v, cap, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+
+    for d in range(D):
+        if stock[d] > 0:
+            add_edge(source, d, stock[d], 0.0)
+    arc_index = {}
+    for d in range(D):
+        for s in range(S):
+            if profit[d][s] > 0 and stock[d] > 0 and demand[s] > 0:
+                arc_index[(d, s)] = len(graph[d])
+                add_edge(d, D + s, min(stock[d], demand[s]), -profit[d][s])
+    for s in range(S):
+        if demand[s] > 0:
+            add_edge(D + s, sink, demand[s], 0.0)
+
+    # Initial potentials: the only negative costs are depot->site arcs
+    potential = [0.0] * n
+    for s in range(S):
+        best = min((-profit[d][s] for d in range(D) if (d, s) in arc_index), default=0.0)
+        potential[D + s] = min(best, 0.0)
+    potential[sink] = min(potential[D:D + S], default=0.0)
+
+    optimal = True
+    while True:
+        if time.monotonic() > deadline:
+            optimal = False
+            break
+        dist = [math.inf] * n
+        prev = [None] * n
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            du, u = heapq.heappop(heap)
+            if du > dist[u]:
+                continue
+            for i, (v, cap, cost, _) in enumerate(graph[u]):
+                if cap <= 0:
+                    continue
+                nd = du + cost + potential[u] - potential[v]
+                if nd < dist[v] - 1e-12:
+                    dist[v] = nd
+                    prev[v] = (u, i)
+                    heapq.heappush(heap, (nd, v))
+        if dist[sink] == math.inf:
+            break
+        for v in range(n):
+            if dist[v] < math.inf:
+                potential[v] += dist[v]
+        if potential[sink] - potential[source] >= 0:
+            break  # the cheapest remaining path no longer gains anything
+
+        push, v = math.inf, sink
+        while v != source:
+            u, i = prev[v]
+            push = min(push, graph[u][i][1])
+            v = u
+        v = sink
+        while v != source:
+            u, i = prev[v]
+            edge = graph[u][i]
+            edge[1] -= push
+            graph[v][edge[3]][1] += push
+            v = u
+
+    x = [[0] * S for _ in range(D)]
+    for (d, s), i in arc_index.items():
+        v, cap, _, rev = graph[d][i]
+        x[d][s] = int(graph[v][rev][1])  # flow == residual capacity of the reverse edge
+    return x, optimal
+
+
+def solve_allocation(sites, depots, resources=None, tier_multipliers=None,
+                     cost_per_km=DEFAULT_COST_PER_KM, time_limit=DEFAULT_TIME_LIMIT, solver=None):
+    """Allocate every resource from ``depots`` to ``sites`` in one optimization.
+
+    sites:   [{'id', 'latitude', 'longitude', 'priority' (default 1),
+               damage counts (building_*) or 'demand': {resource: qty}}]
+    depots:  [{'name', 'latitude', 'longitude', 'stock': {resource: qty}}]
+    solver:  'highs', 'flow' or None (HiGHS when SciPy is installed)
+    """
+    start = time.monotonic()
+    deadline = start + time_limit
+    if resources is None:
+        resources = sorted({name for depot in depots for name in depot.get('stock', {})})
+    solver = solver or ('highs' if linprog is not None else 'flow')
+    if solver == 'highs' and linprog is None:
+        raise RuntimeError("SciPy is not installed; use solver='flow'")
+
+    priorities = [max(float(site.get('priority', 1) or 0), 0.0) for site in sites]
+    km = [[distance_km(depot, site) for site in sites] for depot in depots]
+    profit = [[priorities[s] * SERVE_VALUE - cost_per_km * km[d][s] for s in range(len(sites))]
+              for d in range(len(depots))]
+    demands = [site_demand(site, resources, tier_multipliers) for site in sites]
+
+    allocations, optimal, objective = [], True, 0.0
+    served = {site.get('id', s): {} for s, site in enumerate(sites)}
+    for name in resources:
+        stock = [max(int(depot.get('stock', {}).get(name, 0)), 0) for depot in depots]
+        demand = [dem[name] for dem in demands]
+        if not any(stock) or not any(demand):
+            continue
+        remaining = deadline - time.monotonic()
+        if solver == 'highs':
+            x, ok = _solve_highs(profit, stock, demand, remaining)
+            if x is None:
+                print(f"WARNING: HiGHS returned no feasible allocation for {name}, using min-cost flow")
+                x, ok = _solve_min_cost_flow(profit, stock, demand, deadline)
+                ok = False
+        else:
+            x, ok = _solve_min_cost_flow(profit, stock, demand, deadline)
+        optimal = optimal and ok
+
+        for d, depot in enumerate(depots):
+            for s, site in enumerate(sites):
+                qty = x[d][s]
+                if qty > 0:
+                    site_id = site.get('id', s)
+                    allocations.append({'site_id': site_id, 'depot': depot.get('name', d),
+                                        'resource_name': name, 'quantity': qty,
+                                        'distance_km': round(km[d][s], 2)})
+                    served[site_id][name] = served[site_id].get(name, 0) + qty
+                    objective += qty * profit[d][s]
+
+    unmet = {}
+    for s, site in enumerate(sites):
+        site_id = site.get('id', s)
+        short = {name: demands[s][name] - served[site_id].get(name, 0) for name in resources}
+        short = {name: qty for name, qty in short.items() if qty > 0}
+        if short:
+            unmet[site_id] = short
+
+    return {
+        'allocations': allocations,
+        'served': served,
+        'unmet': unmet,
+        'objective': round(objective, 2),
+        'solver': solver,
+        'optimal': optimal,
+        'elapsed_ms': round((time.monotonic() - start) * 1000, 2),
+    }
@@ -1,6 +1,6 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import emit, join_room, leave_room, rooms
 import sqlite3
 from werkzeug.security import check_password_hash, generate_password_hash
 import jwt
@@ -9,38 +9,127 @@ import os
 import requests
 import threading
 import time
+import hmac
 
 import random
 import math
 import uuid
+import base64
 
 from groq import Groq
 from dotenv import load_dotenv
 
+from allocation_model import AllocationModelService
+from allocation_solver import DEFAULT_COST_PER_KM, DEFAULT_TIME_LIMIT, solve_allocation
+from assessment_pipeline import AssessmentWorker
+from cascade import CASCADE_ENABLED, CASCADE_GATE_SIZE, CASCADE_MIN_CONFIDENCE, DamageCascade
+from image_pipeline import DerivativeWorker
+from image_store import (discard_upload, file_extension, link_report_image, place_upload, release_report_images,
+                         remove_files, remove_orphaned, store_upload)
+from model_registry import ModelRegistry, ModelUnavailable
+from realtime import alert_rooms, alert_subscription_rooms, create_socketio, event_rooms, subscription_rooms
+from resource_inventory import InsufficientStock, ResourceInventory
+from result_cache import ResultCache, file_sha256
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default-dev-secret-key')
 
 CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'Rescuevision.db')
 RESOURCE_DB_PATH = os.path.join(BASE_DIR, 'rescueplex.db')
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+DERIVATIVE_FOLDER = os.path.join(UPLOAD_FOLDER, 'derivatives')
+DERIVATIVE_MAX_AGE = 365 * 24 * 3600
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-try:
+# Models load on first use; see model_registry.py and /api/models
+registry = ModelRegistry(num_threads=int(os.getenv('TORCH_THREADS', 0)) or None)
+
+def load_damage_assessor(path, device):
     from inference_damage import DamageAssessor
-    model_path = os.path.join(BASE_DIR, 'best_model.pth')
-    damage_assessor = DamageAssessor(model_path)
-except Exception as e:
-    print(f"Warning: Could not load DamageAssessor model: {e}")
-    damage_assessor = None
+    return DamageAssessor(path, device=device)
+
+def load_disaster_classifier(path, device):
+    from utils.predict_disaster import DisasterClassifier
+    return DisasterClassifier(path, device=device)
+
+def load_segmentation_model(path, device):
+    # Segmentation network class, e.g. "mymodels.unet:UNet" (checkpoint with model_state_dict)
+    model_class = os.getenv('SEGMENTATION_MODEL_CLASS')
+    if not model_class:
+        raise ModelUnavailable("SEGMENTATION_MODEL_CLASS is not set")
+    import importlib
+    from utils.predict import SegmentationPredictor
+    module_name, class_name = model_class.split(':')
+    return SegmentationPredictor.from_checkpoint(path, getattr(importlib.import_module(module_name), class_name),
+                                                 device=device)
+
+def predict_segmentation(predictor, image_path):
+    import cv2
+    mask, damage_percentage = predictor.predict(image_path)
+    _, png = cv2.imencode('.png', mask * 255)
+    return {'damage_percentage': round(float(damage_percentage), 2),
+            'mask_png_b64': base64.b64encode(png).decode('utf-8')}
+
+def image_and_gradcam(inputs):
+    # Damage predictions take a path, or (path, gradcam) to choose whether Grad-CAM runs
+    return inputs if isinstance(inputs, tuple) else (inputs, True)
+
+def predict_damage(assessor, inputs):
+    image_path, gradcam = image_and_gradcam(inputs)
+    return assessor.predict(image_path, gradcam=gradcam)
+
+def load_disaster_detector(path, device):
+    from disaster_detector import DisasterDetector
+    return DisasterDetector(path, device=device)
+
+def predict_detections(detector, inputs):
+    # A single image path, or {"images": [...], "imgsz": ..., "conf": ...} for a batch
+    if isinstance(inputs, str):
+        return detector.detect(inputs)
+    return detector.detect_batch(inputs['images'], imgsz=inputs.get('imgsz'), conf=inputs.get('conf'))
+
+def predict_disaster_type(classifier, image_path):
+    label, confidence = classifier.predict(image_path)
+    return {'predicted_label': label, 'confidence': round(confidence, 2)}
+
+registry.register('damage', load_damage_assessor, predict_damage,
+                  path=os.path.join(BASE_DIR, 'best_model.pth'))
+registry.register('disaster', load_disaster_classifier, predict_disaster_type,
+                  path=os.path.join(BASE_DIR, 'models', 'disaster_classifier.pth'))
+registry.register('segmentation', load_segmentation_model, predict_segmentation,
+                  path=os.getenv('SEGMENTATION_MODEL', os.path.join(BASE_DIR, 'models', 'segmentation_model.pth')))
+registry.register('detector', load_disaster_detector, predict_detections,
+                  path=os.getenv('DETECTOR_WEIGHTS', os.path.join(BASE_DIR, 'runs', 'detect', 'train3', 'weights', 'best.pt')))
+# Always resolves to the serving version, so hot-swaps reach the assessment worker too
+damage_assessor = registry.proxy('damage')
+# Disaster-type gate in front of the damage assessor: 'normal' photos skip it (cascade.py)
+registry.register('cascade', lambda path, device: DamageCascade(registry.proxy('disaster'), damage_assessor),
+                  predict_damage)
+damage_pipeline = registry.get('cascade') if CASCADE_ENABLED else damage_assessor
+
+def assessment_fingerprint():
+    # Everything that decides an assessment result, taken from the loaded models (not the files on disk);
+    # cached results from other models are dropped
+    parts = [registry.fingerprint('damage')]
+    if CASCADE_ENABLED:
+        parts += [registry.fingerprint('disaster'), CASCADE_GATE_SIZE, CASCADE_MIN_CONFIDENCE]
+    return ':'.join(map(str, parts))
+
+# Re-uploaded images skip the models entirely (RESULT_CACHE_MB, RESULT_CACHE_DB, RESULT_CACHE_NEAR_DISTANCE)
+assessment_cache = ResultCache(assessment_fingerprint)
 
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Shared secret for model hot-swaps and cache clears (X-Admin-Token header); both are disabled without it
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
+# SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) shares broadcasts between workers
+socketio = create_socketio(app, cors_allowed_origins="*")
 
 if not GROQ_API_KEY:
     print("WARNING: GROQ_API_KEY not found in environment variables")
@@ -92,6 +181,50 @@ def init_db():
     except sqlite3.OperationalError:
         pass # Columns already exist
 
+    # Uploaded images are content-addressed (see image_store.py): one row per
+    # distinct file in `images`, linked to reports through `report_images`.
+    # disaster_reports.images is only read for reports created before this.
+    c.execute("""CREATE TABLE IF NOT EXISTS images (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size_bytes INTEGER,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        width INTEGER,
+        height INTEGER,
+        thumb TEXT,
+        preview TEXT,
+        status TEXT DEFAULT 'pending',
+        damage_label TEXT,
+        damage_level INTEGER,
+        damage_confidence REAL,
+        assessed_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS report_images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_id INTEGER NOT NULL,
+        sha256 TEXT,
+        filename TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_report_images_report ON report_images (report_id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_report_images_unique ON report_images (report_id, sha256)")
+
+    # Automatic damage assessment results (assessment_pipeline.py)
+    retrofit_columns = {
+        'disaster_reports': {'ai_damage_level': 'INTEGER', 'ai_damage_label': 'TEXT',
+                             'ai_confidence': 'REAL', 'ai_priority': 'REAL'},
+        'images': {'damage_label': 'TEXT', 'damage_level': 'INTEGER',
+                   'damage_confidence': 'REAL', 'assessed_at': 'TIMESTAMP'},
+    }
+    for table, columns in retrofit_columns.items():
+        c.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in c.fetchall()}
+        for col, col_type in columns.items():
+            if col not in existing:
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+
     c.execute("""CREATE TABLE IF NOT EXISTS chatbot_logs (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_message TEXT NOT NULL,
@@ -131,6 +264,10 @@ def init_db():
 
 init_db()
 
+# Thumbnails/previews are generated off the request path
+derivative_worker = DerivativeWorker(DB_PATH, UPLOAD_FOLDER, DERIVATIVE_FOLDER).start()
+
+
 @socketio.on('connect')
 def handle_connect():
     print('OK: Client connected')
@@ -140,6 +277,48 @@ def handle_connect():
 def handle_disconnect():
     print('X: Client disconnected')
 
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join region / severity / report rooms; see realtime.subscription_rooms."""
+    joined = subscription_rooms(data)
+    joined += alert_subscription_rooms(joined)
+    for room in joined:
+        join_room(room)
+    emit('subscribed', {'rooms': joined})
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data=None):
+    """Leave the given subscription, or every subscription when no payload is sent."""
+    if data:
+        targets = subscription_rooms(data)
+        targets += alert_subscription_rooms(targets)
+    else:
+        targets = [r for r in rooms() if r != request.sid]
+    for room in targets:
+        leave_room(room)
+    # Alert rooms can be shared by several subscribed cells: rejoin those still needed
+    for room in alert_subscription_rooms(rooms()):
+        join_room(room)
+    emit('unsubscribed', {'rooms': targets})
+
+def emit_report_event(event, payload, latitude=None, longitude=None, severity=None, report_id=None):
+    """Emit a report event only to the rooms subscribed to that report's region and severity."""
+    socketio.emit(event, payload, to=event_rooms(latitude, longitude, severity, report_id))
+
+
+def on_report_assessed(report):
+    emit_report_event('disaster_report_assessed', {
+        'report_id': report['report_id'], 'severity': report['severity'], 'escalated': report['escalated'],
+        'ai_damage_level': report['ai_damage_level'], 'ai_damage_label': report['ai_damage_label'],
+        'ai_confidence': report['ai_confidence'], 'ai_priority': report['ai_priority'],
+        'timestamp': datetime.now().isoformat()
+    }, report['latitude'], report['longitude'], report['severity'], report['report_id'])
+
+# Report images are classified in batches after the submission has returned
+assessment_worker = (AssessmentWorker(DB_PATH, UPLOAD_FOLDER, damage_pipeline, on_assessed=on_report_assessed).start()
+                     if damage_assessor else None)
+
+
 @app.route('/api/officer/register', methods=['POST'])
 def officer_register():
     data = request.get_json()
@@ -409,12 +588,12 @@ def notify_disaster():
         conn.commit()
         conn.close()
 
-        socketio.emit('new_disaster_report', {
+        emit_report_event('new_disaster_report', {
             'id': report_id, 'name': disaster_type, 'location': location_name,
             'severity': severity, 'reporter_name': 'Admin',
             'latitude': latitude, 'longitude': longitude,
             'timestamp': datetime.now().isoformat()
-        })
+        }, latitude, longitude, severity, report_id)
 
         send_telegram_alert(
             f"🚨 ADMIN ALERT\n📍 {location_name}\n🔥 {disaster_type}\n⚠️ {severity}\n\n{description}"
@@ -433,6 +612,7 @@ def notify_disaster():
 
 @app.route('/api/disaster/report', methods=['POST'])
 def report_disaster():
+    uploaded_images = []
     try:
         is_json = request.content_type and 'application/json' in request.content_type
         if is_json:
@@ -483,18 +663,15 @@ def report_disaster():
             except:
                 pass
 
-        uploaded_images = []
-        if 'images' in request.files:
-            files = request.files.getlist('images')
-            for file in files:
-                if file and file.filename != '':
-                    ext = file.filename.rsplit('.', 1)[-1].lower()
-                    filename = f"{uuid.uuid4().hex}.{ext}"
-                    save_path = os.path.join(UPLOAD_FOLDER, filename)
-                    file.save(save_path)
-                    uploaded_images.append(filename)
+        files = [file for file in request.files.getlist('images') if file and file.filename != '']
+        for file in files:
+            if file_extension(file.filename) is None:
+                return jsonify({'success': False, 'error': f'Invalid file type: {file.filename}'}), 400
+        for file in files:
+            # (sha256, relative path, size, temporary file); duplicates share one file on disk
+            uploaded_images.append(store_upload(file, UPLOAD_FOLDER))
 
-        images_str = ",".join(uploaded_images) if uploaded_images else None
+        images_str = None  # images live in report_images now
 
         conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
@@ -503,9 +680,22 @@ def report_disaster():
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
                   (name, location, description, severity, reporter_name, reporter_phone, reporter_email, casualties, affected_people, images_str, latitude, longitude))
         report_id = c.lastrowid
+        linked = [link_report_image(c, report_id, sha256, rel_path, size)
+                  for sha256, rel_path, size, _ in uploaded_images]
         conn.commit()
         conn.close()
 
+        # Files go into place only now that the references are committed (see image_store.py),
+        # at the path the store already uses for that content
+        for (_, stored_path), (_, _, _, tmp_path) in zip(linked, uploaded_images):
+            place_upload(UPLOAD_FOLDER, stored_path, tmp_path)
+        new_images = [sha256 for (is_new, _), (sha256, _, _, _) in zip(linked, uploaded_images) if is_new]
+        for sha256 in new_images:
+            derivative_worker.enqueue(sha256)
+        if assessment_worker:
+            for sha256, _, _, _ in uploaded_images:
+                assessment_worker.enqueue(report_id, sha256)
+
         # Map severity number to label for better readability in Telegram
         severity_labels = {'1': 'Low', '2': 'Moderate', '3': 'Severe', '4': 'Critical', '5': 'Extreme'}
         severity_text = severity_labels.get(severity, severity)
@@ -527,13 +717,13 @@ def report_disaster():
 
         send_telegram_alert(alert_msg)
 
-        socketio.emit('new_disaster_report', {
+        emit_report_event('new_disaster_report', {
             'id': report_id, 'name': name, 'location': location,
             'severity': severity, 'reporter_name': reporter_name,
             'casualties': casualties, 'affected_people': affected_people,
             'latitude': latitude, 'longitude': longitude,
             'timestamp': datetime.now().isoformat()
-        })
+        }, latitude, longitude, severity, report_id)
 
         print(f"OK: Report #{report_id} created successfully")
         return jsonify({'success': True, 'message': 'Report submitted', 'report_id': report_id}), 201
@@ -541,6 +731,8 @@ def report_disaster():
     except Exception as e:
         import traceback
         traceback.print_exc()
+        for _, _, _, tmp_path in uploaded_images:
+            discard_upload(tmp_path)
         print(f"ERROR: Report submission error: {str(e)}")
         return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
 
@@ -557,19 +749,36 @@ def update_disaster_status(report_id):
     c = conn.cursor()
     c.execute('UPDATE disaster_reports SET status = ? WHERE id = ?', (new_status, report_id))
     conn.commit()
-    c.execute('SELECT name, location, reporter_phone FROM disaster_reports WHERE id = ?', (report_id,))
+    c.execute('SELECT name, location, reporter_phone, severity, latitude, longitude FROM disaster_reports WHERE id = ?', (report_id,))
     report = c.fetchone()
     conn.close()
 
     if report:
-        socketio.emit('disaster_status_updated', {
+        emit_report_event('disaster_status_updated', {
             'report_id': report_id, 'name': report[0], 'location': report[1],
             'new_status': new_status, 'timestamp': datetime.now().isoformat()
-        })
+        }, report[4], report[5], report[3], report_id)
 
     return jsonify({'success': True, 'message': 'Status updated'}), 200
 
 
+@app.route('/api/disaster/report/<int:report_id>', methods=['DELETE'])
+def delete_disaster_report(report_id):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('DELETE FROM disaster_reports WHERE id = ?', (report_id,))
+    if c.rowcount == 0:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Report not found'}), 404
+    orphaned = release_report_images(c, report_id)
+    conn.commit()
+    conn.close()
+
+    # Only files no other report references any more
+    remove_orphaned(DB_PATH, UPLOAD_FOLDER, orphaned)
+    return jsonify({'success': True, 'message': 'Report deleted'}), 200
+
+
 @app.route('/api/disaster/stats', methods=['GET'])
 def get_stats():
     try:
@@ -625,18 +834,43 @@ def get_stats():
 def get_reports():
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute('SELECT id, name, location, description, severity, reporter_name, reporter_phone, reporter_email, casualties, affected_people, images, status, created_at, latitude, longitude FROM disaster_reports ORDER BY created_at DESC')
+    # ?sort=priority puts reports with the most severe predicted image damage first
+    order_by = 'COALESCE(ai_priority, -1) DESC, created_at DESC' if request.args.get('sort') == 'priority' else 'created_at DESC'
+    c.execute(f'SELECT id, name, location, description, severity, reporter_name, reporter_phone, reporter_email, casualties, affected_people, images, status, created_at, latitude, longitude, ai_damage_level, ai_damage_label, ai_confidence, ai_priority FROM disaster_reports ORDER BY {order_by}')
     rows = c.fetchall()
+    c.execute('''SELECT ri.report_id, ri.filename, i.sha256, i.width, i.height, i.thumb, i.preview, i.status
+                 FROM report_images ri JOIN images i ON i.sha256 = ri.sha256
+                 ORDER BY ri.id''')
+    images, derivatives = {}, {}
+    for d in c.fetchall():
+        images.setdefault(d[0], []).append(d[1])
+        if d[7] == 'ready':
+            derivatives.setdefault(d[0], []).append({
+                'filename': d[1], 'sha256': d[2], 'width': d[3], 'height': d[4],
+                'thumb_url': f"/api/uploads/derivatives/{d[5]}",
+                'preview_url': f"/api/uploads/derivatives/{d[6]}",
+            })
     conn.close()
 
     return jsonify({'success': True, 'reports': [
         {'id': r[0], 'name': r[1], 'location': r[2], 'description': r[3],
          'severity': r[4], 'reporter_name': r[5], 'reporter_phone': r[6],
          'reporter_email': r[7], 'casualties': r[8], 'affected_people': r[9],
-         'images': r[10], 'status': r[11], 'created_at': r[12], 'latitude': r[13], 'longitude': r[14]} for r in rows
+         'images': ",".join(images[r[0]]) if r[0] in images else r[10],
+         'status': r[11], 'created_at': r[12], 'latitude': r[13], 'longitude': r[14],
+         'image_derivatives': derivatives.get(r[0], []),
+         'ai_damage_level': r[15], 'ai_damage_label': r[16], 'ai_confidence': r[17], 'ai_priority': r[18]} for r in rows
     ]})
 
 
+@app.route('/api/uploads/derivatives/<path:filename>', methods=['GET'])
+def get_image_derivative(filename):
+    # Names embed the original's SHA-256, so the content behind a URL never changes
+    response = send_from_directory(DERIVATIVE_FOLDER, filename, max_age=DERIVATIVE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={DERIVATIVE_MAX_AGE}, immutable'
+    return response
+
+
 @app.route('/api/chatbot/groq-chat', methods=['POST'])
 def groq_chat():
     try:
@@ -707,28 +941,41 @@ def log_conversation(user_msg, bot_msg, location):
         print(f"WARNING: Logging error: {e}")
 
 
+ALLOWED_MODEL_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
+
+def save_temp_image(file):
+    """Save an uploaded image for a model under a random name; (path, error) with exactly one set"""
+    if file is None:
+        return None, 'No image file provided'
+    if file.filename == '':
+        return None, 'No file selected'
+    ext = file.filename.rsplit('.', 1)[-1].lower()
+    if ext not in ALLOWED_MODEL_IMAGE_EXTENSIONS:
+        return None, 'Invalid file type'
+    save_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.{ext}")
+    file.save(save_path)
+    return save_path, None
+
 @app.route('/api/damage/assess', methods=['POST'])
 def assess_damage():
     if not damage_assessor:
         return jsonify({'success': False, 'error': 'Damage assessment model not loaded.'}), 503
 
     try:
-        if 'image' not in request.files:
-            return jsonify({'success': False, 'error': 'No image file provided'}), 400
-
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'}), 400
-
-        ext = file.filename.rsplit('.', 1)[-1].lower()
-        if ext not in {'png', 'jpg', 'jpeg', 'webp'}:
-            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
-
-        save_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.{ext}")
-        file.save(save_path)
+        save_path, error = save_temp_image(request.files.get('image'))
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
 
+        gradcam = request.form.get('gradcam', 'true').lower() not in ('0', 'false', 'no')
+        variant = 'gradcam' if gradcam else 'plain'
         try:
-            result = damage_assessor.predict(save_path)
+            sha256 = file_sha256(save_path)
+            result, cached = assessment_cache.get(sha256, variant, save_path)
+            if result is None:
+                # A model swapped in while this runs must not inherit its result
+                model = assessment_fingerprint()
+                result = registry.predict('cascade' if CASCADE_ENABLED else 'damage', (save_path, gradcam))
+                assessment_cache.put(sha256, result, variant, save_path, model=model)
         finally:
             if os.path.exists(save_path):
                 os.remove(save_path)
@@ -741,13 +988,147 @@ def assess_damage():
             'color': result['color'],
             'all_probabilities': result['all_probabilities'],
             'gradcam_heatmap_b64': result['gradcam_heatmap_b64'],
+            'cascade': result.get('cascade'),
+            'cached': cached,
         }), 200
 
+    except ModelUnavailable as e:
+        print(f"WARNING: {e}")
+        return jsonify({'success': False, 'error': 'Damage assessment model not loaded.'}), 503
     except Exception as e:
         print(f"Damage assessment error: {str(e)}")
         return jsonify({'success': False, 'error': 'Assessment failed.'}), 500
 
 
+def admin_token_error(action):
+    """Error response unless the request carries MODEL_ADMIN_TOKEN in X-Admin-Token, else None"""
+    if not MODEL_ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Disabled: MODEL_ADMIN_TOKEN is not set'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), MODEL_ADMIN_TOKEN.encode()):
+        print(f"WARNING: Rejected {action} from {request.remote_addr}")
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 401
+    return None
+
+@app.route('/api/damage/cache', methods=['GET', 'DELETE'])
+def damage_cache():
+    if request.method == 'DELETE':
+        # Clearing both tiers forces every image through the models again: admins only
+        denied = admin_token_error("damage cache clear")
+        if denied:
+            return denied
+        assessment_cache.clear()
+    return jsonify(dict(assessment_cache.stats(), success=True))
+
+
+DETECT_MAX_IMAGES = 16
+
+@app.route('/api/detect', methods=['POST'])
+def detect_disasters():
+    """YOLO boxes and per-class counts for one or more uploaded 'images' (optional imgsz, conf)"""
+    if not registry.available('detector'):
+        return jsonify({'success': False, 'error': 'Disaster detector not loaded.'}), 503
+
+    files = request.files.getlist('images') or request.files.getlist('image')
+    if not files:
+        return jsonify({'success': False, 'error': 'No images uploaded'}), 400
+    if len(files) > DETECT_MAX_IMAGES:
+        return jsonify({'success': False, 'error': f'At most {DETECT_MAX_IMAGES} images per request'}), 400
+    imgsz = request.form.get('imgsz', type=int)
+    conf = request.form.get('conf', type=float)
+    if imgsz is not None and not 32 <= imgsz <= 1920:
+        return jsonify({'success': False, 'error': 'imgsz must be between 32 and 1920'}), 400
+    if conf is not None and not 0 <= conf <= 1:
+        return jsonify({'success': False, 'error': 'conf must be between 0 and 1'}), 400
+
+    paths = []
+    try:
+        for file in files:
+            save_path, error = save_temp_image(file)
+            if error:
+                return jsonify({'success': False, 'error': f'{file.filename}: {error}'}), 400
+            paths.append(save_path)
+
+        start = time.perf_counter()
+        results = registry.predict('detector', {'images': paths, 'imgsz': imgsz, 'conf': conf})
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+    except ModelUnavailable as e:
+        print(f"WARNING: {e}")
+        return jsonify({'success': False, 'error': 'Disaster detector not loaded.'}), 503
+    except Exception as e:
+        print(f"ERROR: Disaster detection failed: {e}")
+        return jsonify({'success': False, 'error': 'Detection failed.'}), 500
+    finally:
+        remove_files(UPLOAD_FOLDER, paths)
+
+    totals = {}
+    for file, result in zip(files, results):
+        result['filename'] = file.filename
+        for name, count in result['counts'].items():
+            totals[name] = totals.get(name, 0) + count
+    return jsonify({'success': True, 'latency_ms': latency_ms, 'counts': totals, 'images': results}), 200
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    return jsonify(dict(registry.metrics(), success=True))
+
+@app.route('/api/models/<name>', methods=['GET'])
+def describe_model(name):
+    if name not in registry.names():
+        return jsonify({'success': False, 'error': f'Unknown model: {name}'}), 404
+    return jsonify(dict(registry.describe(name), success=True))
+
+@app.route('/api/models/<name>/predict', methods=['POST'])
+def model_predict(name):
+    if name not in registry.names():
+        return jsonify({'success': False, 'error': f'Unknown model: {name}'}), 404
+    if not registry.available(name):
+        return jsonify({'success': False, 'error': f'Model {name} is not available'}), 503
+
+    save_path, error = save_temp_image(request.files.get('image'))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    try:
+        start = time.perf_counter()
+        result = registry.predict(name, save_path)
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+    except ModelUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        print(f"ERROR: Model {name} prediction failed: {e}")
+        return jsonify({'success': False, 'error': 'Prediction failed.'}), 500
+    finally:
+        if os.path.exists(save_path):
+            os.remove(save_path)
+
+    return jsonify({'success': True, 'model': name, 'latency_ms': latency_ms, 'result': result}), 200
+
+MODEL_CHECKPOINT_FOLDER = os.path.realpath(os.path.join(BASE_DIR, 'models'))
+MODEL_CHECKPOINT_EXTENSIONS = ('.pth', '.pt')
+
+@app.route('/api/models/<name>/reload', methods=['POST'])
+def reload_model(name):
+    """Hot-swap a model: {"path": optional models/*.pth or .pt checkpoint, "version": optional label}
+
+    Needs the MODEL_ADMIN_TOKEN in an X-Admin-Token header.
+    """
+    denied = admin_token_error(f"model reload of {name}")
+    if denied:
+        return denied
+    if name not in registry.names():
+        return jsonify({'success': False, 'error': f'Unknown model: {name}'}), 404
+    data = request.get_json(silent=True) or {}
+    path = data.get('path')
+    if path:
+        path = os.path.realpath(os.path.join(BASE_DIR, path))
+        if not path.startswith(MODEL_CHECKPOINT_FOLDER + os.sep) or not path.endswith(MODEL_CHECKPOINT_EXTENSIONS):
+            return jsonify({'success': False, 'error': 'Checkpoint must be a .pth or .pt file inside backend/models'}), 400
+    try:
+        return jsonify(dict(registry.swap(name, path=path, version=data.get('version')), success=True)), 200
+    except Exception as e:
+        print(f"ERROR: Could not swap model {name}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     print(f"OK: Health check received from {request.remote_addr}")
@@ -785,47 +1166,162 @@ MOCK_RESOURCES = [
     {"resource_name": "Communication Kits",     "quantity": 35},
 ]
 
-_resources = [dict(r) for r in MOCK_RESOURCES]
+# Initial stock for an empty rescueplex.db; after that the database is authoritative
+inventory = ResourceInventory(RESOURCE_DB_PATH, seed=MOCK_RESOURCES)
+
+# Units of every resource requested per damaged building, in allocation order
+DAMAGE_TIERS = (
+    ("minor_damage",      'building_minor_damage',      1),
+    ("major_damage",      'building_major_damage',      3),
+    ("total_destruction", 'building_total_destruction', 5),
+)
 
 @app.route('/get-resources', methods=['GET'])
 def get_resources():
-    return jsonify({"resources": _resources})
+    return jsonify({"resources": inventory.list_resources()})
+
+# Trained by train_dqn.py; loaded once in the background, greedy tiers are used until then or without it
+allocation_model = AllocationModelService(os.path.join(BASE_DIR, 'dqn_model.h5'),
+                                          os.path.join(BASE_DIR, 'scaler_X.pkl'),
+                                          os.path.join(BASE_DIR, 'scaler_Y.pkl'))
+if allocation_model.available():
+    threading.Thread(target=allocation_model.warm_up, name='dqn-warm-up', daemon=True).start()
+
+def predict_allocations(reports, resource_names):
+    """DQN-predicted units per resource for each report, or None to use the greedy tiers."""
+    if not allocation_model.available():
+        return None
+    try:
+        predictions = allocation_model.predict_batch([allocation_model.damage_vector(r) for r in reports])
+    except Exception as e:
+        print(f"WARNING: DQN allocation failed, using greedy tiers: {e}")
+        return None
+    if predictions.shape[1] != len(resource_names):
+        print(f"WARNING: DQN model predicts {predictions.shape[1]} resources, inventory has "
+              f"{len(resource_names)}; using greedy tiers (retrain with train_dqn.py)")
+        return None
+    return [dict(zip(resource_names, row.tolist())) for row in predictions]
 
 @app.route('/allocate-resources', methods=['POST'])
 def allocate_resources():
-    global _resources
+    """Body: building_* counts (and damage_id) of one damage report, or {"reports": [...]}
+    to allocate several in one transaction. "strategy": "greedy" skips the DQN model.
+    """
     data = request.get_json() or {}
-
-    minor    = int(data.get('building_minor_damage',      0))
-    major    = int(data.get('building_major_damage',      0))
-    destruct = int(data.get('building_total_destruction', 0))
-
-    def alloc(tier_count, multiplier):
-        results = []
-        for r in _resources:
-            qty = min(r['quantity'], tier_count * multiplier)
+    batch = 'reports' in data
+    reports = (data.get('reports') or []) if batch else [data]
+
+    # The model's outputs follow the resource order it was trained on (resource_id)
+    predictions = None
+    if data.get('strategy') != 'greedy' and reports:
+        predictions = predict_allocations(reports, [r['resource_name'] for r in inventory.list_resources()])
+    owners = []
+
+    def take(stock, wanted):
+        alloc = {}
+        for name, available in stock.items():
+            qty = min(available, int(wanted.get(name, 0)))
             if qty > 0:
-                r['quantity'] = max(0, r['quantity'] - qty)
-                results.append({"resource_name": r['resource_name'], "allocated_quantity": qty})
-        return results
-
-    allocation_results = {
-        "minor_damage":      alloc(minor,    1),
-        "major_damage":      alloc(major,    3),
-        "total_destruction": alloc(destruct, 5),
+                stock[name] = available - qty
+                alloc[name] = qty
+        return alloc
+
+    def plan(stock):
+        lines = []
+        for i, report in enumerate(reports):
+            if predictions is not None:
+                tiers = [("dqn", predictions[i])]
+            else:
+                tiers = [(tier, dict.fromkeys(stock, int(report.get(field, 0)) * multiplier))
+                         for tier, field, multiplier in DAMAGE_TIERS]
+            for tier, wanted in tiers:
+                lines.append((tier, take(stock, wanted), report.get('damage_id')))
+                owners.append(i)
+        return lines
+
+    # The plan is computed and applied inside one transaction, so concurrent
+    # requests never allocate the same units twice
+    request_id, lines, updated = inventory.reserve(plan, damage_id=data.get('damage_id'))
+
+    results = [{} for _ in reports]
+    for i, (tier, alloc, _) in zip(owners, lines):
+        results[i][tier] = [{"resource_name": name, "allocated_quantity": qty} for name, qty in alloc.items()]
+
+    response = {
+        "request_id": request_id,
+        "strategy": "dqn" if predictions is not None else "greedy",
+        "updated_resources": updated
     }
+    if batch:
+        response["reports"] = [{"damage_id": report.get('damage_id'), "allocation_results": result}
+                               for report, result in zip(reports, results)]
+    else:
+        response["allocation_results"] = results[0]
+    return jsonify(response)
+
+@app.route('/allocate-resources/optimize', methods=['POST'])
+def optimize_resources():
+    """Allocate stock across many damage sites at once (see allocation_solver.py).
+
+    Body: {"sites": [{"id", "latitude", "longitude", "priority", building_* counts}],
+           "depots": optional [{"name", "latitude", "longitude", "stock": {...}}],
+           "depot": optional {"latitude", "longitude"} of the central inventory,
+           "commit": reserve the result from the inventory (central depot only),
+           "time_limit": seconds}
+    """
+    data = request.get_json() or {}
+    sites = data.get('sites') or []
+    if not sites:
+        return jsonify({'success': False, 'error': 'sites required'}), 400
+
+    custom_depots = data.get('depots')
+    depots = custom_depots or [dict(data.get('depot') or {}, name='central',
+                                    stock={r['resource_name']: r['quantity'] for r in inventory.list_resources()})]
+    if custom_depots and data.get('commit'):
+        return jsonify({'success': False, 'error': 'commit is only supported for the central inventory'}), 400
+
+    time_limit = min(float(data.get('time_limit', DEFAULT_TIME_LIMIT)), DEFAULT_TIME_LIMIT)
+    result = solve_allocation(sites, depots, tier_multipliers={field: mult for _, field, mult in DAMAGE_TIERS},
+                              cost_per_km=float(data.get('cost_per_km', DEFAULT_COST_PER_KM)),
+                              time_limit=time_limit)
+
+    if data.get('commit'):
+        lines = [(f"site:{site_id}", quantities) for site_id, quantities in result['served'].items() if quantities]
+        try:
+            result['request_id'], _, result['updated_resources'] = inventory.reserve(lines)
+        except InsufficientStock as e:
+            # Stock moved between solving and reserving; nothing was applied
+            return jsonify({'success': False, 'error': str(e)}), 409
+
+    return jsonify(dict(result, success=True))
+
+@app.route('/allocation-ledger', methods=['GET'])
+def allocation_ledger():
+    return jsonify({"allocations": inventory.ledger(request.args.get('request_id'),
+                                                    request.args.get('limit', 100, type=int))})
 
-    return jsonify({
-        "allocation_results": allocation_results,
-        "updated_resources":  _resources
-    })
 
+BROADCAST_ALERT_FIELDS = ('message', 'priority', 'officer', 'latitude', 'longitude', 'regions')
 
 @socketio.on('broadcast_alert')
 def handle_broadcast_alert(data):
-    """Relay broadcast alerts to all connected clients."""
-    print(f"INFO: Broadcast alert from {data.get('officer', 'Anonymous')}: {data.get('message')}")
-    socketio.emit('broadcast_alert', data)
+    """Relay an officer's alert to the clients subscribed to its area.
+
+    Alerts carrying ``latitude``/``longitude`` or ``regions`` (geohash
+    prefixes) reach clients subscribed to an overlapping cell, coarser or
+    finer, and national subscribers; alerts without a location are
+    nation-wide and go to every client. Unknown payload keys are dropped.
+    """
+    data = data if isinstance(data, dict) else {}
+    alert = {k: data[k] for k in BROADCAST_ALERT_FIELDS if k in data}
+    alert['timestamp'] = datetime.now().isoformat()
+    print(f"INFO: Broadcast alert from {alert.get('officer', 'Anonymous')}: {alert.get('message')}")
+
+    targets = alert_rooms(alert.get('regions'), alert.get('latitude'), alert.get('longitude'))
+    if targets:
+        socketio.emit('broadcast_alert', alert, to=targets)
+    else:
+        socketio.emit('broadcast_alert', alert)
 
 
 if __name__ == '__main__':
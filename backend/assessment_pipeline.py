@@ -0,0 +1,165 @@
+"""
+Post-ingest damage assessment of images attached to citizen reports.
+
+``/api/disaster/report`` only queues ``(report_id, sha256)`` pairs; a
+background thread drains the queue in small batches, runs them through
+``DamageAssessor.predict_batch`` in a single forward pass and stores the
+prediction on the ``images`` row (so a forwarded photo is classified
+once). Each affected report then gets an ``ai_priority`` score for
+dashboard ordering, and its severity is escalated when an image is
+confidently classified as major damage or destroyed.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from realtime import SEVERITY_LEVELS, normalize_severity
+
+ASSESSMENT_BATCH_SIZE = int(os.getenv('ASSESSMENT_BATCH_SIZE', 8))
+ASSESSMENT_MAX_WAIT = float(os.getenv('ASSESSMENT_MAX_WAIT', 0.5))  # seconds to fill a batch
+AUTO_ESCALATE_CONFIDENCE = float(os.getenv('AUTO_ESCALATE_CONFIDENCE', 70))
+
+# Minimum report severity implied by a confident prediction at each damage level
+ESCALATION_SEVERITY = {2: 'High', 3: 'Critical'}
+
+
+def report_priority(damage_level, confidence):
+    """Dashboard sort key in [0, 3]: predicted damage level weighted by confidence."""
+    return round(damage_level * confidence / 100, 4)
+
+
+class AssessmentWorker:
+    """Background thread that batches report images through a ``DamageAssessor``."""
+
+    def __init__(self, db_path, upload_folder, assessor, on_assessed=None,
+                 batch_size=ASSESSMENT_BATCH_SIZE, max_wait=ASSESSMENT_MAX_WAIT):
+        self.db_path = db_path
+        self.upload_folder = upload_folder
+        self.assessor = assessor
+        self.on_assessed = on_assessed
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='damage-assessment', daemon=True)
+            self._thread.start()
+            self.enqueue_pending()
+        return self
+
+    def enqueue(self, report_id, sha256):
+        self._queue.put((report_id, sha256))
+
+    def enqueue_pending(self):
+        """Requeue images of reports left unassessed by a previous run."""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        c.execute('''SELECT ri.report_id, ri.sha256 FROM report_images ri
+                     JOIN images i ON i.sha256 = ri.sha256
+                     WHERE i.assessed_at IS NULL''')
+        for report_id, sha256 in c.fetchall():
+            self.enqueue(report_id, sha256)
+        conn.close()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.process(batch)
+            except Exception as e:
+                print(f"WARNING: Damage assessment batch failed: {e}")
+
+    def process(self, batch):
+        report_ids = sorted({report_id for report_id, _ in batch})
+        hashes = sorted({sha256 for _, sha256 in batch})
+
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        placeholders = ','.join('?' * len(hashes))
+        c.execute(f"SELECT sha256, path FROM images WHERE assessed_at IS NULL AND sha256 IN ({placeholders})", hashes)
+        pending = c.fetchall()
+        conn.close()
+
+        results = self._predict([os.path.join(self.upload_folder, path) for _, path in pending])
+
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        # Unreadable images are stamped too (with no prediction) so they are not retried forever
+        c.executemany('''UPDATE images SET damage_label = ?, damage_level = ?, damage_confidence = ?,
+                                           assessed_at = CURRENT_TIMESTAMP
+                         WHERE sha256 = ?''',
+                      [(r['predicted_label'], r['damage_level'], r['confidence'], sha256) if r else
+                       (None, None, None, sha256)
+                       for (sha256, _), r in zip(pending, results)])
+        updated = [self._reprioritize(c, report_id) for report_id in report_ids]
+        conn.commit()
+        conn.close()
+
+        if self.on_assessed:
+            for report in filter(None, updated):
+                self.on_assessed(report)
+
+    def _predict(self, paths):
+        """Predictions aligned with ``paths``; None for images that could not be read."""
+        if not paths:
+            return []
+        try:
+            return self.assessor.predict_batch(paths)
+        except Exception:
+            # One unreadable upload must not sink the whole batch
+            results = []
+            for path in paths:
+                try:
+                    results.append(self.assessor.predict_batch([path])[0])
+                except Exception as e:
+                    print(f"WARNING: Could not assess {os.path.basename(path)}: {e}")
+                    results.append(None)
+            return results
+
+    def _reprioritize(self, c, report_id):
+        c.execute('''SELECT i.damage_level, i.damage_label, i.damage_confidence
+                     FROM report_images ri JOIN images i ON i.sha256 = ri.sha256
+                     WHERE ri.report_id = ? AND i.damage_level IS NOT NULL
+                     ORDER BY i.damage_level DESC, i.damage_confidence DESC LIMIT 1''', (report_id,))
+        top = c.fetchone()
+        c.execute("SELECT severity, latitude, longitude FROM disaster_reports WHERE id = ?", (report_id,))
+        report = c.fetchone()
+        if not top or not report:
+            return None
+
+        damage_level, damage_label, confidence = top
+        severity = report[0]
+        target = ESCALATION_SEVERITY.get(damage_level)
+        if (target and confidence >= AUTO_ESCALATE_CONFIDENCE
+                and SEVERITY_LEVELS.index(target) > SEVERITY_LEVELS.index(normalize_severity(severity))):
+            severity = target
+
+        priority = report_priority(damage_level, confidence)
+        c.execute('''UPDATE disaster_reports
+                     SET ai_damage_level = ?, ai_damage_label = ?, ai_confidence = ?, ai_priority = ?, severity = ?
+                     WHERE id = ?''',
+                  (damage_level, damage_label, confidence, priority, severity, report_id))
+        return {
+            'report_id': report_id, 'severity': severity, 'escalated': severity != report[0],
+            'ai_damage_level': damage_level, 'ai_damage_label': damage_label,
+            'ai_confidence': confidence, 'ai_priority': priority,
+            'latitude': report[1], 'longitude': report[2],
+        }
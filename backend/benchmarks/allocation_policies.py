@@ -0,0 +1,90 @@
+"""
+Greedy vs DQN vs optimization on simulated disasters (allocation_sim.py).
+
+Generates a batch of episodes and scores each policy on served demand,
+priority-weighted served demand and delivery time, plus how many episodes
+per second it decides. The solver is not vectorized, so it runs on the
+first --solver-episodes episodes only; the other policies are scored on
+that same subset too for a like-for-like row.
+
+The DQN row needs dqn_model.h5 and its scalers (train_dqn.py); the number
+of simulated resources then follows the model's output size.
+
+    python benchmarks/allocation_policies.py --episodes 20000 --solver-episodes 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from allocation_model import AllocationModelService
+from allocation_sim import evaluate, generate_scenarios, greedy_policy, model_policy, solver_policy
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def subset(scenarios, n):
+    return {key: value[:n] for key, value in scenarios.items()}
+
+
+def run(label, policy, scenarios):
+    start = time.perf_counter()
+    allocation = policy(scenarios)
+    elapsed = time.perf_counter() - start
+    metrics = evaluate(scenarios, allocation)
+    episodes = len(scenarios['demand'])
+    print(f"  {label:22s} {metrics['served_fraction']:7.1%} {metrics['priority_served_fraction']:9.1%} "
+          f"{metrics['mean_delivery_minutes']:8.1f} {metrics['worst_delivery_minutes']:8.1f} "
+          f"{episodes / elapsed:12,.0f} {elapsed * 1000 / episodes:10.3f}")
+
+
+def header(title):
+    print(f"\n{title}")
+    print(f"  {'policy':22s} {'served':>7s} {'priority':>9s} {'mean min':>8s} {'max min':>8s} "
+          f"{'episodes/s':>12s} {'ms/episode':>10s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--episodes', type=int, default=10000)
+    parser.add_argument('--solver-episodes', type=int, default=200)
+    parser.add_argument('--sites', type=int, default=8)
+    parser.add_argument('--depots', type=int, default=3)
+    parser.add_argument('--resources', type=int, default=8, help='ignored when the DQN model is loaded')
+    parser.add_argument('--stock-ratio', type=float, default=0.6, help='stock as a fraction of total demand')
+    parser.add_argument('--solver', choices=['highs', 'flow'], default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    policies = [('greedy', greedy_policy)]
+    service = AllocationModelService(os.path.join(BASE_DIR, 'dqn_model.h5'),
+                                     os.path.join(BASE_DIR, 'scaler_X.pkl'),
+                                     os.path.join(BASE_DIR, 'scaler_Y.pkl'))
+    if service.available():
+        args.resources = service.predict_batch([(0, 0, 0, 0)]).shape[1]  # also loads the model
+        policies.append(('dqn', model_policy(service)))
+    else:
+        print("dqn_model.h5 not found; skipping the DQN policy (run train_dqn.py)")
+
+    scenarios = generate_scenarios(args.episodes, args.sites, args.depots, args.resources,
+                                   stock_ratio=args.stock_ratio, seed=args.seed)
+    print(f"{args.episodes} episodes: {args.sites} sites, {args.depots} depots, {args.resources} resources, "
+          f"stock {args.stock_ratio:.0%} of demand")
+
+    header("All episodes")
+    for label, policy in policies:
+        run(label, policy, scenarios)
+
+    if args.solver_episodes:
+        small = subset(scenarios, args.solver_episodes)
+        header(f"First {args.solver_episodes} episodes")
+        for label, policy in policies + [(f"solver ({args.solver or 'auto'})", solver_policy(args.solver))]:
+            run(label, policy, small)
+
+
+if __name__ == '__main__':
+    main()
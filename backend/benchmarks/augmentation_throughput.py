@@ -0,0 +1,85 @@
+"""
+Samples per second of segmentation training augmentation (utils/augmentations.py).
+
+Compares the per-sample albumentations pipeline (get_training_augmentation,
+plus stacking the results into a batch) with BatchAugmentation on whole
+uint8 tensor batches, image and mask together. Inputs are synthetic frames
+at --width x --height, so both paths include the resize to 512.
+
+    python benchmarks/augmentation_throughput.py --samples 256 --batch-sizes 8 16 32 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import torch
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.augmentations import BatchAugmentation, get_training_augmentation
+
+
+def synthetic_samples(count, width, height, seed):
+    rng = np.random.default_rng(seed)
+    images = rng.integers(0, 256, (count, height, width, 3), dtype=np.uint8)
+    masks = (rng.random((count, height, width)) > 0.7).astype(np.uint8)
+    return images, masks
+
+
+def per_sample(images, masks, batch_size):
+    augment = get_training_augmentation()
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        results = [augment(image=image, mask=mask) for image, mask in
+                   zip(images[i:i + batch_size], masks[i:i + batch_size])]
+        torch.stack([r['image'] for r in results])
+        torch.stack([r['mask'] for r in results])
+    return len(images) / (time.perf_counter() - start)
+
+
+def batched(augment, images, masks, batch_size):
+    image_batch = torch.from_numpy(images).permute(0, 3, 1, 2)
+    mask_batch = torch.from_numpy(masks).unsqueeze(1)
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        augment(image_batch[i:i + batch_size], mask_batch[i:i + batch_size])
+    return len(images) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=128)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--overlays', type=int, default=16, help='precomputed fog and rain overlays of each kind')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', module='albumentations')
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    images, masks = synthetic_samples(args.samples, args.width, args.height, args.seed)
+
+    start = time.perf_counter()
+    augment = BatchAugmentation(size=512, overlays=args.overlays, seed=args.seed)
+    print(f"{args.samples} samples {args.width}x{args.height} -> 512x512, {torch.get_num_threads()} threads; "
+          f"{args.overlays} fog + {args.overlays} rain overlays precomputed in {time.perf_counter() - start:.2f}s\n")
+
+    print(f"  {'path':14s} {'batch':>5s} {'samples/s':>10s} {'x albumentations':>17s}")
+    baseline = per_sample(images, masks, args.batch_sizes[0])
+    print(f"  {'albumentations':14s} {args.batch_sizes[0]:5d} {baseline:10.1f} {1:17.2f}")
+    batched(augment, images[:args.batch_sizes[0]], masks[:args.batch_sizes[0]], args.batch_sizes[0])  # warm-up
+    for batch_size in args.batch_sizes:
+        rate = batched(augment, images, masks, batch_size)
+        print(f"  {'batched':14s} {batch_size:5d} {rate:10.1f} {rate / baseline:17.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Broadcast fan-out latency across N Socket.IO workers.
+
+Each worker is a ``socketio.Server`` with its own client manager, all
+subscribed to the same channel. One worker emits, and we time how long it
+takes until every worker has received and dispatched the message.
+
+    python benchmarks/broadcast_fanout.py                       # in-process bus
+    python benchmarks/broadcast_fanout.py --queue redis://localhost:6379/0
+"""
+
+import argparse
+import os
+import queue
+import statistics
+import sys
+import time
+import uuid
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import socketio
+
+from realtime import MEMORY_QUEUE_URL, LocalMessageBus, LocalPubSubManager
+
+
+class _TimedMixin:
+    """Record the publish-to-dispatch delay of every emit this worker replays."""
+
+    deliveries = None
+
+    def _handle_emit(self, message):
+        payload = message.get('data') or {}
+        if 'sent_at' in payload:
+            self.deliveries.put(time.perf_counter() - payload['sent_at'])
+        super()._handle_emit(message)
+
+
+class TimedLocalManager(_TimedMixin, LocalPubSubManager):
+    pass
+
+
+class TimedRedisManager(_TimedMixin, socketio.RedisManager):
+    pass
+
+
+def build_workers(n, queue_url, channel):
+    deliveries = queue.Queue()
+    bus = LocalMessageBus()
+    servers = []
+    for _ in range(n):
+        if queue_url == MEMORY_QUEUE_URL:
+            manager = TimedLocalManager(bus=bus, channel=channel)
+        else:
+            manager = TimedRedisManager(queue_url, channel=channel)
+        manager.deliveries = deliveries
+        server = socketio.Server(async_mode='threading', client_manager=manager)
+        server.manager_initialized = True
+        manager.initialize()
+        servers.append(server)
+    return servers, deliveries
+
+
+def run(n, messages, queue_url):
+    channel = f"bench-{uuid.uuid4().hex[:8]}"
+    servers, deliveries = build_workers(n, queue_url, channel)
+    time.sleep(0.2)  # let every listener subscribe before publishing
+
+    fanout, per_worker = [], []
+    for i in range(messages):
+        servers[i % n].emit('new_disaster_report', {'id': i, 'sent_at': time.perf_counter()})
+        latencies = [deliveries.get(timeout=10) for _ in range(n)]
+        fanout.append(max(latencies))
+        per_worker.extend(latencies)
+
+    fanout.sort()
+    return {
+        'workers': n,
+        'messages': messages,
+        'mean_ms': statistics.mean(per_worker) * 1000,
+        'fanout_p50_ms': fanout[len(fanout) // 2] * 1000,
+        'fanout_p95_ms': fanout[int(len(fanout) * 0.95) - 1] * 1000,
+        'fanout_max_ms': fanout[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queue', default=MEMORY_QUEUE_URL, help='memory:// or a redis:// URL')
+    parser.add_argument('--workers', default='1,2,4,8,16', help='comma-separated worker counts')
+    parser.add_argument('--messages', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for n in (int(w) for w in args.workers.split(',')):
+        r = run(n, args.messages, args.queue)
+        print(f"{r['workers']:>8} {r['mean_ms']:>9.3f} {r['fanout_p50_ms']:>9.3f} "
+              f"{r['fanout_p95_ms']:>9.3f} {r['fanout_max_ms']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Per-row vs bulk allocation writes in database/connect_db.py.
+
+Replays what test_dqn.py does after predicting: deduct and log one
+allocation per (damage report, resource). The per-row path calls
+update_resources + log_allocation for every cell (one connection and
+commit each); the bulk path is a single apply_allocations transaction.
+Both start from the same stock, and the final quantities and ledger
+totals are checked to match.
+
+Defaults to a throwaway SQLite stand-in; point --url at a scratch
+PostgreSQL database to measure real round trips (its resources and
+resource_allocation tables are created if missing and emptied first):
+
+    python benchmarks/bulk_allocation_writes.py --reports 200
+    python benchmarks/bulk_allocation_writes.py --url postgresql+psycopg2://postgres:pw@localhost/scratch
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+# Add project root to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from database import connect_db
+
+SCHEMA = {
+    'postgresql': [
+        """CREATE TABLE IF NOT EXISTS resources (
+            resource_id SERIAL PRIMARY KEY, resource_name TEXT UNIQUE NOT NULL, quantity INTEGER NOT NULL)""",
+        """CREATE TABLE IF NOT EXISTS resource_allocation (
+            allocation_id SERIAL PRIMARY KEY, damage_id INTEGER, resource_id INTEGER NOT NULL,
+            allocated_quantity INTEGER NOT NULL, allocation_time TIMESTAMP NOT NULL, user_id INTEGER)""",
+    ],
+    'sqlite': [
+        """CREATE TABLE IF NOT EXISTS resources (
+            resource_id INTEGER PRIMARY KEY AUTOINCREMENT, resource_name TEXT UNIQUE NOT NULL,
+            quantity INTEGER NOT NULL)""",
+        """CREATE TABLE IF NOT EXISTS resource_allocation (
+            allocation_id INTEGER PRIMARY KEY AUTOINCREMENT, request_id TEXT NOT NULL, damage_id INTEGER,
+            resource_id INTEGER NOT NULL, allocated_quantity INTEGER NOT NULL, tier TEXT,
+            allocation_time TIMESTAMP NOT NULL, user_id INTEGER)""",  # as in resource_inventory.py
+    ],
+}
+
+
+def reset(engine, resources, stock):
+    with engine.begin() as conn:
+        for ddl in SCHEMA[engine.dialect.name]:
+            conn.execute(text(ddl))
+        conn.execute(text("DELETE FROM resource_allocation"))
+        conn.execute(text("DELETE FROM resources"))
+        conn.execute(text("INSERT INTO resources (resource_name, quantity) VALUES (:name, :qty)"),
+                     [{"name": name, "qty": stock} for name in resources])
+        rows = conn.execute(text("SELECT resource_id, resource_name FROM resources ORDER BY resource_id")).all()
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+
+def snapshot(engine):
+    with engine.connect() as conn:
+        stock = conn.execute(text("SELECT resource_name, quantity FROM resources ORDER BY resource_name")).all()
+        logged = conn.execute(text("SELECT r.resource_name, SUM(ra.allocated_quantity) FROM resource_allocation ra "
+                                   "JOIN resources r ON r.resource_id = ra.resource_id "
+                                   "GROUP BY r.resource_name ORDER BY r.resource_name")).all()
+    return [tuple(r) for r in stock], [tuple(r) for r in logged]
+
+
+def per_row(damage_ids, resource_ids, resource_names, allocations):
+    for damage_id, row in zip(damage_ids, allocations):
+        for resource_id, resource_name, qty in zip(resource_ids, resource_names, row):
+            if qty > 0:
+                connect_db.update_resources(resource_name, qty)
+                connect_db.log_allocation(damage_id, resource_id, qty)
+
+
+def bulk(damage_ids, resource_ids, resource_names, allocations):
+    if not connect_db.apply_allocations(damage_ids, resource_ids, resource_names, allocations):
+        raise RuntimeError("apply_allocations failed")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # both paths print per call
+        fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of a scratch database (default: temporary SQLite file)')
+    parser.add_argument('--reports', type=int, default=100)
+    parser.add_argument('--resources', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tmp = None
+    if not args.url:
+        tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        tmp.close()
+        args.url = f"sqlite:///{tmp.name}"
+    engine = connect_db.get_engine(args.url)
+    connect_db.engine = engine  # the connect_db functions use the module-level engine
+
+    rng = random.Random(args.seed)
+    names = [f"resource-{i}" for i in range(args.resources)]
+    allocations = [[rng.randint(0, 5) for _ in names] for _ in range(args.reports)]
+    damage_ids = list(range(1, args.reports + 1))
+    stock = 10 * args.reports  # never runs out, so clamping at zero does not hide differences
+    cells = sum(1 for row in allocations for qty in row if qty > 0)
+
+    print(f"{engine.dialect.name}: {args.reports} reports x {args.resources} resources ({cells} allocations)")
+    results = {}
+    for label, fn in (('per-row', per_row), ('bulk', bulk)):
+        resource_ids, resource_names = reset(engine, names, stock)
+        elapsed = timed(fn, damage_ids, resource_ids, resource_names, allocations)
+        results[label] = snapshot(engine)
+        print(f"  {label:8s} {elapsed * 1000:9.1f} ms  ({cells / elapsed:,.0f} allocations/s)")
+
+    print("  results identical:", results['per-row'] == results['bulk'])
+    engine.dispose()
+    if tmp:
+        os.remove(tmp.name)
+
+
+if __name__ == '__main__':
+    main()
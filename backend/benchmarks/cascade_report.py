@@ -0,0 +1,133 @@
+"""
+Compute saved vs. accuracy lost by the damage cascade (cascade.py).
+
+Runs the disaster classifier at each --gate-sizes resolution and the full
+DamageAssessor once over a labelled folder (default backend/dataset/test,
+labels from the 0_no_damage / 2_major_damage / 3_destroyed subfolders),
+times Grad-CAM on a sample, then replays every gate size x confidence
+threshold from those predictions:
+
+  escalated  share of images sent on to the damage assessor
+  ms/image   gate + escalated share x (assessor + Grad-CAM), measured costs
+  saved      1 - ms/image of the cascade / ms/image of assessing everything
+  accuracy   damage level vs. folder label (gated images count as level 0)
+  missed     damaged images (level 2/3) the gate stopped
+
+Needs best_model.pth and models/disaster_classifier.pth.
+
+    python benchmarks/cascade_report.py --gate-sizes 224 160 128 --thresholds 0 50 70 90
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cascade import escalates
+from inference_damage import DamageAssessor
+from utils.predict_disaster import DisasterClassifier
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def labelled_images(folder):
+    """[(path, damage_level), ...] with the level taken from the class folder prefix"""
+    images = []
+    for class_dir in sorted(os.listdir(folder)):
+        class_path = os.path.join(folder, class_dir)
+        if not os.path.isdir(class_path):
+            continue
+        level = int(class_dir.split('_', 1)[0])
+        images += [(os.path.join(class_path, name), level) for name in sorted(os.listdir(class_path))
+                   if name.lower().endswith(IMAGE_EXTENSIONS)]
+    return images
+
+
+def batched(fn, paths, batch_size):
+    """Concatenated fn(batch) results and the wall time in ms per image"""
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(paths), batch_size):
+        results += fn(paths[i:i + batch_size])
+    return results, (time.perf_counter() - start) * 1000 / len(paths)
+
+
+def gradcam_ms(assessor, paths):
+    """Extra ms per image that Grad-CAM adds to a single-image assessment"""
+    assessor.predict(paths[0], gradcam=False)  # warm-up
+    timings = {}
+    for gradcam in (False, True):
+        start = time.perf_counter()
+        for path in paths:
+            assessor.predict(path, gradcam=gradcam)
+        timings[gradcam] = (time.perf_counter() - start) * 1000 / len(paths)
+    return timings[True] - timings[False]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=os.path.join(BASE_DIR, 'dataset', 'test'))
+    parser.add_argument('--damage-model', default=os.path.join(BASE_DIR, 'best_model.pth'))
+    parser.add_argument('--classifier-model', default=os.path.join(BASE_DIR, 'models', 'disaster_classifier.pth'))
+    parser.add_argument('--gate-sizes', type=int, nargs='+', default=[224, 160, 128])
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0, 50, 70, 90],
+                        help='minimum disaster confidence (%%) for an image to escalate')
+    parser.add_argument('--gradcam-sample', type=int, default=16, help='images used to time Grad-CAM')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--limit', type=int, default=0, help='use only the first N images of each class')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    for path in (args.damage_model, args.classifier_model):
+        if not os.path.exists(path):
+            sys.exit(f"ERROR: checkpoint not found: {path}")
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    images = labelled_images(args.dataset)
+    if args.limit:
+        levels = sorted({level for _, level in images})
+        images = [item for level in levels for item in [i for i in images if i[1] == level][:args.limit]]
+    paths = [path for path, _ in images]
+    labels = [level for _, level in images]
+    print(f"{len(images)} images from {args.dataset}, {torch.get_num_threads()} CPU threads")
+
+    device = torch.device('cpu')
+    assessor = DamageAssessor(args.damage_model, device=device)
+    classifier = DisasterClassifier(args.classifier_model, device=device)
+
+    assessor.predict_batch(paths[:1])  # warm-up
+    full, assess_ms = batched(assessor.predict_batch, paths, args.batch_size)
+    full_levels = [r['damage_level'] for r in full]
+    cam_ms = gradcam_ms(assessor, paths[:args.gradcam_sample])
+    full_ms = assess_ms + cam_ms
+    full_accuracy = sum(p == l for p, l in zip(full_levels, labels)) / len(labels)
+    damaged = sum(l > 0 for l in labels)
+    print(f"Full pipeline: assessor {assess_ms:.1f} ms/image + Grad-CAM {cam_ms:.1f} ms/image, "
+          f"accuracy {full_accuracy:.1%}")
+
+    print(f"\n  {'gate px':>7s} {'min conf':>8s} {'escalated':>9s} {'ms/image':>8s} {'saved':>6s} "
+          f"{'accuracy':>8s} {'lost':>6s} {'missed':>11s}")
+    for size in args.gate_sizes:
+        classifier.predict_batch(paths[:1], image_size=size)  # warm-up
+        verdicts, gate_ms = batched(lambda chunk: classifier.predict_batch(chunk, image_size=size),
+                                    paths, args.batch_size)
+        for threshold in args.thresholds:
+            escalate = [escalates(label, conf, threshold) for label, conf in verdicts]
+            rate = sum(escalate) / len(escalate)
+            levels = [level if e else 0 for level, e in zip(full_levels, escalate)]
+            accuracy = sum(p == l for p, l in zip(levels, labels)) / len(labels)
+            missed = sum(1 for e, l in zip(escalate, labels) if l > 0 and not e)
+            cascade_ms = gate_ms + rate * full_ms
+            print(f"  {size:7d} {threshold:8.0f} {rate:9.1%} {cascade_ms:8.1f} {1 - cascade_ms / full_ms:6.1%} "
+                  f"{accuracy:8.1%} {full_accuracy - accuracy:6.1%} {missed:5d}/{damaged:<5d}")
+
+
+if __name__ == '__main__':
+    main()
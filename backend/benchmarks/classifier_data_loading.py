@@ -0,0 +1,75 @@
+"""
+Images per second of the classifier training data pipeline
+(training/classifier_data.py), without the model.
+
+Compares decoding JPEGs every epoch (ImageFolder, as train_classifier.py
+did with a plain DataLoader) with the memory-mapped 224x224 uint8 cache,
+each with --workers 0 and with persistent worker processes. Every
+configuration reads --epochs full epochs, so the cost of starting the
+workers shows up in the first epoch only. Building the cache is timed
+separately.
+
+    python benchmarks/classifier_data_loading.py --data dataset/train --workers 0 4 --epochs 2
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import torch
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from training.classifier_data import CachedImageDataset, build_cache, image_folder, make_loader, to_float
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def epoch_rates(dataset, epochs, batch_size, workers, prefetch):
+    loader = make_loader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers,
+                         persistent_workers=True, prefetch_factor=prefetch)
+    rates = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        count = 0
+        for images, _ in loader:
+            to_float(images, 'cpu')
+            count += len(images)
+        rates.append(count / (time.perf_counter() - start))
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=os.path.join(BASE_DIR, 'dataset', 'train'))
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'classifier_cache_224'))
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, min(4, os.cpu_count() or 1)])
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--prefetch', type=int, default=2)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build_cache(args.data, args.cache_dir, num_workers=max(args.workers), force=True)
+    build_seconds = time.perf_counter() - start
+    datasets = {'jpeg': image_folder(args.data), 'memmap': CachedImageDataset(args.cache_dir)}
+    count = len(datasets['jpeg'])
+    print(f"{count} images from {args.data}, {os.cpu_count()} CPUs, {torch.get_num_threads()} torch threads")
+    print(f"Cache build: {build_seconds:.1f}s ({count / build_seconds:.1f} images/s)\n")
+
+    epochs = ''.join(f"{f'epoch {e + 1}':>10s}" for e in range(args.epochs))
+    print(f"  {'source':8s} {'workers':>7s} {epochs}   images/s")
+    baseline = None
+    for source, dataset in datasets.items():
+        for workers in args.workers:
+            rates = epoch_rates(dataset, args.epochs, args.batch_size, workers, args.prefetch)
+            baseline = baseline or rates[-1]
+            print(f"  {source:8s} {workers:7d} {''.join(f'{r:10.1f}' for r in rates)}   "
+                  f"x{rates[-1] / baseline:.1f} (last epoch)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Verify and benchmark the fused Focal+Dice loss (utils/losses.FocalDiceLoss)
+against CombinedLoss.
+
+Verification:
+- FocalDiceLoss(dice_mode='global') vs CombinedLoss: loss and gradient on
+  512x512 masks, with logits scaled to +-30 so the stable paths are used.
+- gradcheck in float64 for every dice_mode, with binary and soft targets.
+- The 'batch' and 'sample' modes vs a plain autograd reference.
+
+Benchmark, for each --shapes entry: forward + backward step time, the
+memory autograd keeps from forward to backward, and the peak memory of
+one step measured in a fresh process (CUDA peak on a GPU, otherwise max
+RSS growth, which needs Linux).
+
+    python benchmarks/focal_dice_loss.py --shapes 8x1x512x512 8x4x512x512 --repeats 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.losses import DICE_MODES, CombinedLoss, FocalDiceLoss, _dice_dims
+
+
+def reference_loss(pred, target, dice_mode, alpha=0.25, gamma=2.0, smooth=1.0):
+    """Unfused FocalLoss + per-group Dice with autograd, as CombinedLoss would compute them"""
+    bce = F.binary_cross_entropy_with_logits(pred, target, reduction='none')
+    focal = (alpha * (1 - torch.exp(-bce)) ** gamma * bce).mean()
+    p = torch.sigmoid(pred)
+    dims = _dice_dims(pred.dim(), dice_mode)
+    dice = (2 * (p * target).sum(dims) + smooth) / (p.sum(dims) + target.sum(dims) + smooth)
+    return 0.5 * focal + 0.5 * (1 - dice.mean())
+
+
+def loss_and_grad(loss_fn, logits, target):
+    logits = logits.detach().requires_grad_()
+    loss = loss_fn(logits, target)
+    loss.backward()
+    return loss.detach(), logits.grad
+
+
+def verify(device):
+    torch.manual_seed(0)
+    ok = True
+
+    logits = (torch.randn(4, 1, 512, 512, device=device) * 10).clamp_(-30, 30)
+    target = (torch.rand(4, 1, 512, 512, device=device) > 0.8).float()
+    ref_loss, ref_grad = loss_and_grad(CombinedLoss(), logits, target)
+    loss, grad = loss_and_grad(FocalDiceLoss(), logits, target)
+    close = torch.allclose(loss, ref_loss, rtol=1e-5, atol=1e-7) and torch.allclose(grad, ref_grad, rtol=1e-4, atol=1e-10)
+    print(f"  CombinedLoss vs fused (global):  loss diff {abs(loss - ref_loss).item():.2e}, "
+          f"max grad diff {(grad - ref_grad).abs().max().item():.2e}  {'OK' if close else 'MISMATCH'}")
+    ok &= close
+
+    for mode in DICE_MODES:
+        logits = (torch.randn(3, 4, 64, 64, device=device) * 5)
+        target = (torch.rand(3, 4, 64, 64, device=device) > 0.7).float()
+        ref_loss, ref_grad = loss_and_grad(lambda p, t: reference_loss(p, t, mode), logits, target)
+        loss, grad = loss_and_grad(FocalDiceLoss(dice_mode=mode), logits, target)
+        close = torch.allclose(loss, ref_loss, rtol=1e-5) and torch.allclose(grad, ref_grad, rtol=1e-4, atol=1e-10)
+
+        small = torch.randn(2, 3, 6, 6, dtype=torch.float64, device=device, requires_grad=True)
+        binary = (torch.rand(2, 3, 6, 6, device=device) > 0.5).double()
+        soft = torch.rand(2, 3, 6, 6, dtype=torch.float64, device=device)
+        checked = all(torch.autograd.gradcheck(lambda p: FocalDiceLoss(dice_mode=mode)(p, t), (small,))
+                      for t in (binary, soft))
+        print(f"  dice_mode={mode:6s} vs reference: max grad diff {(grad - ref_grad).abs().max().item():.2e}, "
+              f"gradcheck {'passed' if checked else 'FAILED'}  {'OK' if close and checked else 'MISMATCH'}")
+        ok &= close and checked
+    return ok
+
+
+def saved_for_backward_mb(loss_fn, logits, target):
+    """Memory autograd holds from forward until backward (distinct storages of saved tensors)"""
+    storages = {}
+
+    def pack(tensor):
+        storage = tensor.untyped_storage()
+        storages[storage.data_ptr()] = storage.nbytes()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        loss_fn(logits.detach().requires_grad_(), target)
+    # The inputs are held by the caller anyway
+    for tensor in (logits, target):
+        storages.pop(tensor.untyped_storage().data_ptr(), None)
+    return sum(storages.values()) / 2 ** 20
+
+
+def peak_memory_mb(shape, mode, device):
+    """Peak memory growth of one step, measured in a fresh process (CUDA peak, or peak RSS on Linux)"""
+    # Large blocks straight from mmap, so freed temporaries leave RSS and the peak is visible
+    env = dict(os.environ, MALLOC_MMAP_THRESHOLD_='65536')
+    result = subprocess.run([sys.executable, __file__, '--measure-peak', shape, mode, '--device', str(device)],
+                            capture_output=True, text=True, env=env)
+    try:
+        return float(result.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return float('nan')
+
+
+def _proc_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def measure_peak(shape, mode, device):
+    logits, target = make_inputs(shape, device)
+    loss_fn = CombinedLoss() if mode == 'combined' else FocalDiceLoss(dice_mode=mode)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+        base = torch.cuda.memory_allocated()
+        torch.cuda.reset_peak_memory_stats()
+        loss_and_grad(loss_fn, logits, target)
+        torch.cuda.synchronize()
+        return (torch.cuda.max_memory_allocated() - base) / 2 ** 20
+    loss_and_grad(CombinedLoss(), logits[:1], target[:1])  # load kernels before the baseline
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # reset the peak (VmHWM) to the current RSS
+    base = _proc_status_kb('VmRSS')
+    loss_and_grad(loss_fn, logits, target)
+    return (_proc_status_kb('VmHWM') - base) / 1024
+
+
+def make_inputs(shape, device):
+    dims = tuple(int(d) for d in shape.split('x'))
+    torch.manual_seed(0)
+    return torch.randn(dims, device=device), (torch.rand(dims, device=device) > 0.8).float()
+
+
+def step_ms(fn, device, repeats):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shapes', nargs='+', default=['8x1x512x512', '8x4x512x512'], help='NxCxHxW logits')
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--measure-peak', nargs=2, metavar=('SHAPE', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+    if args.measure_peak:
+        print(measure_peak(*args.measure_peak, device))
+        return
+
+    print("Verification")
+    if not verify(device):
+        sys.exit("ERROR: fused loss does not match the reference")
+
+    print(f"\nForward + backward, median of {args.repeats} ({device}, {torch.get_num_threads()} threads)")
+    print(f"  {'shape':14s} {'loss':24s} {'ms/step':>8s} {'saved MB':>9s} {'peak MB':>8s}")
+    for shape in args.shapes:
+        logits, target = make_inputs(shape, device)
+        losses = [('combined', CombinedLoss())]  # its Dice is the 'global' mode
+        losses += [(mode, FocalDiceLoss(dice_mode=mode)) for mode in DICE_MODES]
+        for mode, loss_fn in losses:
+            label = 'CombinedLoss' if mode == 'combined' else f'FocalDiceLoss ({mode})'
+            step = lambda: loss_and_grad(loss_fn, logits, target)
+            print(f"  {shape:14s} {label:24s} {step_ms(step, device, args.repeats):8.1f} "
+                  f"{saved_for_backward_mb(loss_fn, logits, target):9.0f} {peak_memory_mb(shape, mode, device):8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Grad-CAM cost per image: one image at a time vs. a batch (gradcam.py).
+
+- per image: GradCAM.generate plus overlay_on_image for each image, one
+  forward and backward pass per image and class, as /api/damage/assess
+  did.
+- batched: one generate_batch call (one forward and one backward pass for
+  the whole batch and every class) plus overlay_batch.
+
+Overlays are timed separately, and the uint8 lookup-table overlay is also
+compared with the previous float32 version (float_overlay below): its time
+and how many pixels differ by more than a few levels. Images are synthetic
+--width x --height frames. Uses best_model.pth if present, otherwise the
+same architecture with random weights (timings do not depend on weights).
+
+    python benchmarks/gradcam_batch.py --batch-sizes 1 8 16 --classes 1 3 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gradcam import CAM_THRESHOLD, GradCAM, get_gradcam_target_layer
+from inference_damage import DamageAssessor, damage_model
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def float_overlay(original_image_bgr, cam, alpha=0.5):
+    """The float32 overlay GradCAM.overlay_on_image used to compute"""
+    h, w = original_image_bgr.shape[:2]
+    cam_resized = cv2.resize(cam, (w, h))
+    cam_resized = np.where(cam_resized < CAM_THRESHOLD, 0, cam_resized)
+    if cam_resized.max() > 0:
+        cam_resized = cam_resized / cam_resized.max()
+    heatmap = cv2.applyColorMap(np.uint8(255 * cam_resized), cv2.COLORMAP_JET)
+    mask = (cam_resized > 0.1).astype(np.float32)
+    mask = np.stack([mask, mask, mask], axis=2)
+    overlaid = original_image_bgr.copy().astype(np.float32)
+    overlaid = overlaid * (1 - mask * alpha) + heatmap.astype(np.float32) * mask * alpha
+    return np.clip(overlaid, 0, 255).astype(np.uint8)
+
+
+def load_model(path):
+    if os.path.exists(path):
+        assessor = DamageAssessor(path, device='cpu')
+        return assessor.model, len(assessor.class_names)
+    print(f"{path} not found: random weights")
+    model = damage_model(3)
+    model.eval()
+    return model, 3
+
+
+def best_ms(fn, count, repeats):
+    """Fastest of ``repeats`` runs, in ms per image"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000 / count)
+    return min(timings)
+
+
+def per_image(cam, inputs, classes, images):
+    for i in range(len(inputs)):
+        for k in range(classes):
+            cam.overlay_on_image(images[i], cam.generate(inputs[i:i + 1], k))
+
+
+def batched(cam, inputs, classes, images):
+    cams = cam.generate_batch(inputs, [list(range(classes))] * len(inputs))
+    for k in range(classes):
+        cam.overlay_batch(images, cams[:, k])
+
+
+def overlay_report(cam, images, cams, repeats):
+    timings = {}
+    outputs = {}
+    for name, overlay in (('float32', float_overlay), ('uint8 LUT', cam.overlay_on_image)):
+        outputs[name] = [overlay(image, c) for image, c in zip(images, cams)]
+        timings[name] = best_ms(lambda: [overlay(image, c) for image, c in zip(images, cams)], len(images), repeats)
+    diff = np.stack([np.abs(a.astype(np.int16) - b.astype(np.int16)).max(axis=2)
+                     for a, b in zip(outputs['float32'], outputs['uint8 LUT'])])
+    return timings, (diff > 4).mean() * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.path.join(BASE_DIR, 'best_model.pth'))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 16])
+    parser.add_argument('--classes', type=int, nargs='+', default=[1, 3], help='classes explained per image')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--repeats', type=int, default=3, help='runs per measurement; the fastest is reported')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model, num_classes = load_model(args.model)
+    cam = GradCAM(model, get_gradcam_target_layer(model))
+    count = max(args.batch_sizes)
+    torch.manual_seed(0)
+    inputs = torch.randn(count, 3, 224, 224)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(count)]
+    print(f"{args.width}x{args.height} images, {torch.get_num_threads()} threads\n")
+
+    cams = cam.generate_batch(inputs)[:, 0]
+    overlay_ms, differing = overlay_report(cam, images, cams, args.repeats)
+    print(f"Overlay: float32 {overlay_ms['float32']:.1f} ms, uint8 LUT {overlay_ms['uint8 LUT']:.1f} ms per image; "
+          f"{differing:.3f}% of pixels differ by more than 4 levels (threshold edge)\n")
+
+    cam.generate_batch(inputs[:2])  # warm-up
+    print(f"  {'batch':>5s} {'classes':>7s} {'per image ms':>13s} {'batched ms':>11s} {'speed-up':>9s}")
+    for classes in args.classes:
+        if classes > num_classes:
+            continue
+        for batch_size in args.batch_sizes:
+            batch = (cam, inputs[:batch_size], classes, images)
+            single = best_ms(lambda: per_image(*batch), batch_size, args.repeats)
+            together = best_ms(lambda: batched(*batch), batch_size, args.repeats)
+            print(f"  {batch_size:5d} {classes:7d} {single:13.1f} {together:11.1f} {single / together:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Concurrency stress test for ResourceInventory.
+
+Many threads (and optionally processes) hammer one SQLite inventory with
+random multi-resource reservations, some of which cannot be covered. At
+the end every resource must satisfy
+
+    initial stock == remaining stock + sum of its ledger entries
+
+and no stock may be negative; a lost update or a partially applied
+reservation breaks the equation.
+
+    python benchmarks/inventory_stress.py --threads 32 --requests 200 --processes 4
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from resource_inventory import InsufficientStock, ResourceInventory
+
+SEED = [{"resource_name": f"resource-{i}", "quantity": 20000} for i in range(8)]
+
+
+def hammer(db_path, threads, requests, seed):
+    inventory = ResourceInventory(db_path)
+    counts = {'ok': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        for _ in range(requests):
+            names = rng.sample([r['resource_name'] for r in SEED], k=rng.randint(1, 4))
+            plan = [("stress", {name: rng.randint(1, 40) for name in names})]
+            try:
+                inventory.reserve(plan)
+                outcome = 'ok'
+            except InsufficientStock:
+                outcome = 'rejected'
+            with lock:
+                counts[outcome] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=100, help='reservations per thread')
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stress.db')
+        ResourceInventory(db_path, seed=SEED)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(args.processes) as pool:
+            results = list(pool.map(hammer, [db_path] * args.processes, [args.threads] * args.processes,
+                                    [args.requests] * args.processes, range(args.processes)))
+        elapsed = time.perf_counter() - start
+
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute('''SELECT r.resource_name, r.quantity, COALESCE(SUM(ra.allocated_quantity), 0)
+                     FROM resources r LEFT JOIN resource_allocation ra ON ra.resource_id = r.resource_id
+                     GROUP BY r.resource_id ORDER BY r.resource_id''')
+        rows = c.fetchall()
+        conn.close()
+
+    ok = sum(r['ok'] for r in results)
+    rejected = sum(r['rejected'] for r in results)
+    total = ok + rejected
+    print(f"{total} reservations ({ok} applied, {rejected} rejected) in {elapsed:.2f}s "
+          f"= {total / elapsed:.0f} req/s")
+
+    initial = {r['resource_name']: r['quantity'] for r in SEED}
+    failures = [(name, qty, allocated) for name, qty, allocated in rows
+                if qty < 0 or qty + allocated != initial[name]]
+    for name, qty, allocated in rows:
+        print(f"  {name}: remaining {qty:>5} + allocated {allocated:>5} = {qty + allocated:>5} / {initial[name]}")
+    if failures:
+        print(f"FAIL: inventory inconsistent for {[f[0] for f in failures]}")
+        sys.exit(1)
+    print("OK: no lost updates, no partial reservations")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+CPU throughput of SegmentationPredictor (utils/predict.py).
+
+Times the per-image path (one forward pass and one transform call per image)
+against predict_batch at several batch sizes, on synthetic JPEG-encoded
+frames so decoding is included.
+
+Pass --model-class module:Class and --checkpoint to measure the trained
+network. Without them, torchvision's LR-ASPP MobileNetV3 with one output
+channel stands in (random weights; only speed is measured).
+
+    python benchmarks/segmentation_throughput.py --images 64 --batch-sizes 1 4 8 16 --threads 8
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.predict import SegmentationPredictor, load_model
+
+
+class TorchvisionSegmenter(nn.Module):
+    """LR-ASPP MobileNetV3 returning the (N, 1, H, W) logits tensor our models return"""
+
+    def __init__(self):
+        super().__init__()
+        from torchvision.models.segmentation import lraspp_mobilenet_v3_large
+        self.net = lraspp_mobilenet_v3_large(weights=None, weights_backbone=None, num_classes=1)
+
+    def forward(self, x):
+        return self.net(x)['out']
+
+
+def build_model(args):
+    if not args.model_class:
+        return TorchvisionSegmenter()
+    module_name, class_name = args.model_class.split(':')
+    model_class = getattr(importlib.import_module(module_name), class_name)
+    return load_model(args.checkpoint, model_class, 'cpu') if args.checkpoint else model_class()
+
+
+def synthetic_frames(count, width, height, seed):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        small = (rng.random((height // 16, width // 16, 3)) * 255).astype(np.uint8)
+        frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+        frames.append(cv2.imencode('.jpg', frame)[1].tobytes())
+    return frames
+
+
+def timed(fn, images, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        fn(images[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=32)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=960)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    parser.add_argument('--model-class', help='module:Class of the segmentation network')
+    parser.add_argument('--checkpoint', help='checkpoint with model_state_dict for --model-class')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    predictor = SegmentationPredictor(build_model(args), device='cpu')
+    images = synthetic_frames(args.images, args.width, args.height, args.seed)
+    print(f"{args.images} JPEG frames {args.width}x{args.height}, {torch.get_num_threads()} CPU threads")
+
+    predictor.predict_batch(images[:1])  # warm-up (allocator, oneDNN kernels)
+    predictor.reset_timings()
+
+    def per_image(chunk):
+        for image in chunk:
+            predictor.predict(image)
+
+    rows = [('per image', per_image, 1)] + [(f'batch {b}', predictor.predict_batch, b) for b in args.batch_sizes]
+    baseline = None
+    for label, fn, batch_size in rows:
+        elapsed = timed(fn, images, batch_size)
+        throughput = args.images / elapsed
+        baseline = baseline or throughput
+        print(f"  {label:10s} {throughput:8.2f} images/s  {elapsed * 1000 / args.images:8.1f} ms/image  "
+              f"x{throughput / baseline:.2f}")
+
+    steps = predictor.timing_report()
+    print("  pre/post-processing ms/image: " + ", ".join(f"{step} {ms:.2f}" for step, ms in steps.items()))
+
+
+if __name__ == '__main__':
+    main()
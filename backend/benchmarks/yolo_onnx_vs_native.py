@@ -0,0 +1,87 @@
+"""
+Native PyTorch vs ONNX Runtime inference of the YOLO disaster detector
+(disaster_detector.py) on Natural-Disaster-Damage--1/test/images.
+
+Exports the weights to ONNX with dynamic batch and image size (unless
+--onnx already exists), then times both backends through DisasterDetector
+at each --imgsz and --batch-sizes, and checks that they agree: images whose
+per-class counts match, and total detections.
+
+    python benchmarks/yolo_onnx_vs_native.py --imgsz 640 480 320 --batch-sizes 1 8 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+# Add backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from disaster_detector import DETECTOR_WEIGHTS, DisasterDetector
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def export_onnx(weights, onnx_path, imgsz):
+    from ultralytics import YOLO
+    exported = YOLO(weights, task='detect').export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    print(f"OK: Exported {os.path.basename(weights)} -> {onnx_path}")
+
+
+def timed(detector, images, imgsz, batch_size):
+    detector.batch_size = batch_size
+    detector.detect_batch(images[:batch_size], imgsz=imgsz)  # warm-up (graph, allocator)
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(images), batch_size):
+        results += detector.detect_batch(images[i:i + batch_size], imgsz=imgsz)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=DETECTOR_WEIGHTS)
+    parser.add_argument('--onnx', help='ONNX model (default: next to --weights; exported if missing)')
+    parser.add_argument('--images', default=os.path.join(PROJECT_ROOT, 'Natural-Disaster-Damage--1', 'test', 'images'))
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640, 480, 320])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        sys.exit(f"ERROR: weights not found: {args.weights}")
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    onnx_path = args.onnx or os.path.splitext(args.weights)[0] + '.onnx'
+    if not os.path.exists(onnx_path):
+        export_onnx(args.weights, onnx_path, max(args.imgsz))
+
+    images = [os.path.join(args.images, name) for name in sorted(os.listdir(args.images))
+              if name.lower().endswith(IMAGE_EXTENSIONS)]
+    detectors = {'native': DisasterDetector(args.weights), 'onnx': DisasterDetector(onnx_path)}
+    print(f"{len(images)} images from {args.images}, {torch.get_num_threads()} CPU threads")
+
+    print(f"\n  {'imgsz':>5s} {'batch':>5s} {'backend':8s} {'images/s':>9s} {'ms/image':>9s} {'x native':>8s} "
+          f"{'boxes':>6s} {'counts match':>12s}")
+    for imgsz in args.imgsz:
+        for batch_size in args.batch_sizes:
+            native = None
+            for backend, detector in detectors.items():
+                results, elapsed = timed(detector, images, imgsz, batch_size)
+                throughput = len(images) / elapsed
+                if native is None:
+                    native = (results, throughput)
+                match = sum(r['counts'] == n['counts'] for r, n in zip(results, native[0])) / len(images)
+                boxes = sum(len(r['detections']) for r in results)
+                print(f"  {imgsz:5d} {batch_size:5d} {backend:8s} {throughput:9.2f} {1000 / throughput:9.1f} "
+                      f"{throughput / native[1]:8.2f} {boxes:6d} {match:12.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Two-stage damage assessment: a cheap gate in front of the expensive models.
+
+Stage 1 is the ResNet-18 disaster classifier (utils/predict_disaster.py)
+run at CASCADE_GATE_SIZE pixels instead of 224. Only images it labels as a
+disaster class with at least CASCADE_MIN_CONFIDENCE percent go on to stage
+2, the EfficientNet DamageAssessor, and then to Grad-CAM if asked for.
+The rest are reported as "No Damage" straight from the gate.
+
+If the classifier is unavailable every image goes to the assessor, as
+before. benchmarks/cascade_report.py measures compute saved against
+accuracy lost on backend/dataset for a range of thresholds.
+"""
+
+import os
+
+from inference_damage import CLASS_COLORS, DAMAGE_LABELS
+from model_registry import ModelUnavailable
+
+CASCADE_ENABLED = os.getenv('CASCADE_ENABLED', '1') == '1'
+CASCADE_GATE_SIZE = int(os.getenv('CASCADE_GATE_SIZE', 160))
+CASCADE_MIN_CONFIDENCE = float(os.getenv('CASCADE_MIN_CONFIDENCE', 50))
+NON_DISASTER_CLASSES = ('normal',)
+
+
+def escalates(disaster_type, confidence, min_confidence=CASCADE_MIN_CONFIDENCE):
+    """Whether a gate prediction is sent on to the damage assessor"""
+    return disaster_type not in NON_DISASTER_CLASSES and confidence >= min_confidence
+
+
+def gated_result(confidence):
+    """Assessor-shaped result for an image the gate stopped"""
+    return {
+        "predicted_label": DAMAGE_LABELS[0],
+        "damage_level": 0,
+        "confidence": round(confidence, 2),
+        "color": CLASS_COLORS[0],
+    }
+
+
+class DamageCascade:
+    def __init__(self, classifier, assessor, gate_size=CASCADE_GATE_SIZE, min_confidence=CASCADE_MIN_CONFIDENCE):
+        self.classifier = classifier  # DisasterClassifier, or a registry proxy of one
+        self.assessor = assessor      # DamageAssessor, or a registry proxy of one
+        self.gate_size = gate_size
+        self.min_confidence = min_confidence
+        self._gate_warned = False
+
+    def gate(self, image_paths):
+        """[(disaster_type, confidence %, escalate), ...]; everything escalates without a working classifier"""
+        if not self.classifier:
+            return [(None, None, True) for _ in image_paths]
+        try:
+            verdicts = self.classifier.predict_batch(image_paths, image_size=self.gate_size)
+        except ModelUnavailable as e:
+            if not self._gate_warned:
+                print(f"WARNING: Cascade gate unavailable, escalating every image: {e}")
+                self._gate_warned = True
+            return [(None, None, True) for _ in image_paths]
+        return [(label, conf, escalates(label, conf, self.min_confidence)) for label, conf in verdicts]
+
+    def predict(self, image_path, gradcam=True):
+        """DamageAssessor.predict result plus the gate's verdict under 'cascade'"""
+        (disaster_type, confidence, escalate), = self.gate([image_path])
+        if escalate:
+            result = self.assessor.predict(image_path, gradcam=gradcam)
+        else:
+            result = dict(gated_result(confidence), all_probabilities=None, gradcam_heatmap_b64=None)
+        result["cascade"] = {
+            "disaster_type": disaster_type,
+            "disaster_confidence": round(confidence, 2) if confidence is not None else None,
+            "escalated": escalate,
+        }
+        return result
+
+    def predict_batch(self, image_paths, gradcam=False):
+        """Drop-in for DamageAssessor.predict_batch: gate the batch, assess only what escalates"""
+        if not image_paths:
+            return []
+        verdicts = self.gate(image_paths)
+        escalated = [i for i, (_, _, escalate) in enumerate(verdicts) if escalate]
+        gated = dict(gradcam_heatmap_b64=None) if gradcam else {}
+        results = [None if escalate else dict(gated_result(conf), **gated) for _, conf, escalate in verdicts]
+        if escalated:
+            assessed = self.assessor.predict_batch([image_paths[i] for i in escalated], gradcam=gradcam)
+            for i, result in zip(escalated, assessed):
+                results[i] = result
+        return results
@@ -0,0 +1,81 @@
+"""
+Disaster damage detector: the YOLO model trained in runs/detect/train3 on
+the Natural-Disaster-Damage--1 dataset (Earthquake / Forest Fire /
+Hurricane).
+
+Weights are loaded once, either the native ``best.pt`` or an ONNX export
+(``best.onnx``, see benchmarks/yolo_onnx_vs_native.py), and images are run
+through in batches of up to DETECTOR_BATCH at DETECTOR_IMGSZ. Each image
+gives its boxes plus a per-class count.
+"""
+
+import os
+import threading
+
+import numpy as np
+import yaml
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DETECTOR_WEIGHTS = os.getenv('DETECTOR_WEIGHTS', os.path.join(BASE_DIR, 'runs', 'detect', 'train3', 'weights', 'best.pt'))
+DETECTOR_DATA = os.path.join(os.path.dirname(BASE_DIR), 'Natural-Disaster-Damage--1', 'data.yaml')
+DETECTOR_IMGSZ = int(os.getenv('DETECTOR_IMGSZ', 640))  # training resolution (runs/detect/train3/args.yaml)
+DETECTOR_CONF = float(os.getenv('DETECTOR_CONF', 0.25))
+DETECTOR_IOU = float(os.getenv('DETECTOR_IOU', 0.7))
+DETECTOR_BATCH = int(os.getenv('DETECTOR_BATCH', 8))
+
+
+def dataset_class_names(data_yaml=DETECTOR_DATA):
+    """Class names in training order from the dataset's data.yaml"""
+    with open(data_yaml) as f:
+        return list(yaml.safe_load(f)['names'])
+
+
+class DisasterDetector:
+    def __init__(self, weights=DETECTOR_WEIGHTS, device='cpu', imgsz=DETECTOR_IMGSZ, conf=DETECTOR_CONF,
+                 iou=DETECTOR_IOU, batch_size=DETECTOR_BATCH):
+        from ultralytics import YOLO
+
+        self.weights = weights
+        self.device = str(device)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.batch_size = batch_size
+        self.model = YOLO(weights, task='detect')
+        # ONNX exports carry no reliable names; fall back to the dataset's
+        names = self.model.names
+        if not names or all(str(i) == str(n) for i, n in names.items()):
+            names = dict(enumerate(dataset_class_names()))
+        self.class_names = [names[i] for i in sorted(names)]
+        # One predictor is shared by all callers, and it is not thread-safe
+        self._lock = threading.Lock()
+        print(f"DisasterDetector ready ({os.path.basename(weights)}, imgsz {imgsz}, {self.device})")
+
+    def _run(self, images, imgsz, conf):
+        with self._lock:
+            return self.model.predict(images, imgsz=imgsz, conf=conf, iou=self.iou, device=self.device,
+                                      batch=self.batch_size, verbose=False)
+
+    def _summarise(self, result):
+        boxes = result.boxes
+        classes = boxes.cls.cpu().numpy().astype(int)
+        confidences = boxes.conf.cpu().numpy()
+        xyxy = np.rint(boxes.xyxy.cpu().numpy()).astype(int)
+        counts = dict.fromkeys(self.class_names, 0)
+        detections = []
+        for c, score, box in zip(classes, confidences, xyxy):
+            counts[self.class_names[c]] += 1
+            detections.append({'class': self.class_names[c], 'confidence': round(float(score) * 100, 2),
+                               'box': box.tolist()})
+        height, width = result.orig_shape
+        return {'width': width, 'height': height, 'detections': detections, 'counts': counts}
+
+    def detect_batch(self, images, imgsz=None, conf=None):
+        """Detections for image paths or BGR arrays, batched; one dict per image"""
+        if not images:
+            return []
+        results = self._run(list(images), imgsz or self.imgsz, self.conf if conf is None else conf)
+        return [self._summarise(r) for r in results]
+
+    def detect(self, image, imgsz=None, conf=None):
+        return self.detect_batch([image], imgsz=imgsz, conf=conf)[0]
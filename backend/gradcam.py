@@ -1,78 +1,141 @@
+import functools
+
 import torch
 import torch.nn.functional as F
 import numpy as np
 import cv2
 
+# Zero out anything below 40% activation, so weak sky/background areas don't show red
+CAM_THRESHOLD = 0.4
+# Jet colour for every uint8 heat value, as cv2.applyColorMap would give it
+JET_COLORS = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cv2.COLORMAP_JET)
+
+
+@functools.lru_cache(maxsize=8)
+def _blend_luts(alpha):
+    """uint8 lookup tables for image * (1 - alpha) and jet colour * alpha"""
+    image_lut = np.round(np.arange(256) * (1 - alpha)).astype(np.uint8)
+    color_lut = np.round(JET_COLORS * alpha).astype(np.uint8)
+    return image_lut, color_lut
+
+
 class GradCAM:
+    """Grad-CAM for ``target_layer`` of ``model``.
+
+    ``generate_batch`` explains N images, and optionally K classes per
+    image, with one forward and one backward pass: the K class scores are
+    backpropagated together as a batched (vmapped) backward, and gradients
+    stop at the target layer instead of reaching every parameter.
+    """
+
     def __init__(self, model, target_layer):
         self.model = model
         self.target_layer = target_layer
+        # Last call's state: target layer activations and gradients, and model outputs
         self.gradients = None
         self.activations = None
-        self.target_layer.register_forward_hook(self._save_activation)
-        self.target_layer.register_full_backward_hook(self._save_gradient)
-
-    def _save_activation(self, module, input, output):
-        self.activations = output.detach()
-
-    def _save_gradient(self, module, grad_input, grad_output):
-        self.gradients = grad_output[0].detach()
-
-    def generate(self, input_tensor, class_idx=None):
-        self.model.eval()
-        output = self.model(input_tensor)
+        self.logits = None
+
+    def _forward(self, input_tensor):
+        """Model output and the target layer output, still attached to the graph"""
+        captured = []
+        handle = self.target_layer.register_forward_hook(lambda module, input, output: captured.append(output))
+        try:
+            output = self.model(input_tensor)
+        finally:
+            handle.remove()
+        return output, captured[0]
+
+    def _class_indices(self, class_idx, output):
+        """(N, K) long tensor of the classes to explain for each image"""
         if class_idx is None:
-            class_idx = output.argmax(dim=1).item()
-        self.model.zero_grad()
-        one_hot = torch.zeros_like(output)
-        one_hot[0][class_idx] = 1.0
-        output.backward(gradient=one_hot)
-
-        weights = self.gradients.mean(dim=(2, 3), keepdim=True)
-        cam = (weights * self.activations).sum(dim=1, keepdim=True)
-        cam = F.relu(cam)
-
-        # Normalize
-        cam = cam.squeeze().cpu().numpy()
-        cam = cam - cam.min()
-        cam = cam / (cam.max() + 1e-8)
+            return output.argmax(dim=1, keepdim=True)
+        indices = torch.as_tensor(class_idx, dtype=torch.long, device=output.device)
+        if indices.dim() == 0:
+            indices = indices.expand(output.shape[0])
+        if indices.dim() == 1:
+            indices = indices.unsqueeze(1)
+        if indices.dim() != 2 or indices.shape[0] != output.shape[0]:
+            raise ValueError(f"class_idx must be an int, N ints or N x K ints for {output.shape[0]} images, "
+                             f"got shape {tuple(indices.shape)}")
+        return indices
+
+    def generate_batch(self, input_tensor, class_idx=None):
+        """Grad-CAMs for a batch: float32 array (N, K, h, w), each map scaled to [0, 1].
+
+        class_idx: None for each image's top class, one class for all images,
+        one class per image, or an N x K array of classes per image.
+        """
+        self.model.eval()
+        with torch.enable_grad():
+            output, activations = self._forward(input_tensor)
+            indices = self._class_indices(class_idx, output)
+            num_classes = indices.shape[1]
+            if num_classes == 1:
+                score = output.gather(1, indices).sum()
+                gradients = torch.autograd.grad(score, activations)[0].unsqueeze(1)
+            else:
+                # One-hot per class slot k: (K, N, C) -> gradients (K, N, ...) in one vmapped backward
+                grad_outputs = torch.zeros((num_classes,) + output.shape, dtype=output.dtype, device=output.device)
+                grad_outputs.scatter_(2, indices.t().unsqueeze(2), 1.0)
+                gradients = torch.autograd.grad(output, activations, grad_outputs, is_grads_batched=True)[0]
+                gradients = gradients.transpose(0, 1)
+        activations = activations.detach()
+        self.activations, self.gradients, self.logits = activations, gradients, output.detach()
+
+        # (N, K, C, 1, 1) channel weights x (N, 1, C, h, w) activations, summed over channels
+        weights = gradients.mean(dim=(3, 4), keepdim=True)
+        cam = F.relu((weights * activations.unsqueeze(1)).sum(dim=2)).float()
+
+        # Normalize each map
+        cam = cam - cam.amin(dim=(2, 3), keepdim=True)
+        cam = cam / (cam.amax(dim=(2, 3), keepdim=True) + 1e-8)
 
         # Sharpen: raise to power to suppress weak activations
         # This removes the diffuse background glow you're seeing
-        cam = np.power(cam, 1.5)
-        cam = cam / (cam.max() + 1e-8)
+        cam = cam.pow_(1.5)
+        cam = cam / (cam.amax(dim=(2, 3), keepdim=True) + 1e-8)
 
-        return cam
+        return cam.cpu().numpy()
+
+    def generate(self, input_tensor, class_idx=None):
+        """Grad-CAM (h, w) for the first image in ``input_tensor``"""
+        return self.generate_batch(input_tensor[:1], None if class_idx is None else [class_idx])[0, 0]
 
     def overlay_on_image(self, original_image_bgr, cam, alpha=0.5):
+        """Blend the jet-coloured CAM over a uint8 BGR image where activation is strong.
+
+        Works in uint8 throughout: the CAM is quantized at its own resolution
+        before resizing, and the threshold, renormalization, colour map and
+        blend weights are 256-entry lookup tables.
+        """
         h, w = original_image_bgr.shape[:2]
+        if cam.dtype != np.uint8:
+            cam = np.uint8(255 * np.clip(cam, 0, 1))
         cam_resized = cv2.resize(cam, (w, h))
 
-        # Threshold: zero out anything below 40% activation
-        # This stops weak sky/background areas from showing red
-        cam_resized = np.where(cam_resized < 0.4, 0, cam_resized)
-
-        # Renormalize after threshold
-        if cam_resized.max() > 0:
-            cam_resized = cam_resized / cam_resized.max()
-
-        heatmap = cv2.applyColorMap(
-            np.uint8(255 * cam_resized),
-            cv2.COLORMAP_JET
-        )
-
-        # Only blend where activation is strong (mask weak areas)
-        mask = (cam_resized > 0.1).astype(np.float32)
-        mask = np.stack([mask, mask, mask], axis=2)
-
-        overlaid = original_image_bgr.copy().astype(np.float32)
-        overlaid = overlaid * (1 - mask * alpha) + heatmap.astype(np.float32) * mask * alpha
-        overlaid = np.clip(overlaid, 0, 255).astype(np.uint8)
-
+        # Only blend where activation is strong; nothing is, if the resized peak is under the threshold
+        threshold = int(np.ceil(255 * CAM_THRESHOLD))
+        peak = int(cam_resized.max())
+        overlaid = original_image_bgr.copy()
+        if peak < threshold:
+            return overlaid
+        _, mask = cv2.threshold(cam_resized, threshold - 1, 255, cv2.THRESH_BINARY)
+
+        # Renormalize after threshold: heat value v becomes jet colour 255 * v / peak
+        image_lut, color_lut = _blend_luts(alpha)
+        heat_lut = color_lut[np.minimum(np.arange(256) * 255 // peak, 255)]
+        heatmap = cv2.applyColorMap(cam_resized, heat_lut)
+        cv2.add(cv2.LUT(original_image_bgr, image_lut), heatmap, dst=overlaid, mask=mask)
         return overlaid
 
+    def overlay_batch(self, images_bgr, cams, alpha=0.5):
+        """overlay_on_image for each (image, cam) pair; cams is an (N, h, w) array"""
+        cams = np.uint8(255 * np.clip(np.asarray(cams, dtype=np.float32), 0, 1))
+        return [self.overlay_on_image(image, cam, alpha) for image, cam in zip(images_bgr, cams)]
+
 
 def get_gradcam_target_layer(model):
     # blocks[-3] gives better spatial resolution for structural damage detection
     # It's abstract enough to understand damage but sharp enough to localize it
-    return model.blocks[-3]
\ No newline at end of file
+    return model.blocks[-3]
@@ -0,0 +1,137 @@
+"""
+Background derivative generation for report images.
+
+Uploads are stored as-is by ``/api/disaster/report``. This worker picks
+them up after the request has returned and writes EXIF-free WebP
+derivatives (a small thumbnail for list views and a medium preview for
+detail views). Derivatives are named after the SHA-256 of the original,
+so their URLs never change content and can be cached forever.
+"""
+
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+
+from PIL import Image, ImageOps
+
+DERIVATIVE_SIZES = {
+    'thumb': 256,
+    'preview': 1024,
+}
+WEBP_QUALITY = 80
+EXIF_ORIENTATION = 0x0112
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_name(sha256, kind):
+    return f"{sha256}_{kind}.webp"
+
+
+def generate_derivatives(source_path, output_dir, sha256=None):
+    """Write every derivative of ``source_path`` into ``output_dir``.
+
+    Returns ``(sha256, width, height, {kind: filename})``, where width and
+    height are those of the upright (EXIF-rotated) original.
+    """
+    sha256 = sha256 or file_sha256(source_path)
+    names = {kind: derivative_name(sha256, kind) for kind in DERIVATIVE_SIZES}
+
+    with Image.open(source_path) as im:
+        width, height = im.size
+        if im.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG only: let the decoder downscale by 1/2..1/8 while reading
+        im.draft('RGB', (max(DERIVATIVE_SIZES.values()),) * 2)
+        upright = ImageOps.exif_transpose(im).convert('RGB')
+
+        # Largest first, so each smaller size is resampled from the previous one
+        for kind, size in sorted(DERIVATIVE_SIZES.items(), key=lambda kv: -kv[1]):
+            path = os.path.join(output_dir, names[kind])
+            upright.thumbnail((size, size), Image.LANCZOS)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                # No exif= argument: the saved file carries no EXIF/GPS metadata
+                upright.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+                os.replace(tmp_path, path)
+
+    return sha256, width, height, names
+
+
+class DerivativeWorker:
+    """Single background thread that processes pending ``images`` rows."""
+
+    def __init__(self, db_path, upload_folder, derivative_folder):
+        self.db_path = db_path
+        self.upload_folder = upload_folder
+        self.derivative_folder = derivative_folder
+        os.makedirs(derivative_folder, exist_ok=True)
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='image-derivatives', daemon=True)
+            self._thread.start()
+            self.enqueue_pending()
+        return self
+
+    def enqueue(self, sha256):
+        self._queue.put(sha256)
+
+    def enqueue_pending(self):
+        """Requeue images left unprocessed by a previous run."""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        c.execute("SELECT sha256 FROM images WHERE status = 'pending'")
+        for (sha256,) in c.fetchall():
+            self.enqueue(sha256)
+        conn.close()
+
+    def _run(self):
+        while True:
+            sha256 = self._queue.get()
+            try:
+                self.process(sha256)
+            except Exception as e:
+                print(f"WARNING: Derivative generation failed for image {sha256[:12]}: {e}")
+                self._set_status(sha256, 'failed')
+
+    def process(self, sha256):
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        c.execute("SELECT path, status FROM images WHERE sha256 = ?", (sha256,))
+        row = c.fetchone()
+        conn.close()
+        if not row or row[1] == 'ready':
+            return
+
+        source_path = os.path.join(self.upload_folder, row[0])
+        _, width, height, names = generate_derivatives(source_path, self.derivative_folder, sha256=sha256)
+
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        c.execute('''UPDATE images
+                     SET width = ?, height = ?, thumb = ?, preview = ?, status = 'ready'
+                     WHERE sha256 = ?''',
+                  (width, height, names['thumb'], names['preview'], sha256))
+        conn.commit()
+        conn.close()
+
+    def _set_status(self, sha256, status):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("UPDATE images SET status = ? WHERE sha256 = ?", (status, sha256))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"WARNING: Could not mark image {sha256[:12]} as {status}: {e}")
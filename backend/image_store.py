@@ -0,0 +1,179 @@
+"""
+Content-addressed, reference-counted storage for uploaded report images.
+
+An upload is streamed to a temporary file while it is hashed. Once the
+report referencing it has committed, ``place_upload`` moves it to
+``<upload_folder>/<aa>/<bb>/<sha256>.<ext>``, or discards it if that path
+already exists, so a photo forwarded a hundred times is written to disk
+once. Only image extensions are accepted. The ``images`` table holds one
+row per distinct content with a ``ref_count`` of the reports linking to
+it through ``report_images``; the file and its derivatives are deleted
+when the last reference goes away.
+
+Uploads and deletes of the same content can interleave. ``remove_orphaned``
+unlinks files only inside a ``BEGIN IMMEDIATE`` transaction that sees no
+reference to them, and ``place_upload`` runs after the new reference has
+committed: a delete either sees that reference and keeps the file, or
+has already unlinked it and ``place_upload`` puts it back.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+
+from image_pipeline import DERIVATIVE_SIZES, derivative_name
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming'
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'tif', 'tiff'}
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def file_extension(filename):
+    """Lower-case image extension of a file name, or None if it is not an accepted image type."""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return ext if ext in IMAGE_EXTENSIONS else None
+
+
+def content_path(sha256, ext):
+    """Path of a stored object relative to the upload folder."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+
+def store_upload(file, upload_folder):
+    """Stream a werkzeug ``FileStorage`` to a temporary file in the store.
+
+    Returns ``(sha256, relative_path, size_bytes, tmp_path)``. The upload is
+    never held in memory as a whole. Call ``place_upload`` once the report
+    linking it has committed, or ``discard_upload`` if that fails.
+    """
+    ext = file_extension(file.filename or '')
+    if ext is None:
+        raise ValueError(f"Unsupported image type: {file.filename}")
+    incoming = os.path.join(upload_folder, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=incoming)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        return sha256, content_path(sha256, ext), size, tmp_path
+    except BaseException:
+        discard_upload(tmp_path)
+        raise
+
+
+def place_upload(upload_folder, rel_path, tmp_path):
+    """Move a stored upload to its content path, keeping an existing copy.
+
+    Call after the reference taken by ``link_report_image`` has committed.
+    """
+    final_path = os.path.join(upload_folder, rel_path)
+    if os.path.exists(final_path):
+        discard_upload(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+
+
+def discard_upload(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+def link_report_image(c, report_id, sha256, rel_path, size_bytes):
+    """Attach stored content to a report and take a reference on it.
+
+    Returns ``(is_new, stored_path)``: whether the content is new to the
+    store (its derivatives still have to be generated), and the path it is
+    stored under. Content already in the store keeps its first path, even
+    when uploaded again under another extension, so place the upload at
+    ``stored_path``. Uses the caller's cursor so it commits with the
+    report insert.
+    """
+    # Written first, so the images lookup below runs inside the write transaction
+    c.execute("INSERT OR IGNORE INTO report_images (report_id, sha256, filename) VALUES (?, ?, ?)",
+              (report_id, sha256, rel_path))
+    if c.rowcount == 0:
+        # Same photo attached twice to one report
+        c.execute("SELECT filename FROM report_images WHERE report_id = ? AND sha256 = ?", (report_id, sha256))
+        return False, c.fetchone()[0]
+
+    c.execute("SELECT path FROM images WHERE sha256 = ?", (sha256,))
+    row = c.fetchone()
+    if row is None:
+        c.execute("INSERT INTO images (sha256, path, size_bytes, ref_count) VALUES (?, ?, ?, 1)",
+                  (sha256, rel_path, size_bytes))
+        return True, rel_path
+
+    stored_path = row[0]
+    c.execute("UPDATE images SET ref_count = ref_count + 1 WHERE sha256 = ?", (sha256,))
+    if stored_path != rel_path:
+        c.execute("UPDATE report_images SET filename = ? WHERE report_id = ? AND sha256 = ?",
+                  (stored_path, report_id, sha256))
+    return False, stored_path
+
+
+def release_report_images(c, report_id):
+    """Drop a report's image references.
+
+    Returns ``{sha256: [files relative to the upload folder]}`` for the
+    content whose last reference was released; delete them with
+    ``remove_orphaned`` after committing.
+    """
+    c.execute("SELECT sha256 FROM report_images WHERE report_id = ? AND sha256 IS NOT NULL", (report_id,))
+    hashes = [row[0] for row in c.fetchall()]
+    c.execute("DELETE FROM report_images WHERE report_id = ?", (report_id,))
+
+    orphaned = {}
+    for sha256 in hashes:
+        c.execute("UPDATE images SET ref_count = ref_count - 1 WHERE sha256 = ?", (sha256,))
+        c.execute("SELECT path, ref_count FROM images WHERE sha256 = ?", (sha256,))
+        row = c.fetchone()
+        if row and row[1] <= 0:
+            c.execute("DELETE FROM images WHERE sha256 = ?", (sha256,))
+            orphaned[sha256] = [row[0]] + [os.path.join('derivatives', derivative_name(sha256, kind))
+                                           for kind in DERIVATIVE_SIZES]
+    return orphaned
+
+
+def remove_orphaned(db_path, upload_folder, orphaned):
+    """Delete the files from ``release_report_images`` whose content is still unreferenced.
+
+    A report may have linked the same content since the release committed.
+    The check and the unlinking share one write transaction, so no new
+    reference can commit in between.
+    """
+    if not orphaned:
+        return
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        for sha256, rel_paths in orphaned.items():
+            c.execute("SELECT 1 FROM images WHERE sha256 = ?", (sha256,))
+            if c.fetchone() is None:
+                remove_files(upload_folder, rel_paths)
+        c.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def remove_files(upload_folder, rel_paths):
+    for rel_path in rel_paths:
+        try:
+            os.remove(os.path.join(upload_folder, rel_path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"WARNING: Could not remove {rel_path}: {e}")
@@ -4,6 +4,7 @@ import torch.nn.functional as F
 import numpy as np
 import cv2
 import base64
+import threading
 import timm
 from PIL import Image
 from torchvision import transforms
@@ -22,11 +23,28 @@ CLASS_COLORS = {
 }
 
 
+def damage_model(num_classes):
+    """EfficientNet-B0 with the damage classification head (untrained)"""
+    model = timm.create_model("efficientnet_b0", pretrained=False, num_classes=0)
+    in_features = model.num_features
+    model.classifier = nn.Sequential(
+        nn.Dropout(p=0.4),
+        nn.Linear(in_features, 256),
+        nn.ReLU(),
+        nn.Dropout(p=0.2),
+        nn.Linear(256, num_classes)
+    )
+    return model
+
+
 class DamageAssessor:
-    def __init__(self, model_path: str):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(self, model_path: str, device=None):
+        self.device = torch.device(device) if device else torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model, self.class_names = self._load_model(model_path)
         self.gradcam = GradCAM(self.model, get_gradcam_target_layer(self.model))
+        # Grad-CAM hooks the model and keeps per-call state, so forward passes
+        # from the request thread and the background assessor must not interleave
+        self._lock = threading.Lock()
         self.transform = transforms.Compose([
             transforms.Resize((224, 224)),
             transforms.ToTensor(),
@@ -40,77 +58,95 @@ class DamageAssessor:
     def _load_model(self, path):
         checkpoint = torch.load(path, map_location=self.device)
         class_names = checkpoint.get("class_names", ['0_no_damage', '2_major_damage', '3_destroyed'])
-        num_classes = len(class_names)
-
-        model = timm.create_model("efficientnet_b0", pretrained=False, num_classes=0)
-        in_features = model.num_features
-        model.classifier = nn.Sequential(
-            nn.Dropout(p=0.4),
-            nn.Linear(in_features, 256),
-            nn.ReLU(),
-            nn.Dropout(p=0.2),
-            nn.Linear(256, num_classes)
-        )
+        model = damage_model(len(class_names))
         model.load_state_dict(checkpoint["model_state_dict"])
         model.to(self.device)
         model.eval()
         return model, class_names
 
-    def predict(self, image_path: str) -> dict:
+    @staticmethod
+    def _label(raw_class):
+        if '0_no_damage' in raw_class:
+            return "No Damage", 0
+        elif '2_major_damage' in raw_class:
+            return "Major Damage", 2
+        return "Destroyed", 3
+
+    def predict(self, image_path: str, gradcam: bool = True) -> dict:
+        with self._lock:
+            return self._predict(image_path, gradcam)
+
+    def _predict(self, image_path: str, gradcam: bool = True) -> dict:
         # Load image
         pil_image = Image.open(image_path).convert("RGB")
-        cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
 
         # Preprocess
         input_tensor = self.transform(pil_image).unsqueeze(0).to(self.device)
 
-        # Prediction
-        with torch.no_grad():
-            logits = self.model(input_tensor)
-
-        probabilities = F.softmax(logits, dim=1)[0]
-        predicted_idx = probabilities.argmax().item()
-        confidence = probabilities[predicted_idx].item() * 100
-
-        # Map class index to label
-        raw_class = self.class_names[predicted_idx]
-        if '0_no_damage' in raw_class:
-            label = "No Damage"
-            damage_level = 0
-        elif '2_major_damage' in raw_class:
-            label = "Major Damage"
-            damage_level = 2
+        # Prediction; with Grad-CAM the same forward pass also gives the logits
+        heatmap_b64 = None
+        if gradcam:
+            cam = self.gradcam.generate_batch(input_tensor)[0, 0]
+            logits = self.gradcam.logits
+            heatmap_b64 = self._heatmap_b64(pil_image, cam)
         else:
-            label = "Destroyed"
-            damage_level = 3
+            with torch.no_grad():
+                logits = self.model(input_tensor)
 
-        # Grad-CAM
-        input_tensor_grad = self.transform(pil_image).unsqueeze(0).to(self.device)
-        cam = self.gradcam.generate(input_tensor_grad, class_idx=predicted_idx)
+        result = self._result(F.softmax(logits, dim=1)[0].cpu())
+        result["gradcam_heatmap_b64"] = heatmap_b64
+        return result
+
+    def _heatmap_b64(self, pil_image, cam):
+        cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
         overlay = self.gradcam.overlay_on_image(cv_image, cam)
 
         # Encode to base64
         _, buffer = cv2.imencode(".jpg", overlay)
-        heatmap_b64 = base64.b64encode(buffer).decode("utf-8")
-
-        # All probabilities
-        all_probs = {}
-        for i, cls in enumerate(self.class_names):
-            if '0_no_damage' in cls:
-                all_probs["No Damage"] = round(probabilities[i].item() * 100, 2)
-            elif '2_major_damage' in cls:
-                all_probs["Major Damage"] = round(probabilities[i].item() * 100, 2)
-            else:
-                all_probs["Destroyed"] = round(probabilities[i].item() * 100, 2)
+        return base64.b64encode(buffer).decode("utf-8")
 
-        return {
+    def _result(self, probabilities, all_probabilities=True) -> dict:
+        predicted_idx = probabilities.argmax().item()
+        confidence = probabilities[predicted_idx].item() * 100
+
+        # Map class index to label
+        label, damage_level = self._label(self.class_names[predicted_idx])
+        result = {
             "predicted_label": label,
             "damage_level": damage_level,
             "confidence": round(confidence, 2),
             "color": CLASS_COLORS.get(damage_level, "#ffffff"),
-            "all_probabilities": all_probs,
-            "gradcam_heatmap_b64": heatmap_b64,
         }
+        if all_probabilities:
+            result["all_probabilities"] = {
+                self._label(cls)[0]: round(probabilities[i].item() * 100, 2)
+                for i, cls in enumerate(self.class_names)
+            }
+        return result
+
+    def predict_batch(self, image_paths, gradcam: bool = False) -> list:
+        """Classify several images in one forward pass.
+
+        With gradcam=True each result also carries its Grad-CAM overlay,
+        all from that one forward pass and a single backward pass.
+        """
+        pil_images = [Image.open(path).convert("RGB") for path in image_paths]
+        batch = torch.stack([self.transform(image) for image in pil_images]).to(self.device)
+
+        with self._lock:
+            if gradcam:
+                cams = self.gradcam.generate_batch(batch)[:, 0]
+                logits = self.gradcam.logits
+            else:
+                with torch.no_grad():
+                    logits = self.model(batch)
+        probabilities = F.softmax(logits, dim=1).cpu()
+
+        results = [self._result(probs, all_probabilities=False) for probs in probabilities]
+        if gradcam:
+            for result, pil_image, cam in zip(results, pil_images, cams):
+                result["gradcam_heatmap_b64"] = self._heatmap_b64(pil_image, cam)
+        return results
 
 
 # Quick test
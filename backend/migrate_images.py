@@ -0,0 +1,66 @@
+"""
+Move uploads saved under random uuid names into the content-addressed store.
+
+Reports created before image_store.py kept a comma-separated filename list
+in disaster_reports.images. This hashes each of those files, moves it to
+its sharded content path (dropping duplicates), links it through
+report_images and clears the old column. Safe to run more than once.
+Run it with the server stopped: python migrate_images.py
+"""
+
+import os
+import shutil
+import sqlite3
+
+from image_pipeline import file_sha256
+from image_store import content_path, file_extension, link_report_image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'Rescuevision.db')
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+
+
+def migrate_file(c, report_id, filename):
+    src = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.isfile(src):
+        print(f"  missing: {filename}")
+        return False
+
+    ext = file_extension(filename)
+    if ext is None:
+        print(f"  not an image, skipped: {filename}")
+        return False
+
+    sha256 = file_sha256(src)
+    # Content already in the store keeps its stored path, whatever this file's extension
+    _, rel_path = link_report_image(c, report_id, sha256, content_path(sha256, ext), os.path.getsize(src))
+    dst = os.path.join(UPLOAD_FOLDER, rel_path)
+    if os.path.exists(dst):
+        os.remove(src)
+    else:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.move(src, dst)
+    return True
+
+
+conn = sqlite3.connect(DB_PATH)
+c = conn.cursor()
+
+c.execute("SELECT id, images FROM disaster_reports WHERE images IS NOT NULL AND images != ''")
+reports = c.fetchall()
+moved = 0
+for report_id, images in reports:
+    for filename in filter(None, (f.strip() for f in images.split(','))):
+        moved += migrate_file(c, report_id, filename)
+    c.execute("UPDATE disaster_reports SET images = NULL WHERE id = ?", (report_id,))
+    conn.commit()
+
+# Rows written by the first derivative pipeline point at flat uuid files
+c.execute("SELECT id, report_id, filename FROM report_images WHERE filename NOT LIKE '%/%'")
+for row_id, report_id, filename in c.fetchall():
+    c.execute("DELETE FROM report_images WHERE id = ?", (row_id,))
+    moved += migrate_file(c, report_id, filename)
+    conn.commit()
+
+conn.close()
+print(f"✅ Migrated {moved} image(s) from {len(reports)} report(s). Restart server: python api.py")
@@ -0,0 +1,234 @@
+"""
+One place to load, share and swap the backend's models.
+
+Each model is registered by name with a loader ``(path, device) -> model``
+and a predict function ``(model, inputs) -> result``. Nothing is loaded
+until the first prediction (or ``get``). All models share one torch
+device, one intra-op thread setting and one worker pool for background
+predictions (``submit``).
+
+``swap`` loads a new version next to the serving one and replaces it
+atomically; in-flight predictions finish on the old model. ``metrics``
+reports per-model load time, call counts, latency percentiles and the
+memory held by parameters and buffers.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from result_cache import checkpoint_fingerprint
+
+LATENCY_WINDOW = 1000  # most recent calls kept per model for percentiles
+
+
+def default_device():
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def model_memory_bytes(model):
+    """Bytes held by parameters and buffers of a torch module, or of a wrapper's ``.model``"""
+    if isinstance(model, torch.nn.Module):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    inner = getattr(model, 'model', None)
+    return model_memory_bytes(inner) if inner is not None else 0
+
+
+class ModelUnavailable(Exception):
+    """Raised when a registered model has no checkpoint or failed to load."""
+
+
+class _Entry:
+    def __init__(self, name, loader, predict, path, version):
+        self.name = name
+        self.loader = loader
+        self.predict = predict
+        self.path = path
+        self.version = version
+        self.model = None
+        self.fingerprint = None  # hash of the checkpoint the serving model was loaded from
+        self.error = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.loads = 0
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()  # serialises loading/swapping, not predictions
+
+
+class ModelRegistry:
+    def __init__(self, device=None, num_threads=None, max_workers=2):
+        self.device = torch.device(device) if device else default_device()
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model')
+        self._entries = {}
+
+    def register(self, name, loader, predict, path=None, version=None):
+        self._entries[name] = _Entry(name, loader, predict, path, version)
+        return self
+
+    def names(self):
+        return list(self._entries)
+
+    def _entry(self, name):
+        if name not in self._entries:
+            raise KeyError(name)
+        return self._entries[name]
+
+    def path(self, name):
+        """Checkpoint currently registered (or swapped in) for ``name``"""
+        return self._entry(name).path
+
+    def fingerprint(self, name):
+        """Hash of the checkpoint behind the serving model of ``name``.
+
+        Taken when the model is loaded or swapped, so overwriting the file
+        in place does not change it until the next reload. Before the first
+        load it is the hash of the checkpoint that will be loaded.
+        """
+        entry = self._entry(name)
+        if entry.model is not None:
+            return entry.fingerprint
+        return checkpoint_fingerprint(entry.path)
+
+    def available(self, name):
+        """Registered, and either loaded or with a checkpoint on disk that has not failed to load"""
+        entry = self._entries.get(name)
+        if entry is None:
+            return False
+        if entry.model is not None:
+            return True
+        return entry.error is None and (entry.path is None or os.path.exists(entry.path))
+
+    def _load(self, entry, path):
+        if path is not None and not os.path.exists(path):
+            raise ModelUnavailable(f"{entry.name}: checkpoint not found: {path}")
+        fingerprint = checkpoint_fingerprint(path)  # before loading, so it never describes a newer file
+        start = time.perf_counter()
+        model = entry.loader(path, self.device)
+        return model, fingerprint, time.perf_counter() - start
+
+    def get(self, name):
+        """The serving model, loading it on first use"""
+        entry = self._entry(name)
+        model = entry.model
+        if model is not None:
+            return model
+        with entry.lock:
+            if entry.model is None:
+                try:
+                    model, fingerprint, seconds = self._load(entry, entry.path)
+                except ModelUnavailable:
+                    raise
+                except Exception as e:
+                    # Broken checkpoint: stay unavailable until swapped, instead of retrying every request
+                    entry.error = str(e)
+                    raise ModelUnavailable(f"{name}: {e}") from e
+                entry.model, entry.fingerprint, entry.error = model, fingerprint, None
+                entry.loaded_at, entry.load_seconds = time.time(), seconds
+                entry.loads += 1
+                print(f"OK: Model '{name}' loaded in {seconds:.2f}s on {self.device}")
+            return entry.model
+
+    def swap(self, name, path=None, version=None):
+        """Load a new version (default: reload the current checkpoint) and start serving it"""
+        entry = self._entry(name)
+        with entry.lock:
+            path = path or entry.path
+            model, fingerprint, seconds = self._load(entry, path)
+            entry.model, entry.path, entry.error = model, path, None
+            entry.fingerprint = fingerprint
+            entry.version = version if version is not None else entry.version
+            entry.loaded_at, entry.load_seconds = time.time(), seconds
+            entry.loads += 1
+        print(f"OK: Model '{name}' swapped to {os.path.basename(path or '')} (version {entry.version})")
+        return self.describe(name)
+
+    def unload(self, name):
+        entry = self._entry(name)
+        with entry.lock:
+            entry.model = None
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+
+    def predict(self, name, inputs):
+        entry = self._entry(name)
+        model = self.get(name)
+        start = time.perf_counter()
+        try:
+            return entry.predict(model, inputs)
+        except Exception:
+            entry.errors += 1
+            raise
+        finally:
+            entry.calls += 1
+            entry.latencies.append((time.perf_counter() - start) * 1000)
+
+    def submit(self, name, inputs):
+        """Run ``predict`` on the shared worker pool; returns a Future"""
+        return self.pool.submit(self.predict, name, inputs)
+
+    def proxy(self, name):
+        """Object forwarding attribute access to whichever model currently serves ``name``"""
+        return _ModelProxy(self, name)
+
+    def describe(self, name):
+        entry = self._entry(name)
+        latencies = sorted(entry.latencies)
+
+        def percentile(q):
+            return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)], 2) if latencies else None
+
+        # Served by the public /api/models routes: no server directories in the output
+        path = os.path.basename(entry.path) if entry.path else None
+        error = entry.error
+        if error and entry.path:
+            error = error.replace(entry.path, path)
+        return {
+            'name': name,
+            'version': entry.version,
+            'path': path,
+            'loaded': entry.model is not None,
+            'available': self.available(name),
+            'error': error,
+            'device': str(self.device),
+            'loads': entry.loads,
+            'load_seconds': round(entry.load_seconds, 3) if entry.load_seconds is not None else None,
+            'memory_bytes': model_memory_bytes(entry.model) if entry.model is not None else 0,
+            'calls': entry.calls,
+            'errors': entry.errors,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1], 2) if latencies else None,
+            },
+        }
+
+    def metrics(self):
+        models = [self.describe(name) for name in self._entries]
+        return {
+            'device': str(self.device),
+            'torch_threads': torch.get_num_threads(),
+            'memory_bytes': sum(m['memory_bytes'] for m in models),
+            'models': models,
+        }
+
+
+class _ModelProxy:
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __bool__(self):
+        return self._registry.available(self._name)
@@ -0,0 +1,264 @@
+"""
+Socket.IO server construction and cross-process broadcast plumbing.
+
+A single backend process keeps its connected clients in memory, so an
+emit only reaches sockets attached to that process. When the backend is
+scaled out behind a load balancer (with sticky sessions), every worker
+must publish its emits on a shared message queue and replay the ones it
+receives from its peers. ``create_socketio`` picks the queue from the
+``SOCKETIO_MESSAGE_QUEUE`` environment variable:
+
+    unset / empty        single process, no queue (previous behaviour)
+    memory://            in-process bus, for tests and benchmarks
+    redis://host:6379/0  Redis pub/sub (any URL Flask-SocketIO accepts,
+                         e.g. kafka://, zmq+tcp://, amqp://)
+"""
+
+import os
+import pickle
+import queue
+import threading
+
+import socketio
+from flask_socketio import SocketIO
+
+MEMORY_QUEUE_URL = 'memory://'
+DEFAULT_CHANNEL = 'rescuevision'
+
+
+class LocalMessageBus:
+    """In-process stand-in for a pub/sub broker.
+
+    Every subscriber gets its own queue and receives every message that is
+    published on the bus, including its own, exactly like a Redis channel.
+    Messages are pickled on publish so subscribers never share state.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, [])
+            if q in subscribers:
+                subscribers.remove(q)
+
+    def publish(self, channel, message):
+        payload = pickle.dumps(message)
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, []))
+        for q in subscribers:
+            q.put(payload)
+        return len(subscribers)
+
+
+_default_bus = LocalMessageBus()
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Socket.IO client manager backed by a ``LocalMessageBus``.
+
+    Several ``socketio.Server`` instances built on managers sharing one bus
+    behave like several backend workers sharing one Redis channel.
+    """
+
+    name = 'local'
+
+    def __init__(self, bus=None, channel=DEFAULT_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus or _default_bus
+        self._queue = None if write_only else self.bus.subscribe(channel)
+
+    def _publish(self, data):
+        return self.bus.publish(self.channel, data)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+    def close(self):
+        if self._queue is not None:
+            self.bus.unsubscribe(self.channel, self._queue)
+            self._queue = None
+
+
+def create_socketio(app=None, message_queue=None, channel=None, **kwargs):
+    """Build the application's ``SocketIO`` with the configured queue backend."""
+    if message_queue is None:
+        message_queue = os.getenv('SOCKETIO_MESSAGE_QUEUE', '').strip()
+    channel = channel or os.getenv('SOCKETIO_CHANNEL', DEFAULT_CHANNEL)
+
+    if not message_queue:
+        return SocketIO(app, **kwargs)
+
+    if message_queue == MEMORY_QUEUE_URL:
+        manager = LocalPubSubManager(channel=channel, write_only=app is None)
+        print(f"OK: Socket.IO using in-process message bus (channel '{channel}')")
+        return SocketIO(app, client_manager=manager, **kwargs)
+
+    print(f"OK: Socket.IO using message queue {message_queue.split('@')[-1]} (channel '{channel}')")
+    return SocketIO(app, message_queue=message_queue, channel=channel, **kwargs)
+
+
+# --- Room routing -----------------------------------------------------------
+#
+# Clients subscribe to the slice of the event stream they care about and
+# every emit is addressed to the rooms that match the event:
+#
+#   sev:<Level>            national stream, this severity and above
+#   geo:<geohash>          everything inside a geohash cell (precision 1-6)
+#   geo:<geohash>:<Level>  same cell, this severity and above
+#   report:<id>            updates for a single (assigned) report
+#   alert:<geohash>        officer alerts for this cell; a client joins one per
+#                          prefix of each subscribed cell (alert_subscription_rooms)
+#
+# Socket.IO delivers a multi-room emit once per client, so a client that
+# matches several rooms still receives the event once.
+
+SEVERITY_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+SEVERITY_ALIASES = {
+    'low': 'Low', '1': 'Low',
+    'medium': 'Medium', 'moderate': 'Medium', '2': 'Medium',
+    'high': 'High', 'severe': 'High', '3': 'High',
+    'critical': 'Critical', 'extreme': 'Critical', '4': 'Critical', '5': 'Critical',
+}
+GEOHASH_PRECISIONS = range(1, 7)
+
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def normalize_severity(severity, default='Medium'):
+    """Map the labels and 1-5 scores used by the report forms onto SEVERITY_LEVELS."""
+    return SEVERITY_ALIASES.get(str(severity or '').strip().lower(), default)
+
+
+def geohash_encode(latitude, longitude, precision=6):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def _coords(latitude, longitude):
+    try:
+        lat, lon = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def event_rooms(latitude=None, longitude=None, severity=None, report_id=None):
+    """Every room an event about a report with these attributes must reach."""
+    level = normalize_severity(severity)
+    levels = SEVERITY_LEVELS[:SEVERITY_LEVELS.index(level) + 1]
+
+    rooms = [f"sev:{lvl}" for lvl in levels]
+    coords = _coords(latitude, longitude)
+    if coords:
+        cell = geohash_encode(*coords, precision=max(GEOHASH_PRECISIONS))
+        for p in GEOHASH_PRECISIONS:
+            rooms.append(f"geo:{cell[:p]}")
+            rooms.extend(f"geo:{cell[:p]}:{lvl}" for lvl in levels)
+    if report_id is not None:
+        rooms.append(f"report:{report_id}")
+    return rooms
+
+
+def subscription_rooms(data):
+    """Rooms for a client ``subscribe`` payload.
+
+    ``regions`` is a list of geohash prefixes; ``latitude``/``longitude``
+    with an optional ``precision`` (default 4, roughly 40 km) is turned into
+    one. ``min_severity`` filters either the regions or, without regions,
+    the national stream. ``report_ids`` follows individual reports.
+    """
+    data = data or {}
+    min_severity = data.get('min_severity')
+    level = normalize_severity(min_severity, default='Low') if min_severity else None
+
+    regions = [str(r).lower() for r in data.get('regions') or []]
+    coords = _coords(data.get('latitude'), data.get('longitude'))
+    if coords:
+        try:
+            precision = int(data.get('precision', 4))
+        except (TypeError, ValueError):
+            precision = 4
+        precision = min(max(precision, min(GEOHASH_PRECISIONS)), max(GEOHASH_PRECISIONS))
+        regions.append(geohash_encode(*coords, precision=precision))
+
+    rooms = []
+    for region in regions:
+        region = ''.join(ch for ch in region if ch in _GEOHASH_BASE32)[:max(GEOHASH_PRECISIONS)]
+        if region:
+            rooms.append(f"geo:{region}:{level}" if level else f"geo:{region}")
+    if not regions and level:
+        rooms.append(f"sev:{level}")
+    for report_id in data.get('report_ids') or []:
+        try:
+            rooms.append(f"report:{int(report_id)}")
+        except (TypeError, ValueError):
+            continue
+    return rooms
+
+
+def alert_subscription_rooms(rooms):
+    """``alert:`` rooms for a client in these rooms: one per prefix of each subscribed ``geo:`` cell.
+
+    A client in ``geo:abcd`` joins ``alert:a`` ... ``alert:abcd``, so an
+    alert for region ``ab`` (sent to ``alert:ab``) reaches it.
+    """
+    joined = set()
+    for room in rooms:
+        if room.startswith('geo:'):
+            cell = room.split(':')[1]
+            joined.update(f"alert:{cell[:p]}" for p in range(1, len(cell) + 1))
+    return sorted(joined)
+
+
+def alert_rooms(regions=None, latitude=None, longitude=None):
+    """Rooms for an officer alert, or an empty list for a nation-wide alert.
+
+    An alert is delivered to every client whose subscribed cell overlaps the
+    alert's point or one of its ``regions``: cells containing it through the
+    ``geo:`` rooms of its prefixes, finer cells inside it through its
+    ``alert:`` room. National (``sev:``) subscribers receive every alert.
+    Severity filters do not apply to alerts.
+    """
+    cells = [''.join(ch for ch in str(r).lower() if ch in _GEOHASH_BASE32)[:max(GEOHASH_PRECISIONS)]
+             for r in regions or []]
+    coords = _coords(latitude, longitude)
+    if coords:
+        cells.append(geohash_encode(*coords, precision=max(GEOHASH_PRECISIONS)))
+
+    cells = [cell for cell in cells if cell]
+    if not cells:
+        return []
+    rooms = {f"sev:{lvl}" for lvl in SEVERITY_LEVELS}
+    for cell in cells:
+        rooms.add(f"alert:{cell}")
+        for p in range(1, len(cell) + 1):
+            rooms.add(f"geo:{cell[:p]}")
+            rooms.update(f"geo:{cell[:p]}:{lvl}" for lvl in SEVERITY_LEVELS)
+    return sorted(rooms)
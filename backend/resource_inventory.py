@@ -0,0 +1,170 @@
+"""
+Persistent resource inventory for the allocation endpoints.
+
+Stock lives in ``rescueplex.db`` (``RESOURCE_DB_PATH`` in api.py) using the
+same ``resources`` / ``resource_allocation`` / ``damage_assessment`` /
+``users`` layout as the PostgreSQL database in database/connect_db.py, so it
+survives restarts, is shared by every worker process, and the DQN scripts can
+run against it with ``DATABASE_URL=sqlite``.
+
+Every reservation runs inside one ``BEGIN IMMEDIATE`` transaction: SQLite
+grants a single writer at a time, so the stock check and the deductions of
+one request can never interleave with another request's, and either every
+line of a reservation is applied (and written to the ledger) or none is.
+"""
+
+import sqlite3
+import uuid
+from datetime import datetime
+
+BUSY_TIMEOUT_SECONDS = 30
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation asks for more than is in stock."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages  # {resource_name: (requested, available)}
+        detail = ', '.join(f"{name}: requested {req}, available {avail}"
+                           for name, (req, avail) in shortages.items())
+        super().__init__(f"Insufficient stock ({detail})")
+
+
+class ResourceInventory:
+    def __init__(self, db_path, seed=None):
+        self.db_path = db_path
+        self._init_schema(seed or [])
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly below
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_schema(self, seed):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("""CREATE TABLE IF NOT EXISTS resources (
+            resource_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            resource_name TEXT UNIQUE NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0 CHECK (quantity >= 0)
+        )""")
+        c.execute("""CREATE TABLE IF NOT EXISTS resource_allocation (
+            allocation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id TEXT NOT NULL,
+            damage_id INTEGER,
+            resource_id INTEGER NOT NULL REFERENCES resources (resource_id),
+            allocated_quantity INTEGER NOT NULL,
+            tier TEXT,
+            allocation_time TIMESTAMP NOT NULL,
+            user_id INTEGER
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_resource_allocation_request ON resource_allocation (request_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_resource_allocation_time ON resource_allocation (allocation_time)")
+        # Inputs and users of the DQN pipeline (database/connect_db.py with DATABASE_URL=sqlite)
+        c.execute("""CREATE TABLE IF NOT EXISTS damage_assessment (
+            damage_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            building_no_damage INTEGER NOT NULL DEFAULT 0,
+            building_minor_damage INTEGER NOT NULL DEFAULT 0,
+            building_major_damage INTEGER NOT NULL DEFAULT 0,
+            building_total_destruction INTEGER NOT NULL DEFAULT 0
+        )""")
+        c.execute("""CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL
+        )""")
+        # connect_db.log_allocation attributes allocations to user 1 by default
+        c.execute("INSERT OR IGNORE INTO users (user_id, username) VALUES (1, 'system')")
+
+        c.execute("SELECT COUNT(*) FROM resources")
+        if c.fetchone()[0] == 0:
+            c.executemany("INSERT INTO resources (resource_name, quantity) VALUES (?, ?)",
+                          [(r['resource_name'], r['quantity']) for r in seed])
+        c.execute("COMMIT")
+        conn.close()
+
+    def list_resources(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("SELECT resource_name, quantity FROM resources ORDER BY resource_id")
+        rows = c.fetchall()
+        conn.close()
+        return [{"resource_name": r[0], "quantity": r[1]} for r in rows]
+
+    def restock(self, resource_name, quantity):
+        conn = self._connect()
+        conn.execute('''INSERT INTO resources (resource_name, quantity) VALUES (?, ?)
+                        ON CONFLICT(resource_name) DO UPDATE SET quantity = quantity + excluded.quantity''',
+                     (resource_name, int(quantity)))
+        conn.close()
+
+    def reserve(self, plan, damage_id=None, user_id=None):
+        """Atomically reserve stock and record it in the allocation ledger.
+
+        ``plan`` is either a list of ``(tier, {resource_name: quantity})``
+        pairs, or a callable that receives the current stock
+        (``{resource_name: quantity}``) inside the transaction and returns
+        such a list, so the plan is computed against a consistent snapshot.
+        A line may carry a third element, ``(tier, quantities, damage_id)``,
+        to record a different damage_id than the request-wide one.
+        Raises ``InsufficientStock`` (and changes nothing) if any line cannot
+        be covered. Returns ``(request_id, lines, updated_resources)``.
+        """
+        request_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("SELECT resource_id, resource_name, quantity FROM resources ORDER BY resource_id")
+            rows = c.fetchall()
+            ids = {name: rid for rid, name, _ in rows}
+            stock = {name: qty for _, name, qty in rows}
+
+            lines = plan(dict(stock)) if callable(plan) else plan
+            requested = {}
+            for _, quantities, *_ in lines:
+                for name, qty in quantities.items():
+                    requested[name] = requested.get(name, 0) + int(qty)
+
+            shortages = {name: (qty, stock.get(name, 0)) for name, qty in requested.items()
+                         if qty < 0 or qty > stock.get(name, 0)}
+            if shortages:
+                raise InsufficientStock(shortages)
+
+            c.executemany("UPDATE resources SET quantity = quantity - ? WHERE resource_id = ?",
+                          [(qty, ids[name]) for name, qty in requested.items() if qty])
+            c.executemany('''INSERT INTO resource_allocation
+                             (request_id, damage_id, resource_id, allocated_quantity, tier, allocation_time, user_id)
+                             VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                          [(request_id, line_damage[0] if line_damage else damage_id, ids[name], int(qty),
+                            tier, now, user_id)
+                           for tier, quantities, *line_damage in lines for name, qty in quantities.items() if qty])
+            c.execute("COMMIT")
+
+            for name, qty in requested.items():
+                stock[name] -= qty
+            updated = [{"resource_name": name, "quantity": stock[name]} for _, name, _ in rows]
+            return request_id, lines, updated
+        except BaseException:
+            if conn.in_transaction:
+                c.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def ledger(self, request_id=None, limit=100):
+        conn = self._connect()
+        c = conn.cursor()
+        query = '''SELECT ra.allocation_id, ra.request_id, ra.damage_id, r.resource_name, ra.allocated_quantity,
+                          ra.tier, ra.allocation_time
+                   FROM resource_allocation ra JOIN resources r ON r.resource_id = ra.resource_id'''
+        if request_id:
+            c.execute(query + " WHERE ra.request_id = ? ORDER BY ra.allocation_id", (request_id,))
+        else:
+            c.execute(query + " ORDER BY ra.allocation_id DESC LIMIT ?", (int(limit),))
+        rows = c.fetchall()
+        conn.close()
+        return [{"allocation_id": r[0], "request_id": r[1], "damage_id": r[2], "resource_name": r[3],
+                 "allocated_quantity": r[4], "tier": r[5], "allocation_time": r[6]} for r in rows]
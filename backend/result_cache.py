@@ -0,0 +1,226 @@
+"""
+Cache of damage-assessment results for images that were already assessed.
+
+Results are keyed by the SHA-256 of the image bytes plus a variant string
+(e.g. whether Grad-CAM was asked for). Re-uploads and forwards of the
+same file therefore cost one hash and one dict lookup. With
+``near_distance`` > 0, an exact miss also tries a 64-bit difference hash
+(dHash) of the decoded image. An entry within that many differing bits
+counts as a hit, which catches re-encoded or resized copies.
+
+The in-memory tier is an LRU bounded by the JSON size of its results. An
+optional SQLite file (``disk_path``) keeps evicted and older results
+across restarts. Every entry records the fingerprint of the model that
+produced it. When ``fingerprint()`` changes (the checkpoint was retrained
+or hot-swapped), entries from the previous model are dropped.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+RESULT_CACHE_MB = float(os.getenv('RESULT_CACHE_MB', 64))
+RESULT_CACHE_DB = os.getenv('RESULT_CACHE_DB', '')  # empty: memory only
+RESULT_CACHE_NEAR_DISTANCE = int(os.getenv('RESULT_CACHE_NEAR_DISTANCE', 0))  # 0: exact matches only
+CHUNK_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dhash(path, size=8):
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    with Image.open(path) as image:
+        image.draft('L', (size * 4, size * 4))  # JPEG: decode at reduced scale
+        pixels = list(image.convert('L').resize((size + 1, size), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            i = row * (size + 1) + col
+            bits = (bits << 1) | (pixels[i] > pixels[i + 1])
+    return bits
+
+
+_fingerprints = {}
+
+
+def checkpoint_fingerprint(path):
+    """SHA-256 of a checkpoint file, recomputed only when its size or mtime changes"""
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != key:
+        cached = _fingerprints[path] = (key, file_sha256(path))
+    return cached[1]
+
+
+class ResultCache:
+    def __init__(self, fingerprint, max_mb=RESULT_CACHE_MB, disk_path=RESULT_CACHE_DB,
+                 near_distance=RESULT_CACHE_NEAR_DISTANCE):
+        self.fingerprint = fingerprint  # () -> str identifying the model(s) behind the results
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.disk_path = disk_path or None
+        self.near_distance = near_distance
+        self._entries = OrderedDict()  # (sha256, variant) -> (result, dhash, size)
+        self._bytes = 0
+        self._model = None
+        self._miss_hashes = OrderedDict()  # sha256 -> dhash computed by a missed get, reused by put
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0, 'near': 0}
+        self.misses = 0
+        self.invalidations = 0
+        if self.disk_path:
+            self._init_disk()
+
+    def _connect(self):
+        return sqlite3.connect(self.disk_path, timeout=5)
+
+    def _init_disk(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS assessment_cache (
+                sha256 TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dhash TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (sha256, variant)
+            )''')
+
+    def _check_model(self):
+        """Drop everything produced by a previous model. Call with the lock held."""
+        current = self.fingerprint()
+        if current == self._model:
+            return current
+        if self._model is not None:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+            print(f"OK: Result cache invalidated (model fingerprint {str(current)[:12]})")
+        if self.disk_path:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM assessment_cache WHERE model != ?', (str(current),))
+        self._model = current
+        return current
+
+    def _remember(self, key, result, image_hash):
+        size = len(json.dumps(result))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (result, image_hash, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _near(self, image_hash, variant):
+        best, best_distance = None, self.near_distance + 1
+        for (_, entry_variant), (result, entry_hash, _) in self._entries.items():
+            if entry_variant == variant and entry_hash is not None:
+                distance = bin(entry_hash ^ image_hash).count('1')
+                if distance < best_distance:
+                    best, best_distance = result, distance
+        return best
+
+    def get(self, sha256, variant='', image_path=None):
+        """``(result, tier)`` for a cached image, or ``(None, None)``.
+
+        ``image_path`` is only read (for the dHash) when the exact lookup
+        misses and near-duplicate matching is enabled.
+        """
+        key = (sha256, variant)
+        with self._lock:
+            model = self._check_model()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits['memory'] += 1
+                return dict(entry[0]), 'memory'
+
+        if self.disk_path:
+            with self._connect() as conn:
+                row = conn.execute('SELECT result, dhash FROM assessment_cache WHERE sha256 = ? AND variant = ? '
+                                   'AND model = ?', (sha256, variant, str(model))).fetchone()
+            if row is not None:
+                result = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, result, int(row[1], 16) if row[1] else None)
+                    self.hits['disk'] += 1
+                return dict(result), 'disk'
+
+        if self.near_distance and image_path:
+            image_hash = dhash(image_path)
+            with self._lock:
+                result = self._near(image_hash, variant)
+                if result is not None:
+                    self.hits['near'] += 1
+                    return dict(result), 'near'
+                self._miss_hashes[sha256] = image_hash
+                if len(self._miss_hashes) > 256:
+                    self._miss_hashes.popitem(last=False)
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def put(self, sha256, result, variant='', image_path=None, model=None):
+        """Store a result. ``model`` is the fingerprint read before computing it; if the
+        model has changed since, the result is dropped instead of cached under the new one."""
+        with self._lock:
+            image_hash = self._miss_hashes.pop(sha256, None)
+        if image_hash is None and self.near_distance and image_path:
+            image_hash = dhash(image_path)
+        with self._lock:
+            current = self._check_model()
+            if model is not None and str(model) != str(current):
+                return
+            model = current
+            self._remember((sha256, variant), result, image_hash)
+        if self.disk_path:
+            with self._connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO assessment_cache (sha256, variant, model, dhash, result, '
+                             'created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                             (sha256, variant, str(model), None if image_hash is None else f'{image_hash:016x}',
+                              json.dumps(result), time.time()))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.disk_path:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM assessment_cache')
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self.hits.values()) + self.misses
+            return {
+                'entries': len(self._entries),
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk': self.disk_path is not None,
+                'near_distance': self.near_distance,
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'hit_rate': round(sum(self.hits.values()) / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations,
+                'model': self._model[:12] if self._model else None,
+            }
@@ -1,6 +1,25 @@
-import sys
+"""
+Train the DQN resource allocator (dqn_model.h5 + scaler_X.pkl / scaler_Y.pkl).
+
+Damage rows are streamed from the database in chunks (connect_db.iter_damage_data)
+through a tf.data pipeline, so the table never has to fit in memory. Every
+--val-every-th damage_id is held out for validation; training stops early
+once validation loss stops improving and dqn_model.h5 holds the best epoch.
+Per-epoch loss and wall-clock time go to dqn_training_log.csv and a JSON run
+report (dqn_training_report.json).
+
+    python train_dqn.py --batch-size 256 --patience 25 --threads 8
+"""
+
+import argparse
+import json
 import os
+import sys
+import time
+from datetime import datetime
+
 import numpy as np
+import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense
 from tensorflow.keras.optimizers import Adam
@@ -10,65 +29,173 @@ from joblib import dump  # Correctly save/load scalers
 # Add project root to path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from database.connect_db import fetch_damage_data, fetch_resource_data
-
-# 1️⃣ Fetch Data from Database
-print("Fetching data from the database...")
-damage_data = fetch_damage_data()  # Input: Damage categories per location
-resource_data = fetch_resource_data()  # Output: Available resource quantities
-
-# 2️⃣ Ensure Data Shapes Match
-print("Preparing training data...")
+from database.connect_db import DEFAULT_CHUNKSIZE, fetch_resource_data, iter_damage_data
 
-num_samples = len(damage_data)  # Number of damage reports
-num_resources = len(resource_data)  # Number of resource types
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURES = ['building_no_damage', 'building_minor_damage', 'building_major_damage', 'building_total_destruction']
 
-X_train = damage_data.values  # Shape: (num_samples, 4)
 
-# **Ensure y_train has correct shape**
-# Repeat resource quantities for each damage sample to match training size
-y_train = np.tile(resource_data['quantity'].values, (num_samples, 1))  # Shape: (num_samples, num_resources)
-
-# 3️⃣ Scale the Inputs & Outputs
-scaler_X = MinMaxScaler()
-scaler_y = MinMaxScaler()
-
-X_train_scaled = scaler_X.fit_transform(X_train)
-y_train_scaled = scaler_y.fit_transform(y_train)
-
-print(f"Scaled X_train shape: {X_train_scaled.shape}")  # Should be (num_samples, 4)
-print(f"Scaled y_train shape: {y_train_scaled.shape}")  # Should be (num_samples, num_resources)
-
-# 4️⃣ Define the Improved DQN Model
-def create_dqn_model(input_dim, output_dim):
+# 1️⃣ Define the Improved DQN Model
+def create_dqn_model(input_dim, output_dim, learning_rate=0.001):
     model = Sequential([
-        Dense(256, activation='relu', input_shape=(input_dim,)),  
+        Dense(256, activation='relu', input_shape=(input_dim,)),
         Dense(256, activation='relu'),
         Dense(128, activation='relu'),
         Dense(64, activation='relu'),
         Dense(output_dim, activation='linear')  # Output layer matches resource count
     ])
-    model.compile(optimizer=Adam(learning_rate=0.001), loss='mse')  # Mean Squared Error loss
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='mse')  # Mean Squared Error loss
     return model
 
-# 5️⃣ Initialize & Summarize Model
-print("Creating the improved model...")
-input_dim = X_train_scaled.shape[1]  # Number of damage categories (4)
-output_dim = y_train_scaled.shape[1]  # Number of resources to allocate
-model = create_dqn_model(input_dim, output_dim)
-model.summary()
-
-# 6️⃣ Train the Model
-print("Training the model...")
-model.fit(X_train_scaled, y_train_scaled, epochs=500, batch_size=16, verbose=1)
-
-# 7️⃣ Save the Trained Model & Scalers
-print("Saving the trained model and scalers...")
-model.save('dqn_model.h5')
-
-# Save scalers using `joblib` (recommended)
-dump(scaler_X, "scaler_X.pkl")
-dump(scaler_y, "scaler_Y.pkl")
 
-print("Model trained and saved as 'dqn_model.h5'")
-print("Scalers saved as 'scaler_X.pkl' and 'scaler_Y.pkl'")
+def is_validation(damage_ids, val_every):
+    """Deterministic hold-out by damage_id, so the split is stable across epochs and runs."""
+    return (damage_ids % val_every == 0) if val_every > 1 else np.zeros(len(damage_ids), dtype=bool)
+
+
+def fit_scalers(y_row, chunksize):
+    """One streaming pass: MinMax scaler over all damage rows and the row count per split."""
+    scaler_X = MinMaxScaler()
+    scaler_y = MinMaxScaler()
+    # Target is the current stock vector for every sample (as before), so its range is that one row
+    scaler_y.fit(np.vstack([y_row, y_row]))
+    rows = 0
+    for chunk in iter_damage_data(chunksize):
+        if len(chunk):
+            scaler_X.partial_fit(chunk[FEATURES].to_numpy(np.float32))
+            rows += len(chunk)
+    return scaler_X, scaler_y, rows
+
+
+def make_dataset(scaler_X, y_scaled, chunksize, val_every, validation, batch_size, shuffle_buffer):
+    def chunks():
+        for chunk in iter_damage_data(chunksize):
+            mask = is_validation(chunk['damage_id'].to_numpy(), val_every)
+            if not validation:
+                mask = ~mask
+            if mask.any():
+                x = scaler_X.transform(chunk[FEATURES].to_numpy(np.float32)[mask]).astype(np.float32)
+                yield x, np.broadcast_to(y_scaled, (len(x), y_scaled.shape[0])).astype(np.float32)
+
+    dataset = tf.data.Dataset.from_generator(chunks, output_signature=(
+        tf.TensorSpec(shape=(None, len(FEATURES)), dtype=tf.float32),
+        tf.TensorSpec(shape=(None, y_scaled.shape[0]), dtype=tf.float32),
+    )).unbatch()
+    if not validation:
+        dataset = dataset.shuffle(shuffle_buffer)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Collects loss and wall-clock seconds per epoch for the run report."""
+
+    def __init__(self):
+        super().__init__()
+        self.epochs = []
+        self._start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        self.epochs.append({
+            'epoch': epoch + 1,
+            'seconds': round(time.perf_counter() - self._start, 3),
+            'loss': float(logs.get('loss', np.nan)),
+            'val_loss': float(logs['val_loss']) if 'val_loss' in logs else None,
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--epochs', type=int, default=500, help='upper bound; early stopping usually ends sooner')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=0.001)
+    parser.add_argument('--patience', type=int, default=25, help='epochs without val_loss improvement')
+    parser.add_argument('--val-every', type=int, default=10, help='hold out every n-th damage_id (1 = no validation)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows per database fetch')
+    parser.add_argument('--shuffle-buffer', type=int, default=10000)
+    parser.add_argument('--threads', type=int, default=0, help='intra-op CPU threads (0 = all cores)')
+    parser.add_argument('--inter-op-threads', type=int, default=0)
+    parser.add_argument('--output-dir', default=BASE_DIR)
+    args = parser.parse_args()
+
+    # 2️⃣ CPU threading (must be set before TensorFlow runs any op)
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(args.inter_op_threads)
+
+    # 3️⃣ Fetch resources and fit the scalers in one streaming pass
+    print("Fetching data from the database...")
+    resource_data = fetch_resource_data()  # Output: Available resource quantities
+    if resource_data is None or resource_data.empty:
+        print("No resource data found in the database.")
+        sys.exit(1)
+    y_row = resource_data['quantity'].to_numpy(np.float32)
+    scaler_X, scaler_y, num_samples = fit_scalers(y_row, args.chunksize)
+    if num_samples == 0:
+        print("No damage data found in the database.")
+        sys.exit(1)
+    y_scaled = scaler_y.transform(y_row[None, :])[0]
+
+    val_every = args.val_every if num_samples >= 2 * args.val_every else 1  # too few rows to hold any out
+    train_ds = make_dataset(scaler_X, y_scaled, args.chunksize, val_every, False, args.batch_size, args.shuffle_buffer)
+    val_ds = make_dataset(scaler_X, y_scaled, args.chunksize, val_every, True, args.batch_size, 0) \
+        if val_every > 1 else None
+    monitor = 'val_loss' if val_ds is not None else 'loss'
+    print(f"Training on {num_samples} damage rows x {len(y_row)} resources (monitoring {monitor})")
+
+    # 4️⃣ Initialize & Summarize Model
+    print("Creating the improved model...")
+    model = create_dqn_model(len(FEATURES), len(y_row), args.learning_rate)
+    model.summary()
+
+    # 5️⃣ Train with early stopping; the checkpoint always holds the best epoch
+    model_path = os.path.join(args.output_dir, 'dqn_model.h5')
+    log_path = os.path.join(args.output_dir, 'dqn_training_log.csv')
+    report_path = os.path.join(args.output_dir, 'dqn_training_report.json')
+    timer = EpochTimer()
+    callbacks = [
+        tf.keras.callbacks.EarlyStopping(monitor=monitor, patience=args.patience, restore_best_weights=True),
+        tf.keras.callbacks.ModelCheckpoint(model_path, monitor=monitor, save_best_only=True),
+        tf.keras.callbacks.CSVLogger(log_path),
+        timer,
+    ]
+    print("Training the model...")
+    started = time.perf_counter()
+    model.fit(train_ds, validation_data=val_ds, epochs=args.epochs, callbacks=callbacks, verbose=2)
+    wall_clock = time.perf_counter() - started
+
+    # 6️⃣ Save the Scalers (the best model is already on disk)
+    print("Saving the scalers...")
+    dump(scaler_X, os.path.join(args.output_dir, "scaler_X.pkl"))
+    dump(scaler_y, os.path.join(args.output_dir, "scaler_Y.pkl"))
+
+    # 7️⃣ Run Report
+    best = min(timer.epochs, key=lambda e: e['val_loss'] if e['val_loss'] is not None else e['loss'])
+    report = {
+        'finished_at': datetime.now().isoformat(),
+        'wall_clock_seconds': round(wall_clock, 2),
+        'samples': num_samples,
+        'resources': resource_data['resource_name'].tolist(),
+        'config': vars(args),
+        'epochs_run': len(timer.epochs),
+        'best_epoch': best['epoch'],
+        'best_loss': best['val_loss'] if best['val_loss'] is not None else best['loss'],
+        'epochs': timer.epochs,
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'epoch':>5} {'seconds':>8} {'loss':>12} {'val_loss':>12}")
+    for e in timer.epochs:
+        val = f"{e['val_loss']:.6f}" if e['val_loss'] is not None else '-'
+        print(f"{e['epoch']:>5} {e['seconds']:>8.2f} {e['loss']:>12.6f} {val:>12}")
+    print(f"\nWall-clock: {wall_clock:.1f}s over {len(timer.epochs)} epochs; best epoch {best['epoch']}")
+    print(f"Model saved as '{model_path}' (best epoch)")
+    print("Scalers saved as 'scaler_X.pkl' and 'scaler_Y.pkl'")
+    print(f"Run report: {report_path} (per-epoch CSV: {log_path})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Data loading for train_classifier.py.
+
+Decoding full-size JPEGs is what a CPU trainer spends most of its time
+on, so there are two sources of identical 224x224 uint8 CHW tensors:
+
+- ``ImageFolder`` with Resize + PILToTensor: decodes every epoch.
+- ``CachedImageDataset``: a one-off pass (``build_cache``) decodes and
+  resizes every image into a memory-mapped ``images.u8.npy`` array
+  (N x 3 x 224 x 224). After that an epoch is page-cache reads and no
+  decoding.
+
+Both return uint8, which is four times less data through the worker
+queues. ``to_float`` scales a batch to [0, 1] on the training device.
+``make_loader`` sets up worker processes, persistent workers, prefetching
+and pinned memory.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+from PIL import ImageFile
+from torch.utils.data import DataLoader, Dataset
+from torchvision import datasets, transforms
+
+# Fix for corrupted/truncated images
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+IMAGE_SIZE = 224
+CACHE_IMAGES = 'images.u8.npy'
+CACHE_META = 'meta.json'
+
+
+def folder_transform(size=IMAGE_SIZE):
+    return transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.PILToTensor(),
+    ])
+
+
+def image_folder(root, size=IMAGE_SIZE):
+    """Decode-every-epoch dataset of uint8 (3, size, size) tensors"""
+    return datasets.ImageFolder(root, transform=folder_transform(size))
+
+
+def folder_fingerprint(folder):
+    """Hash of every file path, size and mtime, so the cache is rebuilt when the dataset changes"""
+    digest = hashlib.sha1()
+    for path, _ in folder.samples:
+        stat = os.stat(path)
+        digest.update(f"{os.path.relpath(path, folder.root)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def build_cache(root, cache_dir, size=IMAGE_SIZE, num_workers=0, force=False):
+    """Decode and resize every image under ``root`` once into ``cache_dir``; returns the cache dir.
+
+    Reuses an existing cache whose fingerprint still matches the folder.
+    """
+    folder = image_folder(root, size)
+    fingerprint = folder_fingerprint(folder)
+    meta_path = os.path.join(cache_dir, CACHE_META)
+    if not force and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('fingerprint') == fingerprint and meta.get('size') == size:
+            return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Invalidate first: an interrupted rebuild must not leave the old meta.json vouching for it
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    count = len(folder)
+    images = np.lib.format.open_memmap(os.path.join(cache_dir, CACHE_IMAGES), mode='w+',
+                                       dtype=np.uint8, shape=(count, 3, size, size))
+    labels = np.asarray(folder.targets, dtype=np.int64)
+    print(f"Caching {count} images from {root} at {size}x{size} ...")
+    loader = DataLoader(folder, batch_size=64, shuffle=False, num_workers=num_workers)
+    start = 0
+    for batch, _ in loader:
+        images[start:start + len(batch)] = batch.numpy()
+        start += len(batch)
+    images.flush()
+    del images
+    np.save(os.path.join(cache_dir, 'labels.npy'), labels)
+    # Written last: a cache without meta.json is treated as incomplete
+    with open(meta_path, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'size': size, 'count': count, 'classes': folder.classes}, f)
+    print(f"OK: Cached {count} images ({count * 3 * size * size / 1e6:.0f} MB) in {cache_dir}")
+    return cache_dir
+
+
+class CachedImageDataset(Dataset):
+    """uint8 (3, size, size) tensors from a ``build_cache`` directory"""
+
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, CACHE_META)) as f:
+            meta = json.load(f)
+        self.cache_dir = cache_dir
+        self.classes = meta['classes']
+        self.targets = np.load(os.path.join(cache_dir, 'labels.npy'))
+        self._images = None  # opened per process: memmaps do not survive pickling to workers
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.cache_dir, CACHE_IMAGES), mmap_mode='r')
+        return self._images
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        return torch.from_numpy(np.array(self.images[index])), int(self.targets[index])
+
+    def __getstate__(self):
+        return dict(self.__dict__, _images=None)
+
+
+def classifier_dataset(root, cache_dir=None, size=IMAGE_SIZE, num_workers=0):
+    """Cached dataset when ``cache_dir`` is given (building it if needed), else decode-every-epoch"""
+    if cache_dir:
+        return CachedImageDataset(build_cache(root, cache_dir, size, num_workers=num_workers))
+    return image_folder(root, size)
+
+
+def make_loader(dataset, batch_size=32, shuffle=False, num_workers=0, persistent_workers=True,
+                prefetch_factor=2, pin_memory=None):
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    options = {}
+    if num_workers:
+        # Persistent workers keep their open files/memmaps and skip process start-up every epoch
+        options = {'persistent_workers': persistent_workers, 'prefetch_factor': prefetch_factor}
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                      pin_memory=pin_memory, **options)
+
+
+def to_float(images, device):
+    """uint8 batch -> float in [0, 1] on ``device`` (the same values transforms.ToTensor gives)"""
+    return images.to(device, non_blocking=True).float().div_(255)
@@ -1,75 +1,120 @@
+"""
+Train the ResNet-18 classifier on an ImageFolder split (<data>/train, <data>/val).
+
+Speed options for CPU training:
+- --precision bf16: bfloat16 autocast for the forward pass (and fp16 with
+  loss scaling on CUDA).
+- --channels-last: NHWC memory format, which oneDNN convolutions prefer.
+- --accumulate N: gradient accumulation, stepping once every N batches for
+  an effective batch of N x --batch-size.
+- --cache-dir: the memory-mapped image cache (training/classifier_data.py).
+
+The checkpoint at --output (by default a new
+models/classifier_<timestamp>.pth) holds the epoch with the best
+validation accuracy. Writing to the served models/disaster_classifier.pth
+is refused unless the classes match the ones utils/predict_disaster.py
+serves. Per-epoch loss, accuracy and images/s go to
+<checkpoint>_training_log.csv and a JSON run report
+(<checkpoint>_training_report.json), next to the checkpoint.
+
+    python training/train_classifier.py --precision bf16 --channels-last --accumulate 4 --cache-dir /tmp/cls224
+"""
+
 import sys
 import os
+import argparse
+import csv
+import json
+import time
+from contextlib import nullcontext
+from datetime import datetime
 
 # Add backend folder to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader
-from torchvision import datasets, transforms, models
-from PIL import ImageFile
+from torchvision import models
+from tqdm import tqdm
 
-# Fix for corrupted/truncated images
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+from training.classifier_data import classifier_dataset, make_loader, to_float
+from utils.predict_disaster import class_names as served_classes
 
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 # ---------------- PATH ----------------
-DATASET_PATH = rDATASET_PATH = r"C:\Users\RESHMA VARGHESE\.cache\kagglehub\datasets\sarthaktandulje\disaster-damage-5class\versions\2\disaster_dataset\disaster_dataset"
-
-train_dir = DATASET_PATH
-test_dir = DATASET_PATH   # using same data (no separate split)
-
-# ---------------- TRANSFORMS ----------------
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-])
-
-# ---------------- DATA LOADERS ----------------
-train_dataset = datasets.ImageFolder(train_dir, transform=transform)
-test_dataset = datasets.ImageFolder(test_dir, transform=transform)
-
-train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False)
-
-class_names = train_dataset.classes
-print("Classes:", class_names)
-
-# ---------------- MODEL ----------------
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-model = models.resnet18(pretrained=True)
-model.fc = nn.Linear(model.fc.in_features, len(class_names))
-model = model.to(device)
-
-criterion = nn.CrossEntropyLoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
-
-# ---------------- TRAINING LOOP ----------------
-from tqdm import tqdm
-
-epochs = 5
-
-for epoch in range(epochs):
+DATASET_PATH = os.path.join(BACKEND_DIR, 'dataset')  # train/ and val/ ImageFolders
+MODEL_PATH = os.path.join(BACKEND_DIR, 'models', 'disaster_classifier.pth')  # served as the 'disaster' model
+OUTPUT_PATH = os.path.join(BACKEND_DIR, 'models', f"classifier_{datetime.now():%Y%m%d_%H%M%S}.pth")
+LOG_FIELDS = ['epoch', 'train_loss', 'train_accuracy', 'val_loss', 'val_accuracy',
+              'train_images_per_second', 'val_images_per_second', 'epoch_seconds']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DATASET_PATH, help='folder with train/ and val/ ImageFolders')
+    parser.add_argument('--cache-dir', help='decode images once into memory-mapped 224x224 uint8 caches here')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--accumulate', type=int, default=1, help='batches per optimizer step')
+    parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--precision', choices=['fp32', 'bf16', 'fp16'], default='fp32',
+                        help='autocast dtype (fp16 needs CUDA)')
+    parser.add_argument('--channels-last', action='store_true', help='NHWC memory format for model and inputs')
+    parser.add_argument('--no-pretrained', action='store_true', help='start from random instead of ImageNet weights')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='DataLoader worker processes (0 = load in the training process)')
+    parser.add_argument('--prefetch', type=int, default=2, help='batches prefetched per worker')
+    parser.add_argument('--no-persistent-workers', action='store_true',
+                        help='restart the workers every epoch')
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 = default)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+    if args.accumulate < 1:
+        parser.error('--accumulate must be at least 1')
+    return args
+
+
+def autocast_context(device, precision):
+    if precision == 'fp32':
+        return nullcontext()
+    dtype = torch.bfloat16 if precision == 'bf16' else torch.float16
+    return torch.autocast(device_type=device.type, dtype=dtype)
+
+
+def prepare(images, device, channels_last):
+    images = to_float(images, device)
+    return images.contiguous(memory_format=torch.channels_last) if channels_last else images
+
+
+def train_epoch(model, loader, criterion, optimizer, scaler, device, args, desc):
     model.train()
     running_loss = 0.0
     correct = 0
     total = 0
+    batches = len(loader)
+    start = time.perf_counter()
 
-    loop = tqdm(train_loader, desc=f"Epoch [{epoch+1}/{epochs}]")
-
-    for images, labels in loop:
-        images, labels = images.to(device), labels.to(device)
+    optimizer.zero_grad(set_to_none=True)
+    loop = tqdm(loader, desc=desc)
+    for i, (images, labels) in enumerate(loop):
+        images, labels = prepare(images, device, args.channels_last), labels.to(device)
 
-        outputs = model(images)
-        loss = criterion(outputs, labels)
+        with autocast_context(device, args.precision):
+            outputs = model(images)
+            loss = criterion(outputs.float(), labels)
 
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
+        # Average over the batches of this step (the last step of an epoch may have fewer)
+        group_start = i - i % args.accumulate
+        group_size = min(args.accumulate, batches - group_start)
+        scaler.scale(loss / group_size).backward()
+        if i + 1 == group_start + group_size:
+            scaler.step(optimizer)
+            scaler.update()
+            optimizer.zero_grad(set_to_none=True)
 
-        running_loss += loss.item()
+        running_loss += loss.item() * labels.size(0)
 
         # Calculate accuracy
         _, predicted = torch.max(outputs, 1)
@@ -81,13 +126,125 @@ for epoch in range(epochs):
             accuracy=100 * correct / total
         )
 
-    epoch_loss = running_loss / len(train_loader)
-    epoch_acc = 100 * correct / total
+    return running_loss / total, 100 * correct / total, total / (time.perf_counter() - start)
 
-    print(f"\nEpoch [{epoch+1}/{epochs}] Completed | Loss: {epoch_loss:.4f} | Accuracy: {epoch_acc:.2f}%")
 
-# ---------------- SAVE MODEL ----------------
-os.makedirs("../models", exist_ok=True)
-torch.save(model.state_dict(), "../models/disaster_classifier.pth")
-
-print("✅ Model saved at backend/models/disaster_classifier.pth")
\ No newline at end of file
+def evaluate(model, loader, criterion, device, args):
+    model.eval()
+    running_loss = 0.0
+    correct = 0
+    total = 0
+    start = time.perf_counter()
+    with torch.no_grad():
+        for images, labels in loader:
+            images, labels = prepare(images, device, args.channels_last), labels.to(device)
+            with autocast_context(device, args.precision):
+                outputs = model(images)
+            running_loss += criterion(outputs.float(), labels).item() * labels.size(0)
+            correct += (outputs.argmax(1) == labels).sum().item()
+            total += labels.size(0)
+    return running_loss / total, 100 * correct / total, total / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(args.seed)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # ---------------- DEVICE ----------------
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if args.precision == 'fp16' and device.type != 'cuda':
+        sys.exit("ERROR: --precision fp16 needs CUDA; use bf16 on CPU")
+
+    # ---------------- DATA LOADERS ----------------
+    loaders = {}
+    for split in ('train', 'val'):
+        cache_dir = os.path.join(args.cache_dir, split) if args.cache_dir else None
+        dataset = classifier_dataset(os.path.join(args.data, split), cache_dir, num_workers=args.workers)
+        loaders[split] = make_loader(dataset, batch_size=args.batch_size, shuffle=split == 'train',
+                                     num_workers=args.workers, persistent_workers=not args.no_persistent_workers,
+                                     prefetch_factor=args.prefetch)
+    class_names = loaders['train'].dataset.classes
+    if loaders['val'].dataset.classes != class_names:
+        sys.exit(f"ERROR: train and val classes differ: {class_names} vs {loaders['val'].dataset.classes}")
+    print("Classes:", class_names)
+    if os.path.realpath(args.output) == os.path.realpath(MODEL_PATH) and class_names != served_classes:
+        sys.exit(f"ERROR: {args.output} is served by utils/predict_disaster.py with classes {served_classes}, "
+                 f"not {class_names}; choose another --output")
+    print(f"Train {len(loaders['train'].dataset)} / val {len(loaders['val'].dataset)} images, "
+          f"{args.precision}, channels_last={args.channels_last}, "
+          f"effective batch {args.batch_size * args.accumulate}, {torch.get_num_threads()} threads on {device}")
+
+    # ---------------- MODEL ----------------
+    model = models.resnet18(pretrained=not args.no_pretrained)
+    model.fc = nn.Linear(model.fc.in_features, len(class_names))
+    model = model.to(device)
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+    # Loss scaling only matters for fp16 (CUDA); disabled it passes values straight through
+    scaler = torch.cuda.amp.GradScaler(enabled=args.precision == 'fp16')
+
+    # ---------------- TRAINING LOOP ----------------
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    # Named after the checkpoint, so every run keeps its own log and report
+    run_name = os.path.splitext(os.path.abspath(args.output))[0]
+    log_path = run_name + '_training_log.csv'
+    report_path = run_name + '_training_report.json'
+    history = []
+    best = None
+    best_acc = -1.0
+    run_start = time.perf_counter()
+
+    with open(log_path, 'w', newline='') as log_file:
+        log = csv.DictWriter(log_file, fieldnames=LOG_FIELDS)
+        log.writeheader()
+        for epoch in range(args.epochs):
+            epoch_start = time.perf_counter()
+            train_loss, train_acc, train_rate = train_epoch(model, loaders['train'], criterion, optimizer, scaler,
+                                                            device, args, f"Epoch [{epoch+1}/{args.epochs}]")
+            val_loss, val_acc, val_rate = evaluate(model, loaders['val'], criterion, device, args)
+            row = dict(zip(LOG_FIELDS, [epoch + 1, round(train_loss, 4), round(train_acc, 2), round(val_loss, 4),
+                                        round(val_acc, 2), round(train_rate, 1), round(val_rate, 1),
+                                        round(time.perf_counter() - epoch_start, 1)]))
+            log.writerow(row)
+            log_file.flush()
+            history.append(row)
+
+            improved = val_acc > best_acc
+            if improved:
+                best, best_acc = row, val_acc
+                # Plain state_dict, as utils/predict_disaster.py loads it
+                torch.save(model.state_dict(), args.output)
+
+            print(f"\nEpoch [{epoch+1}/{args.epochs}] Completed | Loss: {train_loss:.4f} | Accuracy: {train_acc:.2f}% "
+                  f"| Val Loss: {val_loss:.4f} | Val Accuracy: {val_acc:.2f}% "
+                  f"| {train_rate:.1f} train / {val_rate:.1f} val images/s" + (" | saved (best)" if improved else ""))
+
+    # ---------------- REPORT ----------------
+    report = {
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'classes': class_names,
+        'settings': {key: value for key, value in vars(args).items()},
+        'device': str(device),
+        'torch_threads': torch.get_num_threads(),
+        'total_seconds': round(time.perf_counter() - run_start, 1),
+        'best_epoch': best['epoch'] if best else None,
+        'best_val_accuracy': best['val_accuracy'] if best else None,
+        'mean_train_images_per_second': round(sum(r['train_images_per_second'] for r in history)
+                                              / len(history), 1) if history else None,
+        'epochs': history,
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if best:
+        print(f"✅ Best model (epoch {best['epoch']}, val accuracy {best['val_accuracy']:.2f}%) saved at {args.output}")
+    print(f"Run report: {report_path} (per-epoch CSV: {log_path})")
+
+
+if __name__ == '__main__':
+    main()
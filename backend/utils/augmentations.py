@@ -1,4 +1,10 @@
+import math
+
 import albumentations as A
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
 from albumentations.pytorch import ToTensorV2
 
 def get_training_augmentation():
@@ -27,4 +33,187 @@ def get_validation_augmentation():
         A.Resize(512, 512),
         A.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
         ToTensorV2()
-    ])
\ No newline at end of file
+    ])
+
+# ---------------- Batched augmentation ----------------
+# get_training_augmentation runs a dozen albumentations ops per sample in
+# Python. BatchAugmentation applies the same kinds of transforms to a whole
+# (N, 3, H, W) batch of tensors at once:
+#   - the resize, flips, rotation and shift-scale-rotate are folded into one
+#     affine matrix per sample and resampled by a single grid_sample (masks
+#     with nearest-neighbour, so labels stay binary);
+#   - uint8 scaling, brightness/contrast and hue/saturation/value shifts
+#     are folded into one 3x3 colour matrix plus offset per sample (hue is
+#     rotated in YIQ space, an approximation of the HSV shift);
+#   - fog and rain blend precomputed overlays, generated once at start-up
+#     instead of drawn per sample;
+#   - Gaussian or motion blur is one grouped 3x3 convolution.
+# Each op keeps the probability it has in get_training_augmentation.
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# RGB <-> YIQ, for hue rotation and saturation as a linear map
+_RGB_TO_YIQ = torch.tensor([[0.299, 0.587, 0.114],
+                            [0.596, -0.274, -0.322],
+                            [0.211, -0.523, 0.312]])
+_YIQ_TO_RGB = torch.linalg.inv(_RGB_TO_YIQ)
+
+
+def fog_overlays(count, size, coef_range=(0.1, 0.3), generator=None):
+    """(count, 1, size, size) fog opacity: smooth low-frequency noise averaging the fog coefficient"""
+    noise = torch.rand(count, 1, 6, 6, generator=generator)
+    noise = F.interpolate(noise, size=(size, size), mode='bicubic', align_corners=False).clamp_(0, 1)
+    coef = torch.empty(count, 1, 1, 1).uniform_(*coef_range, generator=generator)
+    return (2 * coef * noise).clamp_(0, 1)
+
+
+def rain_overlays(count, size, slant_range=(-10, 10), drop_length=20, drops_per_pixel=1 / 600, seed=None):
+    """(count, 1, size, size) rain streak opacity, drawn like A.RandomRain's drops"""
+    rng = np.random.default_rng(seed)
+    overlays = np.zeros((count, 1, size, size), dtype=np.float32)
+    drops = int(size * size * drops_per_pixel)
+    for k in range(count):
+        slant = int(rng.integers(slant_range[0], slant_range[1] + 1))
+        x = rng.integers(0, size, drops)
+        y = rng.integers(0, size - drop_length, drops)
+        canvas = np.zeros((size, size), dtype=np.float32)
+        for x0, y0 in zip(x.tolist(), y.tolist()):
+            cv2.line(canvas, (x0, y0), (x0 + slant, y0 + drop_length), 1.0, 1)
+        overlays[k, 0] = cv2.blur(canvas, (3, 3))
+    return torch.from_numpy(overlays)
+
+
+class BatchAugmentation:
+    """Batched counterpart of get_training_augmentation for (N, 3, H, W) tensors.
+
+    ``images`` may be uint8 (0-255) or float (0-1); ``masks`` (N, 1, H, W)
+    get the same geometric transform. Returns ImageNet-normalized float
+    images and float masks, resized to ``size`` if they are not already.
+    """
+
+    RAIN_COLOR = 200 / 255
+    RAIN_BRIGHTNESS = 0.7
+
+    def __init__(self, size=512, overlays=16, device='cpu', seed=None):
+        self.size = size
+        self.device = torch.device(device)
+        # Private generator: seeding it never touches the global torch RNG
+        self.generator = torch.Generator()
+        if seed is None:
+            self.generator.seed()
+        else:
+            self.generator.manual_seed(seed)
+        self.fog = fog_overlays(overlays, size, generator=self.generator).to(self.device)
+        self.rain = rain_overlays(overlays, size, seed=seed).to(self.device)
+        self.mean = torch.tensor(IMAGENET_MEAN, device=self.device).view(1, 3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD, device=self.device).view(1, 3, 1, 1)
+
+    def _uniform(self, n, low, high):
+        return torch.empty(n).uniform_(low, high, generator=self.generator)
+
+    def _chance(self, n, p):
+        return torch.rand(n, generator=self.generator) < p
+
+    def _geometry(self, n):
+        """(n, 2, 3) affine_grid matrices (output -> input coordinates)"""
+        hflip = self._chance(n, 0.5)
+        vflip = self._chance(n, 0.3)
+        rotate = self._chance(n, 0.5)
+        ssr = self._chance(n, 0.5)
+
+        angle = torch.where(rotate, self._uniform(n, -30, 30), torch.zeros(n))
+        angle = angle + torch.where(ssr, self._uniform(n, -30, 30), torch.zeros(n))
+        scale = torch.where(ssr, 1 + self._uniform(n, -0.2, 0.2), torch.ones(n))
+        shift = torch.where(ssr[:, None], self._uniform(2 * n, -0.1, 0.1).view(n, 2), torch.zeros(n, 2))
+
+        # affine_grid maps output to input coordinates in [-1, 1]: apply the inverse transform
+        radians = angle * math.pi / 180
+        cos, sin = torch.cos(radians) / scale, torch.sin(radians) / scale
+        theta = torch.zeros(n, 2, 3)
+        theta[:, 0, 0], theta[:, 0, 1] = cos, sin
+        theta[:, 1, 0], theta[:, 1, 1] = -sin, cos
+        theta[:, :, 2] = -2 * shift  # shift is a fraction of the size; the grid spans 2
+        theta[:, 0, :2] *= torch.where(hflip, -1.0, 1.0)[:, None]
+        theta[:, 1, :2] *= torch.where(vflip, -1.0, 1.0)[:, None]
+        return theta
+
+    def _color(self, n):
+        """(n, 3, 3) colour matrices and (n, 3, 1, 1) offsets for brightness/contrast and HSV shifts"""
+        bc = self._chance(n, 0.5)
+        contrast = torch.where(bc, 1 + self._uniform(n, -0.2, 0.2), torch.ones(n))
+        brightness = torch.where(bc, self._uniform(n, -0.2, 0.2), torch.zeros(n))
+
+        hsv = self._chance(n, 0.3)
+        hue = torch.where(hsv, self._uniform(n, -20, 20) * 2 * math.pi / 180, torch.zeros(n))  # OpenCV hue is 0-180
+        saturation = torch.where(hsv, 1 + self._uniform(n, -30, 30) / 100, torch.ones(n))
+        value = torch.where(hsv, self._uniform(n, -20, 20) / 255, torch.zeros(n))
+
+        yiq = torch.zeros(n, 3, 3)
+        yiq[:, 0, 0] = 1
+        yiq[:, 1, 1] = yiq[:, 2, 2] = saturation * torch.cos(hue)
+        yiq[:, 1, 2] = -saturation * torch.sin(hue)
+        yiq[:, 2, 1] = saturation * torch.sin(hue)
+        matrix = contrast[:, None, None] * (_YIQ_TO_RGB @ yiq @ _RGB_TO_YIQ)
+        offset = (brightness + value)[:, None, None, None].expand(n, 3, 1, 1)
+        return matrix, offset
+
+    def _blur_kernels(self, n):
+        """(n, 3, 3) kernels: 3x3 Gaussian or a random-direction motion line"""
+        gaussian = torch.tensor([1.0, 2.0, 1.0])
+        gaussian = torch.outer(gaussian, gaussian) / 16
+        motion = torch.zeros(4, 3, 3)
+        motion[0, 1, :] = motion[1, :, 1] = 1 / 3
+        motion[2] = torch.eye(3) / 3
+        motion[3] = torch.eye(3).flip(1) / 3
+        use_motion = self._chance(n, 0.5)
+        direction = torch.randint(0, 4, (n,), generator=self.generator)
+        return torch.where(use_motion[:, None, None], motion[direction], gaussian)
+
+    def __call__(self, images, masks=None):
+        n = images.shape[0]
+        scale = 1 / 255 if images.dtype == torch.uint8 else 1.0
+        images = images.to(self.device).float()
+        out = (n, 3, self.size, self.size)
+
+        # Geometry and the resize to `size`: one grid_sample over the whole batch (identity where
+        # nothing moves; at ~90% of samples moving, that beats gathering a subset)
+        theta = self._geometry(n)
+        grid = F.affine_grid(theta.to(self.device), out, align_corners=False)
+        images = F.grid_sample(images, grid, mode='bilinear', padding_mode='reflection', align_corners=False)
+        if masks is not None:
+            masks = F.grid_sample(masks.to(self.device).float(), grid, mode='nearest', padding_mode='reflection',
+                                  align_corners=False)
+
+        # Colour, with the uint8 scaling folded in: (3x3 matrix) x pixels + offset
+        matrix, offset = self._color(n)
+        images = torch.bmm((matrix * scale).to(self.device), images.view(n, 3, -1)).view(out)
+        images.add_(offset.to(self.device)).clamp_(0, 1)
+
+        # Weather: blend a random precomputed overlay
+        for overlays, p, color, dim in ((self.fog, 0.2, 1.0, 1.0),
+                                        (self.rain, 0.2, self.RAIN_COLOR, self.RAIN_BRIGHTNESS)):
+            idx = self._chance(n, p).nonzero().flatten()
+            if len(idx):
+                pick = torch.randint(0, len(overlays), (len(idx),), generator=self.generator)
+                alpha = overlays[pick.to(self.device)]
+                idx = idx.to(self.device)
+                images[idx] = images[idx] * dim * (1 - alpha) + color * alpha
+
+        # Blur: grouped 3x3 convolution, one kernel per sample
+        idx = self._chance(n, 0.2).nonzero().flatten()
+        if len(idx):
+            kernels = self._blur_kernels(len(idx)).to(self.device)
+            kernels = kernels.repeat_interleave(3, dim=0).unsqueeze(1)  # (k*3, 1, 3, 3)
+            idx = idx.to(self.device)
+            blurred = F.conv2d(F.pad(images[idx].reshape(1, -1, self.size, self.size), (1, 1, 1, 1), mode='reflect'),
+                               kernels, groups=len(idx) * 3)
+            images[idx] = blurred.view(len(idx), 3, self.size, self.size)
+
+        images.sub_(self.mean).div_(self.std)
+        return images if masks is None else (images, masks)
+
+
+def get_batch_training_augmentation(size=512, device='cpu', seed=None):
+    """Batched strong augmentation for training (see BatchAugmentation)"""
+    return BatchAugmentation(size=size, device=device, seed=seed)
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 class DiceLoss(nn.Module):
     def __init__(self, smooth=1.0):
@@ -40,4 +41,103 @@ class CombinedLoss(nn.Module):
     def forward(self, pred, target):
         focal_loss = self.focal(pred, target)
         dice_loss = self.dice(pred, target)
-        return self.focal_weight * focal_loss + self.dice_weight * dice_loss
\ No newline at end of file
+        return self.focal_weight * focal_loss + self.dice_weight * dice_loss
+
+
+# Dice is computed over these groups of elements, then averaged:
+#   'global'  - one Dice over everything (what DiceLoss does)
+#   'batch'   - one Dice per channel (class), summed over the batch
+#   'sample'  - one Dice per sample and channel
+DICE_MODES = ('global', 'batch', 'sample')
+
+
+def _dice_dims(ndim, mode):
+    """Dimensions an (N, C, ...) tensor is summed over for one Dice per group"""
+    if mode == 'global':
+        return tuple(range(ndim))
+    if mode == 'sample':
+        return tuple(range(2, ndim))
+    return (0,) + tuple(range(2, ndim))
+
+
+class _FocalDiceFunction(torch.autograd.Function):
+    """Focal + Dice on logits with a hand-written backward.
+
+    Only the logits and targets are kept for backward, plus the per-group
+    Dice sums. Sigmoid and BCE are recomputed in backward, rather than
+    autograd keeping every intermediate of the unfused losses alive.
+    Full-size temporaries are reused in place.
+    """
+
+    @staticmethod
+    def forward(ctx, logits, target, alpha, gamma, focal_weight, dice_weight, smooth, dice_mode):
+        x = logits.to(torch.promote_types(logits.dtype, torch.float32))  # bf16/fp16 logits: loss in fp32
+        t = target.to(x.dtype)
+        dims = _dice_dims(x.dim(), dice_mode)
+
+        # BCE from logits, stable for large |x|: max(x, 0) - x t + log(1 + exp(-|x|))
+        bce = F.binary_cross_entropy_with_logits(x, t, reduction='none')
+
+        # Dice sums per group; the sigmoid buffer is then reused for the focal term
+        p = torch.sigmoid(x)
+        union = p.sum(dims, keepdim=True).add_(t.sum(dims, keepdim=True)).add_(smooth)
+        intersection = p.mul_(t).sum(dims, keepdim=True)
+        dice = (2 * intersection + smooth) / union
+
+        # Focal: alpha (1 - pt)^gamma bce with pt = exp(-bce)
+        focal = p.copy_(bce).neg_().exp_().neg_().add_(1).pow_(gamma).mul_(bce)
+        focal_loss = alpha * focal.sum() / x.numel()
+
+        ctx.save_for_backward(logits, target, intersection, union)
+        ctx.params = (alpha, gamma, focal_weight, dice_weight, smooth)
+        return focal_weight * focal_loss + dice_weight * (1 - dice.mean())
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        logits, target, intersection, union = ctx.saved_tensors
+        alpha, gamma, focal_weight, dice_weight, smooth = ctx.params
+        x = logits.to(torch.promote_types(logits.dtype, torch.float32))
+        t = target.to(x.dtype)
+
+        bce = F.binary_cross_entropy_with_logits(x, t, reduction='none')
+        p = torch.sigmoid(x)
+        pt = torch.neg(bce).exp_()
+        one_minus_pt = torch.rsub(pt, 1)
+
+        # d focal / dx = alpha (p - t) (1 - pt)^(gamma - 1) [gamma pt bce + (1 - pt)]
+        grad = pt.mul_(bce).mul_(gamma).add_(one_minus_pt)
+        grad.mul_(one_minus_pt.clamp_(min=1e-12).pow_(gamma - 1))
+        grad.mul_(torch.sub(p, t, out=bce)).mul_(alpha * focal_weight / x.numel())
+
+        # d dice / dx = [(2I + s) / U^2 - 2 t / U] p (1 - p), averaged over the groups
+        scale = dice_weight / intersection.numel()
+        c1 = (2 * intersection + smooth) / union ** 2 * scale
+        c2 = 2 / union * scale
+        dice_grad = torch.mul(t, c2, out=one_minus_pt).neg_().add_(c1)
+        grad.addcmul_(dice_grad, p.mul_(bce.copy_(p).neg_().add_(1)))
+
+        grad.mul_(grad_output)
+        return grad.to(logits.dtype), None, None, None, None, None, None, None
+
+
+class FocalDiceLoss(nn.Module):
+    """Fused focal_weight * FocalLoss + dice_weight * DiceLoss on (N, C, H, W) logits.
+
+    With the defaults and dice_mode='global' this equals CombinedLoss. With
+    C > 1, every channel is its own binary mask (sigmoid per channel).
+    """
+
+    def __init__(self, alpha=0.25, gamma=2.0, focal_weight=0.5, dice_weight=0.5, smooth=1.0, dice_mode='global'):
+        super(FocalDiceLoss, self).__init__()
+        if dice_mode not in DICE_MODES:
+            raise ValueError(f"dice_mode must be one of {DICE_MODES}, got {dice_mode!r}")
+        self.alpha = alpha
+        self.gamma = gamma
+        self.focal_weight = focal_weight
+        self.dice_weight = dice_weight
+        self.smooth = smooth
+        self.dice_mode = dice_mode
+
+    def forward(self, pred, target):
+        return _FocalDiceFunction.apply(pred, target, self.alpha, self.gamma, self.focal_weight,
+                                        self.dice_weight, self.smooth, self.dice_mode)
@@ -1,52 +1,303 @@
+import functools
+import threading
+import time
+
 import torch
 import cv2
 import numpy as np
-import albumentations as A
-from albumentations.pytorch import ToTensorV2
-from .sky_filter import remove_sky_predictions
+from .sky_filter import OPEN_HALO, OPEN_KERNEL, SKY_TOP_FRACTION, SkyFilter, sky_color_mask
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def normalize_batch(images, device):
+    """(N, H, W, 3) uint8 RGB -> normalized (N, 3, H, W) float tensor, same as A.Normalize + ToTensorV2"""
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+    batch = torch.from_numpy(np.ascontiguousarray(images)).to(device)
+    return (batch.permute(0, 3, 1, 2).float() / 255.0 - mean) / std
 
-def load_model(model_path, model_class, device='cuda'):
+
+def default_device():
+    """CUDA when available, else CPU (our inference nodes are CPU-only)"""
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def load_model(model_path, model_class, device=None):
     """Load trained model"""
+    device = device or default_device()
     model = model_class().to(device)
     checkpoint = torch.load(model_path, map_location=device)
     model.load_state_dict(checkpoint['model_state_dict'])
     model.eval()
     return model
 
-def predict_image(model, image_path, device='cuda'):
+@functools.lru_cache(maxsize=4)
+def _single_image_predictor(model, device):
+    # One predictor, and one set of single-image buffers, per model and device
+    return SegmentationPredictor(model, device=device, batch_size=1)
+
+
+def predict_image(model, image_path, device=None):
     """Complete prediction with all improvements"""
-    # Load image
-    image = cv2.imread(image_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    original_size = image.shape[:2]
-    
-    # Prepare for model
-    transform = A.Compose([
-        A.Resize(512, 512),
-        A.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ToTensorV2()
-    ])
-    
-    transformed = transform(image=image)
-    input_tensor = transformed['image'].unsqueeze(0).to(device)
-    
-    # Predict
+    return _single_image_predictor(model, device or default_device()).predict(image_path)
+
+
+class SegmentationPredictor:
+    """
+    Model, preprocessing and device held once; images are predicted in batches.
+
+    Inputs may be file paths, encoded image bytes or RGB arrays (H x W x 3).
+    Every image of a batch is resized to image_size once; that copy feeds
+    both the single forward pass and the sky filter (SkyFilter, at model
+    resolution), and only the final mask is upsampled to the original size.
+    `timing_report()` breaks post-processing time down per step.
+
+    The resize and sky-filter buffers are shared by every call, so batches
+    from concurrent request threads are processed one at a time.
+    """
+
+    def __init__(self, model, device=None, image_size=512, threshold=0.5, sky_filter=True, batch_size=8):
+        self.device = device or default_device()
+        self.model = model.to(self.device).eval()
+        self.image_size = image_size
+        self.threshold = threshold
+        self.sky_filter = SkyFilter(image_size, threshold, batch_size) if sky_filter else None
+        self._resized = np.empty((batch_size, image_size, image_size, 3), dtype=np.uint8)
+        # Held from the resize until the masks are upsampled out of the shared buffers
+        self._lock = threading.Lock()
+        self.reset_timings()
+
+    def reset_timings(self):
+        self.timings = {'resize': 0.0, 'upsample': 0.0}
+        self.images = 0
+        if self.sky_filter is not None:
+            self.sky_filter.reset_timings()
+
+    @classmethod
+    def from_checkpoint(cls, model_path, model_class, device=None, **kwargs):
+        device = device or default_device()
+        return cls(load_model(model_path, model_class, device), device=device, **kwargs)
+
+    @staticmethod
+    def load_image(image):
+        """RGB uint8 array from a path, encoded bytes or an array"""
+        if isinstance(image, np.ndarray):
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB) if image.ndim == 2 else image
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            decoded = cv2.imread(str(image))
+        if decoded is None:
+            raise ValueError("Could not decode image")
+        return cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB)
+
+    def predict_batch(self, images):
+        """[(mask, damage_percentage), ...] for a list of images, in one forward pass"""
+        if not images:
+            return []
+        rgb = [self.load_image(image) for image in images]
+        with self._lock:
+            return self._predict_loaded(rgb)
+
+    def _predict_loaded(self, rgb):
+        if len(rgb) > len(self._resized):
+            self._resized = np.empty((len(rgb),) + self._resized.shape[1:], dtype=np.uint8)
+        resized = self._resized[:len(rgb)]
+
+        t0 = time.perf_counter()
+        size = (self.image_size, self.image_size)
+        for image, dst in zip(rgb, resized):
+            cv2.resize(image, size, dst=dst)  # bilinear, as A.Resize
+        self.timings['resize'] += time.perf_counter() - t0
+
+        with torch.no_grad():
+            probs = torch.sigmoid(self.model(normalize_batch(resized, self.device))).squeeze(1).cpu().numpy()
+
+        if self.sky_filter is not None:
+            masks = self.sky_filter(probs, resized)
+        else:
+            masks = (probs > self.threshold).astype(np.uint8)
+
+        t0 = time.perf_counter()
+        results = []
+        for image, mask in zip(rgb, masks):
+            # Resize to original size
+            binary_mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+            damage_percentage = binary_mask.sum() / binary_mask.size * 100
+            results.append((binary_mask, damage_percentage))
+        self.timings['upsample'] += time.perf_counter() - t0
+        self.images += len(rgb)
+        return results
+
+    def timing_report(self):
+        """Milliseconds per image in each pre/post-processing step so far"""
+        images = max(self.images, 1)
+        report = {step: round(seconds * 1000 / images, 3) for step, seconds in self.timings.items()}
+        if self.sky_filter is not None:
+            report.update(self.sky_filter.timing_report())
+        return report
+
+    def predict(self, image):
+        return self.predict_batch([image])[0]
+
+    def predict_tiled(self, image_path, **kwargs):
+        """Full-resolution tiled prediction, see predict_image_tiled"""
+        return predict_image_tiled(self.model, image_path, self.device, **kwargs)
+
+
+class _ArrayReader:
+    """Whole image decoded by OpenCV; read() slices rows out of it"""
+
+    def __init__(self, image_path):
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        self.image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        self.height, self.width = self.image.shape[:2]
+
+    def read(self, row_start, row_end):
+        return self.image[row_start:row_end]
+
+    def close(self):
+        self.image = None
+
+
+class _RasterioReader:
+    """Windowed reads: only the requested rows are decoded (GeoTIFF, JPEG2000, tiled rasters...)"""
+
+    def __init__(self, image_path):
+        import rasterio
+        self._dataset = rasterio.open(image_path)
+        self.height, self.width = self._dataset.height, self._dataset.width
+        self._bands = [1, 2, 3] if self._dataset.count >= 3 else [1, 1, 1]
+        # 16-bit (or wider) unsigned bands are scaled by the dtype max, the same as OpenCV does;
+        # a fixed scale keeps every window consistent, unlike a per-window stretch
+        dtype = np.result_type(*self._dataset.dtypes)
+        if dtype.kind != 'u':
+            self._dataset.close()
+            raise ValueError(f"Unsupported band type {dtype} in {image_path}, expected unsigned integers")
+        self._max = np.iinfo(dtype).max
+
+    def read(self, row_start, row_end):
+        from rasterio.windows import Window
+        bands = self._dataset.read(self._bands, window=Window(0, row_start, self.width, row_end - row_start))
+        if self._max != 255:
+            bands = np.rint(bands * (255.0 / self._max))
+        return np.ascontiguousarray(np.moveaxis(bands, 0, -1).astype(np.uint8, copy=False))
+
+    def close(self):
+        self._dataset.close()
+
+
+def open_image_reader(image_path):
+    """Band reader for large images: rasterio windows when installed, else a full OpenCV decode"""
+    try:
+        return _RasterioReader(image_path)
+    except Exception:  # rasterio missing or cannot open this format
+        return _ArrayReader(image_path)
+
+
+def tile_starts(size, tile_size, overlap):
+    """Window offsets covering [0, size) with at least `overlap` pixels shared by neighbours"""
+    if size <= tile_size:
+        return [0]
+    step = tile_size - overlap
+    return list(range(0, size - tile_size, step)) + [size - tile_size]
+
+
+def blend_weights(tile_size, overlap):
+    """Separable ramp: full weight in the middle, fading across the overlap so seams blend"""
+    ramp = np.minimum(np.arange(1, tile_size + 1), np.arange(tile_size, 0, -1))
+    ramp = np.minimum(ramp, overlap + 1) / (overlap + 1)
+    return np.outer(ramp, ramp).astype(np.float32)
+
+
+def _predict_tiles(model, tiles, device, batch_size):
+    """Sigmoid probabilities for a list of HxWx3 uint8 tiles, `batch_size` tiles per forward pass"""
+    probs = []
     with torch.no_grad():
-        output = model(input_tensor)
-        pred = torch.sigmoid(output).squeeze().cpu().numpy()
-    
-    # Convert to binary mask
-    binary_mask = (pred > 0.5).astype(np.uint8)
-    
-    # Resize to original size
-    binary_mask = cv2.resize(binary_mask, (original_size[1], original_size[0]))
-    
-    # Apply sky filter
-    filtered_mask = remove_sky_predictions(image, binary_mask)
-    
-    # Calculate damage percentage
-    total_pixels = filtered_mask.shape[0] * filtered_mask.shape[1]
-    damage_pixels = filtered_mask.sum()
-    damage_percentage = (damage_pixels / total_pixels) * 100
-    
-    return filtered_mask, damage_percentage
\ No newline at end of file
+        for i in range(0, len(tiles), batch_size):
+            batch = normalize_batch(np.stack(tiles[i:i + batch_size]), device)
+            probs.append(torch.sigmoid(model(batch)).squeeze(1).cpu().numpy())
+    return np.concatenate(probs)
+
+
+def predict_image_tiled(model, image_path, device=None, tile_size=512, overlap=64, batch_size=8,
+                        threshold=0.5):
+    """
+    Full-resolution prediction for large (drone / satellite) images.
+
+    The image is covered by overlapping tile_size windows at native resolution;
+    each row of windows runs through the model in batches and overlapping
+    probabilities are blended with a ramp weight. Rows are finalised band by
+    band (threshold, sky filter, opening with a OPEN_HALO-row halo), so only
+    one band of probabilities is held at a time, and the damage percentage is
+    accumulated as rows complete. Returns (mask, damage_percentage) like
+    predict_image.
+    """
+    device = device or default_device()
+    reader = open_image_reader(image_path)
+    try:
+        return _predict_tiled(model, reader, device, tile_size, overlap, batch_size, threshold)
+    finally:
+        reader.close()
+
+
+def _predict_tiled(model, reader, device, tile_size, overlap, batch_size, threshold):
+    H, W = reader.height, reader.width
+    ys, xs = tile_starts(H, tile_size, overlap), tile_starts(W, tile_size, overlap)
+    weights = blend_weights(tile_size, overlap)
+    sky_rows = int(H * SKY_TOP_FRACTION)
+
+    # Probability accumulator for rows [acc_start, acc_start + tile_size)
+    acc = np.zeros((tile_size, W), dtype=np.float32)
+    acc_weight = np.zeros((tile_size, W), dtype=np.float32)
+    acc_start = 0
+
+    mask = np.zeros((H, W), dtype=np.uint8)
+    pending = np.zeros((0, W), dtype=np.uint8)  # filtered rows not yet opened (start at opened_until - halo)
+    opened_until = 0
+    damage_pixels = 0
+
+    for i, y in enumerate(ys):
+        band = reader.read(y, min(y + tile_size, H))
+        if band.shape[0] < tile_size or W < tile_size:  # image smaller than one tile
+            band = np.pad(band, ((0, tile_size - band.shape[0]), (0, max(tile_size - W, 0)), (0, 0)), mode='edge')
+        probs = _predict_tiles(model, [band[:, x:x + tile_size] for x in xs], device, batch_size)
+
+        rows = min(tile_size, H - y)
+        offset = y - acc_start
+        for x, prob in zip(xs, probs):
+            cols = min(tile_size, W - x)
+            acc[offset:offset + rows, x:x + cols] += prob[:rows, :cols] * weights[:rows, :cols]
+            acc_weight[offset:offset + rows, x:x + cols] += weights[:rows, :cols]
+
+        # Rows before the next window row receive no more tiles: finalise them
+        done = ys[i + 1] if i + 1 < len(ys) else H
+        count = done - acc_start
+        binary = (acc[:count] > threshold * acc_weight[:count]).astype(np.uint8)
+        binary[:max(0, sky_rows - acc_start)] = 0
+        binary[sky_color_mask(band[acc_start - y:done - y, :W]) > 0] = 0
+
+        acc = np.roll(acc, -count, axis=0)
+        acc_weight = np.roll(acc_weight, -count, axis=0)
+        acc[-count:] = 0
+        acc_weight[-count:] = 0
+        acc_start = done
+
+        # Opening: a row is final once OPEN_HALO rows below it are known (or the image ends)
+        pending = np.concatenate([pending, binary])
+        pending_start = done - len(pending)
+        final = done if done == H else done - OPEN_HALO
+        if final > opened_until:
+            opened = cv2.morphologyEx(pending, cv2.MORPH_OPEN, OPEN_KERNEL)
+            rows_out = opened[opened_until - pending_start:final - pending_start]
+            mask[opened_until:final] = rows_out
+            damage_pixels += int(rows_out.sum())
+            opened_until = final
+            pending = pending[max(0, final - OPEN_HALO - pending_start):]
+
+    damage_percentage = damage_pixels / (H * W) * 100
+    return mask, damage_percentage
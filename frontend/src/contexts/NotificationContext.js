@@ -51,6 +51,9 @@ export const NotificationProvider = ({ children }) => {
     socketRef.current.on("connect", () => {
       console.log("✅ Socket connected");
       setIsConnected(true);
+      // Rooms are per connection, so (re)subscribe on every connect.
+      // Narrow with { regions: [...geohash prefixes], min_severity } to cut traffic.
+      socketRef.current.emit("subscribe", { min_severity: "Low" });
     });
 
     socketRef.current.on("disconnect", () => {
@@ -191,6 +191,7 @@ const EnhancedOfficerDashboard = () => {
     const socket = io("http://localhost:5000");
 
     socket.on("connect", () => {
+      socket.emit("subscribe", { min_severity: "Low" });
       showToast('Connected to real-time updates', 'success');
     });
 